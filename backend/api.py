@@ -2,37 +2,46 @@
 
 from __future__ import annotations
 
+import asyncio
+import base64
+import json
+import math
 import os
+from contextlib import asynccontextmanager
+from typing import Any, Literal
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 
 from backend.utils import (
     DiagramGenerationError,
+    MermaidArtifact,
     Orchestrator,
+    PipelineResult,
     ProviderError,
-    build_provider,
+    bypass_llm_cache,
+    get_provider,
 )
+from backend.utils.admission import Overloaded, get_admission
+from backend.utils.batch import BatchItem, run_batch
 from backend.utils.data_models import DiagramType
 from backend.utils.env import load_dotenv
+from backend.utils.jobs import get_job_queue, start_worker_pool
+from backend.utils.metrics import CONTENT_TYPE, REGISTRY
+from backend.utils.render_store import MEDIA_TYPES, RenderError, arender, get_render_store, is_digest
+from backend.utils.sessions import Session, get_session_store
+from backend.utils.singleflight import SingleFlight
 
 app = FastAPI(title="text-to-uml")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=os.environ.get("CORS_ORIGINS", "http://localhost:5173").split(","),
-    allow_methods=["POST"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
-_provider = None
-
-
-def _get_provider():
-    global _provider
-    if _provider is None:
-        _provider = build_provider()
-    return _provider
 
 
 class GenerateRequest(BaseModel):
@@ -41,6 +50,15 @@ class GenerateRequest(BaseModel):
     skip_refine: bool = False
     max_retries: int = 3
     pipeline: str | None = None
+    no_cache: bool = False
+    render: Literal["svg", "png"] | None = None
+
+
+class BatchItemRequest(BaseModel):
+    text: str
+    id: str | None = None
+    diagram_type: DiagramType = "auto"
+    pipeline: str | None = None
 
 
 class GenerateResponse(BaseModel):
@@ -48,31 +66,343 @@ class GenerateResponse(BaseModel):
     explanation: str
     is_valid: bool
     domain: str = "general"
+    timings: dict[str, Any] = Field(default_factory=dict)
+    render_hash: str | None = None
+    svg: str | None = None
+    png: str | None = None  # base64
+    session_id: str | None = None
+    version: int | None = None
+
+
+def _orchestrator(req: GenerateRequest) -> Orchestrator:
+    pipeline_name = req.pipeline or os.environ.get("PIPELINE", "default")
+    return Orchestrator(
+        provider=get_provider(),
+        pipeline=pipeline_name,
+        max_retries=req.max_retries,
+        skip_refine=req.skip_refine,
+    )
+
+
+async def _response(result: PipelineResult) -> GenerateResponse:
+    """``render_hash`` names the diagram under ``GET /render/{hash}`` once it is valid."""
+    valid = result.artifact.is_valid
+    return GenerateResponse(
+        code=result.artifact.code,
+        explanation=result.artifact.explanation,
+        is_valid=valid,
+        domain=result.metadata.get("domain", "general"),
+        timings=result.metadata.get("timings", {}),
+        render_hash=await asyncio.to_thread(_add_source, result.artifact.code) if valid else None,
+    )
+
+
+def _add_source(code: str) -> str | None:
+    """Blocking (the store's first use scans its directory, and mmdc_version may run mmdc)."""
+    store = get_render_store()
+    return store.add_source(code) if store is not None else None
+
+
+def _open_session(response: GenerateResponse, result: PipelineResult, diagram_type: str) -> None:
+    """Remember a valid diagram so ``POST /edit`` can change it by ``session_id``."""
+    store = get_session_store()
+    if store is None or not response.is_valid:
+        return
+    session = store.create(
+        result.artifact.code,
+        explanation=result.artifact.explanation,
+        domain=response.domain,
+        spec=result.spec,
+        diagram_type=diagram_type,
+    )
+    response.session_id, response.version = session.id, session.version
+
+
+async def _attach_render(response: GenerateResponse, fmt: str) -> None:
+    """Fill ``svg``/``png``; left empty when mmdc is unavailable or rejects the code."""
+    try:
+        data = await arender(response.code, fmt, await asyncio.to_thread(get_render_store))
+    except RenderError:
+        return
+    if fmt == "svg":
+        response.svg = data.decode()
+    else:
+        response.png = base64.b64encode(data).decode()
+
+
+_generations: SingleFlight[PipelineResult] = SingleFlight("generate")
+
+
+def _flight_key(req: GenerateRequest, orchestrator: Orchestrator) -> tuple:
+    return (
+        " ".join(req.text.split()),
+        req.diagram_type,
+        orchestrator.pipeline,
+        getattr(orchestrator.provider, "model", ""),
+        req.skip_refine,
+        req.max_retries,
+        req.no_cache,
+    )
+
+
+@asynccontextmanager
+async def _admitted():
+    """Hold an admission slot (API_MAX_INFLIGHT) for the duration of a pipeline run."""
+    admission = get_admission(lambda: get_provider().backlog())
+    if admission is None:
+        yield
+        return
+    async with admission.admit():
+        yield
+
+
+def _retry_headers(retry_after: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+def _overloaded(exc: Overloaded) -> HTTPException:
+    return HTTPException(status_code=exc.status, detail=str(exc), headers=_retry_headers(exc.retry_after))
+
+
+def _upstream_error(exc: ProviderError) -> HTTPException:
+    """502, or 503 with Retry-After when the upstream is rate limiting us even after retries."""
+    if exc.retry_after is not None:
+        return HTTPException(status_code=503, detail=str(exc), headers=_retry_headers(exc.retry_after))
+    return HTTPException(status_code=502, detail=str(exc))
+
+
+def _error_event(exc: Exception) -> dict[str, Any]:
+    if isinstance(exc, Overloaded):
+        return {"status": exc.status, "detail": str(exc), "retry_after": exc.retry_after}
+    if isinstance(exc, ProviderError):
+        if exc.retry_after is not None:
+            return {"status": 503, "detail": str(exc), "retry_after": exc.retry_after}
+        return {"status": 502, "detail": str(exc)}
+    return {"status": 422, "detail": str(exc)}
 
 
 @app.post("/generate", response_model=GenerateResponse)
-def generate_diagram(req: GenerateRequest):
+async def generate_diagram(req: GenerateRequest):
+    """Identical requests arriving while one is running share its result (and its admission slot)."""
     try:
-        provider = _get_provider()
-        pipeline_name = req.pipeline or os.environ.get("PIPELINE", "default")
-        orchestrator = Orchestrator(
-            provider=provider,
-            pipeline=pipeline_name,
-            max_retries=req.max_retries,
-            skip_refine=req.skip_refine,
-        )
-        result = orchestrator.run(req.text, diagram_type=req.diagram_type)
+        orchestrator = _orchestrator(req)
+
+        async def run() -> PipelineResult:
+            async with _admitted():
+                with bypass_llm_cache(req.no_cache):
+                    return await orchestrator.arun(req.text, diagram_type=req.diagram_type)
+
+        result = await _generations.do(_flight_key(req, orchestrator), run)
+    except Overloaded as exc:
+        raise _overloaded(exc)
     except ProviderError as exc:
-        raise HTTPException(status_code=502, detail=str(exc))
+        raise _upstream_error(exc)
     except DiagramGenerationError as exc:
         raise HTTPException(status_code=422, detail=str(exc))
 
-    return GenerateResponse(
-        code=result.artifact.code,
-        explanation=result.artifact.explanation,
-        is_valid=result.artifact.is_valid,
-        domain=result.metadata.get("domain", "general"),
+    response = await _response(result)
+    _open_session(response, result, req.diagram_type)
+    if req.render and response.is_valid:
+        await _attach_render(response, req.render)
+    return response
+
+
+class EditRequest(BaseModel):
+    instruction: str
+    session_id: str | None = None
+    code: str | None = None  # edit a diagram that has no session yet
+    domain: str = "general"  # with ``code``; a session remembers its own
+    diagram_type: DiagramType = "auto"
+    version: int | None = None  # reject the edit if the session has moved on since
+    max_retries: int = 3
+    render: Literal["svg", "png"] | None = None
+
+
+@app.post("/edit", response_model=GenerateResponse)
+async def edit_diagram(req: EditRequest):
+    """Apply one change to a previous diagram, reusing its domain and spec; only the change is generated."""
+    store = get_session_store()
+    if req.session_id is not None:
+        session = store.get(req.session_id) if store is not None else None
+        if session is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session")
+        if req.version is not None and req.version != session.version:
+            raise HTTPException(status_code=409, detail=f"Session is at version {session.version}")
+    elif req.code:
+        session = Session(id="", code=req.code, domain=req.domain, diagram_type=req.diagram_type)
+    else:
+        raise HTTPException(status_code=422, detail="Send a session_id or the code to edit")
+
+    try:
+        orchestrator = Orchestrator(provider=get_provider(), pipeline="edit", max_retries=req.max_retries)
+        async with _admitted():
+            result = await orchestrator.arun(
+                req.instruction,
+                diagram_type=session.diagram_type,
+                spec=session.spec,
+                artifact=MermaidArtifact(code=session.code, explanation=session.explanation),
+                metadata={"domain": session.domain},
+            )
+    except Overloaded as exc:
+        raise _overloaded(exc)
+    except ProviderError as exc:
+        raise _upstream_error(exc)
+    except DiagramGenerationError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    response = await _response(result)
+    if store is not None and session.id:
+        session.code, session.explanation = result.artifact.code, result.artifact.explanation
+        session.version += 1
+        if not store.save_if_version(session, session.version - 1):
+            current = store.get(session.id)
+            if current is None:
+                raise HTTPException(status_code=404, detail="Unknown or expired session")
+            raise HTTPException(status_code=409, detail=f"Session is at version {current.version}")
+        response.session_id, response.version = session.id, session.version
+    else:
+        _open_session(response, result, session.diagram_type)
+    if req.render and response.is_valid:
+        await _attach_render(response, req.render)
+    return response
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_diagram_stream(req: GenerateRequest):
+    """Server-Sent Events: one event per pipeline step, generation tokens, then ``result`` or ``error``."""
+    try:
+        orchestrator = _orchestrator(req)
+    except ProviderError as exc:
+        raise _upstream_error(exc)
+
+    async def events():
+        with bypass_llm_cache(req.no_cache):
+            try:
+                async with _admitted():
+                    async for event, data in orchestrator.astream(req.text, diagram_type=req.diagram_type):
+                        if event == "result":
+                            response = await _response(data["result"])
+                            _open_session(response, data["result"], req.diagram_type)
+                            if req.render and response.is_valid:
+                                await _attach_render(response, req.render)
+                            data = response.model_dump()
+                        yield _sse(event, data)
+            except (Overloaded, ProviderError, DiagramGenerationError) as exc:
+                yield _sse("error", _error_event(exc))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class BatchRequest(BaseModel):
+    items: list[BatchItemRequest]
+    concurrency: int = 4
+    max_retries: int = 3
+    pipeline: str | None = None
+    no_cache: bool = False
+
+
+@app.post("/generate/batch")
+async def generate_batch(req: BatchRequest):
+    """Stream one JSON line per item, in completion order, as results arrive."""
+    try:
+        provider = get_provider()
+    except ProviderError as exc:
+        raise _upstream_error(exc)
+
+    limit = int(os.environ.get("BATCH_MAX_CONCURRENCY", "16"))
+    items = [
+        BatchItem(id=item.id or str(i), text=item.text, diagram_type=item.diagram_type, pipeline=item.pipeline)
+        for i, item in enumerate(req.items)
+    ]
+
+    async def lines():
+        with bypass_llm_cache(req.no_cache):
+            async for record in run_batch(
+                items,
+                provider,
+                concurrency=max(1, min(req.concurrency, limit)),
+                pipeline=req.pipeline or os.environ.get("PIPELINE", "default"),
+                max_retries=req.max_retries,
+            ):
+                yield json.dumps(record) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+class JobRequest(GenerateRequest):
+    priority: int = 0
+    max_attempts: int = 3
+
+
+_JOB_FIELDS = set(GenerateRequest.model_fields) - {"render"}
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(req: JobRequest) -> dict[str, Any]:
+    """Queue a generation for the worker pool; poll ``GET /jobs/{id}`` for the result."""
+    queue = get_job_queue()
+    job_id = await asyncio.to_thread(
+        queue.submit,
+        req.model_dump(include=_JOB_FIELDS),
+        priority=req.priority,
+        max_attempts=req.max_attempts,
     )
+    return {"id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0) -> dict[str, Any]:
+    """Job status and, once done, its result; ``wait`` long-polls up to that many seconds (max 60)."""
+    queue = get_job_queue()
+    deadline = asyncio.get_running_loop().time() + min(max(wait, 0.0), 60.0)
+    while True:
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        if job.finished or asyncio.get_running_loop().time() >= deadline:
+            return job.as_dict()
+        await asyncio.sleep(0.25)
+
+
+@app.get("/render/{digest}")
+async def render_diagram(
+    digest: str,
+    format: Literal["svg", "png"] = "svg",
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """A rendered diagram by ``render_hash``; immutable, so clients may cache it forever."""
+    store = await asyncio.to_thread(get_render_store)
+    if store is None or not is_digest(digest):
+        raise HTTPException(status_code=404, detail="Unknown render")
+    etag = f'"{digest}.{format}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    data = await asyncio.to_thread(store.get, digest, format)
+    if data is None:
+        code = await asyncio.to_thread(store.source, digest)
+        if code is None:
+            raise HTTPException(status_code=404, detail="Unknown render")
+        try:
+            data = await arender(code, format, store)
+        except RenderError as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+    return Response(data, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of pipeline, LLM and mmdc metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 def _parse_port(default: int = 8000) -> int:
@@ -92,7 +422,12 @@ def serve() -> None:
     load_dotenv()
     host = os.environ.get("API_HOST", "127.0.0.1")
     port = _parse_port()
-    uvicorn.run(app, host=host, port=port)
+    workers = start_worker_pool()
+    try:
+        uvicorn.run(app, host=host, port=port)
+    finally:
+        if workers is not None:
+            workers.close()
 
 
 if __name__ == "__main__":
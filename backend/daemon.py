@@ -0,0 +1,136 @@
+"""Resident daemon for the CLI: keeps the provider, its connections and mmdc warm.
+
+``text-to-uml --daemon`` listens on a Unix socket; later ``text-to-uml``
+invocations send their prompt there instead of importing the pipeline and
+building a client themselves. The protocol is one JSON line each way. The
+client half of this module uses only the standard library so that talking
+to a running daemon stays cheap.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import tempfile
+from pathlib import Path
+from typing import Any
+
+_LINE_LIMIT = 16 * 1024 * 1024
+_DEFAULT_TIMEOUT = 600.0  # a whole generation, repairs included
+
+
+def socket_path() -> Path:
+    """TEXT_TO_UML_SOCKET, else a per-user socket in XDG_RUNTIME_DIR or the temp dir."""
+    configured = os.environ.get("TEXT_TO_UML_SOCKET")
+    if configured:
+        return Path(configured)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "text-to-uml.sock"
+    return Path(tempfile.gettempdir()) / f"text-to-uml-{os.getuid()}.sock"
+
+
+# ── Client ────────────────────────────────────────────────────────────
+
+def _timeout() -> float:
+    try:
+        return float(os.environ.get("TEXT_TO_UML_DAEMON_TIMEOUT") or _DEFAULT_TIMEOUT)
+    except ValueError:
+        return _DEFAULT_TIMEOUT
+
+
+def running(path: Path | None = None) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path or socket_path()))
+        except OSError:
+            return False
+    return True
+
+
+def request(payload: dict[str, Any], path: Path | None = None) -> dict[str, Any] | None:
+    """Send one generation to the daemon; None when it can't be reached, so the caller runs it in-process.
+
+    That covers a missing or stale socket, one owned by another user, a
+    daemon that dies mid-request, and one that doesn't answer within
+    TEXT_TO_UML_DAEMON_TIMEOUT seconds.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(_timeout())
+        sock.connect(str(path or socket_path()))
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile("rb") as reply:
+            line = reply.readline(_LINE_LIMIT)
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    if not line:
+        return None  # the daemon closed the connection without answering
+    return json.loads(line)
+
+
+# ── Server ────────────────────────────────────────────────────────────
+
+def serve(path: Path | None = None) -> None:
+    """Run the daemon in the foreground until SIGINT/SIGTERM."""
+    import asyncio
+    import signal
+
+    from .utils import DiagramGenerationError, Orchestrator, ProviderError, get_provider
+    from .utils.log import get_logger
+    from .utils.mmdc_pool import get_pool
+
+    logger = get_logger("daemon")
+    path = path or socket_path()
+    if running(path):
+        raise SystemExit(f"A daemon is already listening on {path}")
+    provider = get_provider()
+    get_pool()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            payload = json.loads(await reader.readline())
+            orchestrator = Orchestrator(
+                provider=provider,
+                pipeline=payload.get("pipeline") or "default",
+                max_retries=payload.get("max_retries", 3),
+                skip_refine=payload.get("skip_refine", False),
+            )
+            result = await orchestrator.arun(payload["text"], diagram_type=payload.get("diagram_type", "auto"))
+            reply = {
+                "ok": True,
+                "code": result.artifact.code,
+                "explanation": result.artifact.explanation,
+                "is_valid": result.artifact.is_valid,
+                "domain": result.metadata.get("domain", "general"),
+            }
+        except (DiagramGenerationError, ProviderError, ValueError, KeyError) as exc:
+            reply = {"ok": False, "error": str(exc)}
+        except Exception as exc:  # answer anyway, or the client would run the whole generation again
+            logger.exception("Request failed")
+            reply = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        try:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass  # the client gave up
+        finally:
+            writer.close()
+
+    async def main() -> None:
+        path.unlink(missing_ok=True)  # stale socket from a daemon that was killed
+        server = await asyncio.start_unix_server(handle, path=str(path), limit=_LINE_LIMIT)
+        os.chmod(path, 0o600)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info(f"Listening on {path}")
+        async with server:
+            await stop.wait()
+        path.unlink(missing_ok=True)
+
+    asyncio.run(main())
@@ -1,20 +1,55 @@
-"""CLI entrypoint."""
+"""CLI entrypoint.
 
+Imports of the pipeline are deferred until they are needed, so that handing
+a prompt to a running daemon (``--daemon``) costs little more than starting
+the interpreter.
+"""
+
+import argparse
+import json
 import os
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
-from backend.utils import DiagramGenerationError, Orchestrator, ProviderError, build_provider
+from backend import daemon
 from backend.utils.env import load_dotenv
 
 _ROOT = Path.cwd()
 
 
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="text-to-uml",
+        description="Convert a description into a Mermaid diagram.",
+        epilog='e.g. text-to-uml "Login system with 2FA"',
+    )
+    parser.add_argument("prompt", nargs="*", help="description of the diagram")
+    parser.add_argument("--batch", metavar="PROMPTS.jsonl", help="run every prompt in a JSONL file")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", "4")),
+                        help="max pipelines in flight in batch mode (default: 4)")
+    parser.add_argument("--output", metavar="RESULTS.jsonl", help="batch results file (default: stdout)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip items that already succeeded in --output and append to it")
+    parser.add_argument("--daemon", action="store_true",
+                        help="stay resident on a Unix socket (TEXT_TO_UML_SOCKET) and serve later invocations")
+    parser.add_argument("--no-daemon", action="store_true", help="run in this process even if a daemon is up")
+    return parser.parse_args()
+
+
 def main() -> None:
     load_dotenv()
+    args = _parse_args()
+
+    if args.daemon:
+        daemon.serve()
+        return
+
+    if args.batch:
+        _run_batch(args)
+        return
 
-    prompt = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else None
+    prompt = " ".join(args.prompt)
     if not prompt:
         print("Usage: text-to-uml <description>", file=sys.stderr)
         print('  e.g. text-to-uml "Login system with 2FA"', file=sys.stderr)
@@ -25,33 +60,100 @@ def main() -> None:
     skip_refine = os.environ.get("SKIP_REFINE", "false").lower() in ("true", "1", "yes")
     pipeline_name = os.environ.get("PIPELINE", "default")
 
+    reply = None
+    if not args.no_daemon:
+        reply = daemon.request({
+            "text": prompt,
+            "diagram_type": diagram_type,
+            "pipeline": pipeline_name,
+            "max_retries": max_retries,
+            "skip_refine": skip_refine,
+        })
+    if reply is None:
+        reply = _generate(prompt, diagram_type, pipeline_name, max_retries, skip_refine)
+    if not reply["ok"]:
+        print(f"Error: {reply['error']}", file=sys.stderr)
+        sys.exit(1)
+
+    code = reply["code"]
+    print(f"[router] domain: {reply['domain']}", file=sys.stderr)
+
+    out_dir = _ROOT / "outputs"
+    out_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    slug = prompt[:40].replace(" ", "_").replace("/", "-")
+    out_file = out_dir / f"{timestamp}_{slug}.mmd"
+    out_file.write_text(code + "\n")
+    print(f"Saved to {out_file.relative_to(_ROOT)}", file=sys.stderr)
+
+    print(code)
+
+
+def _generate(prompt: str, diagram_type: str, pipeline: str, max_retries: int, skip_refine: bool) -> dict:
+    """Run the pipeline in this process; same reply shape as the daemon's."""
+    from backend.utils import DiagramGenerationError, Orchestrator, ProviderError, get_provider
+
     try:
-        provider = build_provider()
         orchestrator = Orchestrator(
-            provider=provider,
-            pipeline=pipeline_name,
+            provider=get_provider(),
+            pipeline=pipeline,
             max_retries=max_retries,
             skip_refine=skip_refine,
         )
         result = orchestrator.run(prompt, diagram_type=diagram_type)
     except (DiagramGenerationError, ProviderError) as exc:
+        return {"ok": False, "error": str(exc)}
+    return {"ok": True, "code": result.artifact.code, "domain": result.metadata.get("domain", "general")}
+
+
+def _run_batch(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from backend.utils import ProviderError, get_provider
+    from backend.utils.batch import completed_ids, read_jsonl, run_batch
+
+    if args.resume and not args.output:
+        print("Error: --resume needs --output", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        items = read_jsonl(args.batch)
+        provider = get_provider()
+    except (OSError, ValueError, ProviderError) as exc:
         print(f"Error: {exc}", file=sys.stderr)
         sys.exit(1)
 
-    artifact = result.artifact
-    domain = result.metadata.get("domain", "general")
-    print(f"[router] domain: {domain}", file=sys.stderr)
+    if args.resume:
+        done = completed_ids(args.output)
+        items = [item for item in items if item.id not in done]
+        print(f"[batch] resuming: {len(done)} done, {len(items)} to go", file=sys.stderr)
 
-    out_dir = _ROOT / "outputs"
-    out_dir.mkdir(exist_ok=True)
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    slug = prompt[:40].replace(" ", "_").replace("/", "-")
-    out_file = out_dir / f"{timestamp}_{slug}.mmd"
-    out_file.write_text(artifact.code + "\n")
-    print(f"Saved to {out_file.relative_to(_ROOT)}", file=sys.stderr)
+    out = open(args.output, "a" if args.resume else "w") if args.output else sys.stdout
 
-    print(artifact.code)
+    async def drive() -> int:
+        failures = 0
+        async for record in run_batch(
+            items,
+            provider,
+            concurrency=args.concurrency,
+            pipeline=os.environ.get("PIPELINE", "default"),
+            max_retries=int(os.environ.get("MAX_RETRIES", "3")),
+        ):
+            failures += not record["ok"]
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+        return failures
+
+    try:
+        failures = asyncio.run(drive())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"[batch] {len(items) - failures}/{len(items)} succeeded", file=sys.stderr)
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
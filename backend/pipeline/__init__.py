@@ -2,9 +2,15 @@
 
 from __future__ import annotations
 
-import sys
-from dataclasses import dataclass, field
-from typing import Any, Protocol, TYPE_CHECKING
+import asyncio
+import inspect
+import os
+import time
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Awaitable, Callable, Protocol, TYPE_CHECKING
+
+from ..utils.log import get_logger
+from ..utils.metrics import in_step, record_step
 
 if TYPE_CHECKING:
     from ..utils.data_models import MermaidArtifact
@@ -22,10 +28,85 @@ class PipelineContext:
     artifact: MermaidArtifact | None = None
     error: str = ""
     metadata: dict[str, Any] = field(default_factory=dict)
+    on_event: Callable[[str, dict[str, Any]], None] | None = field(default=None, repr=False)
+
+    def emit(self, event: str, **data: Any) -> None:
+        """Report progress to whoever is streaming this run (no-op otherwise)."""
+        if self.on_event is not None:
+            self.on_event(event, data)
 
 
 class StepFn(Protocol):
-    def __call__(self, ctx: PipelineContext, provider: LLMProvider) -> None: ...
+    """A step mutates the context in place; it may be a plain or an ``async`` function."""
+
+    def __call__(self, ctx: PipelineContext, provider: LLMProvider) -> None | Awaitable[None]: ...
+
+
+async def run_step(step: StepFn, ctx: PipelineContext, provider: LLMProvider) -> None:
+    """Await async steps; run sync steps in a worker thread so they don't block the loop."""
+    name = getattr(step, "__name__", type(step).__name__)
+    started = time.perf_counter()
+    try:
+        with in_step(name):
+            if inspect.iscoroutinefunction(step) or inspect.iscoroutinefunction(getattr(step, "__call__", None)):
+                await step(ctx, provider)  # type: ignore[misc]
+            else:
+                await asyncio.to_thread(step, ctx, provider)
+    finally:
+        record_step(name, time.perf_counter() - started, ctx.metadata.get("domain", ""))
+
+
+# ── Step declarations ─────────────────────────────────────────────────
+# A field name is either a PipelineContext attribute or a metadata key.
+
+_CONTEXT_FIELDS = {f.name for f in fields(PipelineContext)}
+
+
+def read_field(ctx: PipelineContext, name: str) -> Any:
+    return getattr(ctx, name) if name in _CONTEXT_FIELDS else ctx.metadata.get(name)
+
+
+def write_field(ctx: PipelineContext, name: str, value: Any) -> None:
+    if name in _CONTEXT_FIELDS:
+        setattr(ctx, name, value)
+    elif value is not None:
+        ctx.metadata[name] = value
+
+
+def declares(
+    *,
+    reads: tuple[str, ...] = (),
+    writes: tuple[str, ...] = (),
+    speculate: dict[str, Any] | None = None,
+) -> Callable[[StepFn], StepFn]:
+    """Declare the context fields a step reads and writes so the engine can run it concurrently.
+
+    ``speculate`` maps an input field to a guess (a value, or a callable taking
+    the context) so the step can start before that input is produced; the
+    speculative result is kept only if the guess turns out right.
+    Steps without a declaration run as barriers, in list order.
+    """
+    def wrap(step: StepFn) -> StepFn:
+        step.reads = frozenset(reads)  # type: ignore[attr-defined]
+        step.writes = frozenset(writes)  # type: ignore[attr-defined]
+        step.speculate = dict(speculate or {})  # type: ignore[attr-defined]
+        return step
+    return wrap
+
+
+def _io(step: StepFn) -> tuple[frozenset[str], frozenset[str]] | None:
+    if not hasattr(step, "reads"):
+        return None
+    return step.reads, step.writes  # type: ignore[attr-defined]
+
+
+def _conflicts(earlier: StepFn, later: StepFn) -> frozenset[str] | None:
+    """Fields that order *later* after *earlier*; None if either is undeclared (full barrier)."""
+    a, b = _io(earlier), _io(later)
+    if a is None or b is None:
+        return None
+    (reads_a, writes_a), (reads_b, writes_b) = a, b
+    return (writes_a & (reads_b | writes_b)) | (reads_a & writes_b)
 
 
 # ── Pipeline runner ───────────────────────────────────────────────────
@@ -49,6 +130,89 @@ class Pipeline:
         names = [s.__name__ if hasattr(s, "__name__") else str(s) for s in self._steps]
         return " → ".join(names)
 
+    def dependencies(self) -> list[dict[int, frozenset[str] | None]]:
+        """For each step, the earlier steps it must wait for and the fields causing the edge."""
+        deps: list[dict[int, frozenset[str] | None]] = []
+        for j, later in enumerate(self._steps):
+            edges: dict[int, frozenset[str] | None] = {}
+            for i in range(j):
+                fields_ = _conflicts(self._steps[i], later)
+                if fields_ is None or fields_:
+                    edges[i] = fields_
+            deps.append(edges)
+        return deps
+
+
+async def execute(pipeline: Pipeline, ctx: PipelineContext, provider: LLMProvider) -> None:
+    """Run *pipeline* as a dependency DAG: steps start as soon as the steps they depend on finish."""
+    steps = list(pipeline)
+    deps = pipeline.dependencies()
+    speculation_on = os.environ.get("SPECULATE", "true").lower() in ("true", "1", "yes")
+    tasks: list[asyncio.Task] = []
+
+    async def run(j: int) -> None:
+        step = steps[j]
+        guesses: dict[str, Any] = getattr(step, "speculate", {}) if speculation_on else {}
+        # dependencies that exist only because of a field we are allowed to guess
+        skippable = {i for i, why in deps[j].items() if why is not None and why <= guesses.keys()}
+        await asyncio.gather(*(tasks[i] for i in deps[j] if i not in skippable))
+        if skippable and not all(tasks[i].done() for i in skippable):
+            await _speculate(step, ctx, provider, guesses, [tasks[i] for i in skippable])
+        else:
+            await asyncio.gather(*(tasks[i] for i in skippable))
+            await run_step(step, ctx, provider)
+
+    for j in range(len(steps)):
+        tasks.append(asyncio.create_task(run(j)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _speculate(
+    step: StepFn,
+    ctx: PipelineContext,
+    provider: LLMProvider,
+    guesses: dict[str, Any],
+    pending: list[asyncio.Task],
+) -> None:
+    name = getattr(step, "__name__", str(step))
+    guessed = {k: (v(ctx) if callable(v) else v) for k, v in guesses.items()}
+    buffered: list[tuple[str, dict[str, Any]]] = []
+    shadow = replace(
+        ctx,
+        metadata=dict(ctx.metadata),
+        on_event=(lambda event, data: buffered.append((event, data))) if ctx.on_event else None,
+    )
+    for key, value in guessed.items():
+        write_field(shadow, key, value)
+    attempt = asyncio.create_task(run_step(step, shadow, provider))
+
+    try:
+        await asyncio.gather(*pending)
+    except BaseException:
+        attempt.cancel()
+        raise
+
+    hit = all(read_field(ctx, key) == value for key, value in guessed.items())
+    ctx.metadata.setdefault("speculation", {})[name] = "hit" if hit else "miss"
+    if not hit:
+        attempt.cancel()
+        if attempt.done() and not attempt.cancelled():
+            attempt.exception()  # already failed; mark retrieved, the real run decides
+        _log(f"Speculative {name} discarded ({guessed} was wrong)")
+        await run_step(step, ctx, provider)
+        return
+
+    await attempt
+    for key in step.writes:  # type: ignore[attr-defined]
+        write_field(ctx, key, read_field(shadow, key))
+    for event, data in buffered:
+        ctx.emit(event, **data)
+    _log(f"Speculative {name} kept")
+
 
 # ── Registry ──────────────────────────────────────────────────────────
 
@@ -61,19 +225,26 @@ def register(name: str, pipeline: Pipeline) -> None:
 
 def get_pipeline(name: str = "default") -> Pipeline:
     if name not in _REGISTRY:
-        # lazy-import workflows so they self-register
-        from . import workflows as _  # noqa: F811
+        # import just the workflow module; it self-registers
+        from .workflows import load
+
+        load(name)
     if name not in _REGISTRY:
-        raise ValueError(f"Unknown pipeline '{name}'. Available: {list(_REGISTRY)}")
+        raise ValueError(f"Unknown pipeline '{name}'. Available: {available_pipelines()}")
     return _REGISTRY[name]
 
 
 def available_pipelines() -> list[str]:
-    from . import workflows as _  # noqa: F811
+    from .workflows import load_all
+
+    load_all()
     return list(_REGISTRY)
 
 
 # ── Shared logger ─────────────────────────────────────────────────────
 
+_logger = get_logger("pipeline")
+
+
 def _log(msg: str) -> None:
-    print(f"[pipeline] {msg}", file=sys.stderr)
+    _logger.info(msg)
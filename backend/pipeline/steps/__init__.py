@@ -1,14 +1,18 @@
 """Pipeline steps."""
 
 from .constrain import constrain
+from .edit import apply_edit
 from .route import route
-from .refine import refine, passthrough
-from .generate import generate
+from .refine import adaptive_refine, refine, passthrough
+from .generate import generate, generate_best_of
 from .validate import validate_and_repair
 
 __all__ = [
+    "adaptive_refine",
+    "apply_edit",
     "constrain",
     "generate",
+    "generate_best_of",
     "passthrough",
     "refine",
     "route",
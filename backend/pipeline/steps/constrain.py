@@ -2,12 +2,13 @@
 
 from __future__ import annotations
 
-from ...prompts import get_grammar, format_grammar_prompt
+from ...prompts import get_grammar, grammar_prompt
 from ...utils.llm import LLMProvider
-from .. import PipelineContext, _log
+from .. import PipelineContext, _log, declares
 
 
-def constrain(ctx: PipelineContext, _provider: LLMProvider) -> None:
+@declares(reads=("domain", "spec"), writes=("spec", "grammar"))
+async def constrain(ctx: PipelineContext, _provider: LLMProvider) -> None:
     domain = ctx.metadata.get("domain", "general")
     grammar = get_grammar(domain)
 
@@ -15,7 +16,7 @@ def constrain(ctx: PipelineContext, _provider: LLMProvider) -> None:
         _log(f"No grammar for domain '{domain}', skipping constraints")
         return
 
-    constraint_block = format_grammar_prompt(grammar)
+    constraint_block = grammar_prompt(domain)
     ctx.metadata["grammar"] = grammar
     ctx.spec = ctx.spec + "\n\n" + constraint_block
     _log(f"Injected {domain} grammar ({len(grammar['node_types'])} types, {len(grammar['valid_connections'])} connections)")
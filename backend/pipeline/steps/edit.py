@@ -0,0 +1,52 @@
+"""Edit: apply one requested change to an existing diagram as line-range patches."""
+
+from __future__ import annotations
+
+from ...prompts import get_grammar
+from ...utils.data_models import DiagramRequest, MermaidArtifact
+from ...utils.llm import LLMProvider
+from .. import PipelineContext, _log, declares
+
+_REGENERATE = """Current diagram:
+{code}
+
+Change it as follows, keeping everything else as it is: {instruction}"""
+
+
+@declares(reads=("raw_text", "artifact", "spec", "domain", "diagram_type"), writes=("artifact", "grammar", "edit"))
+async def apply_edit(ctx: PipelineContext, provider: LLMProvider) -> None:
+    """Ask only for the change (``ctx.raw_text``) to the diagram in ``ctx.artifact``.
+
+    The model sees the numbered diagram and returns patches, so the reply
+    is the size of the change rather than of the diagram. Patches that do
+    not apply fall back to regenerating from the stored spec.
+    """
+    assert ctx.artifact is not None, "No diagram to edit"
+    base = ctx.artifact
+    domain = ctx.metadata.get("domain", "general")
+    grammar = get_grammar(domain)
+    if grammar is not None:
+        ctx.metadata["grammar"] = grammar
+    ctx.metadata["base_code"] = base.code
+
+    _log("Editing diagram...")
+    if provider.supports_edit_patch:
+        try:
+            patch = await provider.aedit_patch(base.code, ctx.raw_text, domain)
+            code = patch.apply(base.code)
+        except ValueError as exc:  # malformed JSON, or ranges that don't fit the diagram
+            _log(f"Edit patch failed ({exc.__class__.__name__}); regenerating")
+        else:
+            _log(f"Applied {len(patch.patches)} edit patch(es)")
+            ctx.metadata["edit"] = {"mode": "patch", "patches": len(patch.patches)}
+            ctx.artifact = MermaidArtifact(code=code, explanation=patch.explanation or base.explanation)
+            ctx.emit("draft", code=ctx.artifact.code, explanation=ctx.artifact.explanation)
+            return
+
+    text = _REGENERATE.format(code=base.code, instruction=ctx.raw_text)
+    if ctx.spec:
+        text = f"{ctx.spec}\n\n{text}"
+    request = DiagramRequest(raw_text=text, diagram_type=ctx.diagram_type)  # type: ignore[arg-type]
+    ctx.artifact = await provider.agenerate_diagram(request, domain=domain)
+    ctx.metadata["edit"] = {"mode": "regenerate"}
+    ctx.emit("draft", code=ctx.artifact.code, explanation=ctx.artifact.explanation)
@@ -2,14 +2,121 @@
 
 from __future__ import annotations
 
-from ...utils.data_models import DiagramRequest
+import asyncio
+import math
+from typing import Any
+
+from ...utils.candidates import get_candidate_policy
+from ...utils.data_models import DiagramRequest, MermaidArtifact, ProviderError
+from ...utils.grammar_check import GrammarViolation, compile_grammar
 from ...utils.llm import LLMProvider
-from .. import PipelineContext, _log
+from ...utils.metrics import record_candidate
+from .. import PipelineContext, _log, declares
+from .validate import check_artifact
 
 
-def generate(ctx: PipelineContext, provider: LLMProvider) -> None:
+@declares(reads=("spec", "domain", "diagram_type"), writes=("artifact",))
+async def generate(ctx: PipelineContext, provider: LLMProvider) -> None:
     _log("Generating diagram...")
     domain = ctx.metadata.get("domain", "general")
     request = DiagramRequest(raw_text=ctx.spec, diagram_type=ctx.diagram_type)  # type: ignore[arg-type]
-    ctx.artifact = provider.generate_diagram(request, domain=domain)
+    on_token = (lambda text: ctx.emit("token", text=text)) if ctx.on_event else None
+    ctx.artifact = await provider.agenerate_diagram(request, domain=domain, on_token=on_token)
     _log("Initial diagram generated")
+    ctx.emit("draft", code=ctx.artifact.code, explanation=ctx.artifact.explanation)
+
+
+_sampling: set[asyncio.Task[Any]] = set()  # variant-0 drafts left running for the failure-rate sample
+
+
+@declares(reads=("spec", "domain", "diagram_type", "grammar"), writes=("artifact", "candidates"))
+async def generate_best_of(ctx: PipelineContext, provider: LLMProvider) -> None:
+    """Generate K drafts at once, validating each as it lands; the first valid one wins.
+
+    K adapts to the domain's observed first-draft failure rate, which is fed
+    by variant 0 only: whichever draft lands first is biased towards short,
+    quick ones, so variant 0 is left to finish even after another wins. When
+    no draft validates, the one closest to valid is handed to the repair loop.
+    """
+    domain = ctx.metadata.get("domain", "general")
+    policy = get_candidate_policy()
+    k = policy.count(domain)
+    if k <= 1:
+        await generate(ctx, provider)
+        return
+
+    _log(f"Generating {k} candidate diagrams...")
+    request = DiagramRequest(raw_text=ctx.spec, diagram_type=ctx.diagram_type)  # type: ignore[arg-type]
+    grammar = ctx.metadata.get("grammar")
+    checker = compile_grammar(grammar) if grammar else None
+
+    async def candidate(variant: int) -> tuple[int, MermaidArtifact, bool, list[GrammarViolation]]:
+        artifact = await provider.agenerate_variant(request, domain, variant)
+        artifact.is_valid = False  # only our own check counts
+        ok, _, violations = await check_artifact(artifact, checker)
+        return variant, artifact, ok, violations
+
+    tasks = [asyncio.create_task(candidate(i)) for i in range(k)]
+    tasks[0].add_done_callback(lambda task: _observe_variant_zero(task, domain))
+    winner: tuple[int, MermaidArtifact] | None = None
+    fallback: tuple[float, int, MermaidArtifact] | None = None
+    error: Exception | None = None
+    finished = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                variant, artifact, ok, violations = await next_done
+            except (ProviderError, ValueError) as exc:  # ValueError: unparseable JSON
+                error = exc
+                record_candidate(domain, "failed")
+                continue
+            finished += 1
+            record_candidate(domain, "valid" if ok else "invalid")
+            ctx.emit("candidate", variant=variant, valid=ok)
+            if ok:
+                winner = (variant, artifact)
+                break
+            # renders but bends the grammar beats not rendering at all
+            rank = len(violations) if violations else math.inf
+            if fallback is None or rank < fallback[0]:
+                fallback = (rank, variant, artifact)
+    finally:
+        for i, task in enumerate(tasks):
+            if not task.done() and i == 0 and winner is not None:
+                _sampling.add(task)  # not needed for this run, but it is the policy's sample
+                task.add_done_callback(_sampling.discard)
+                task.add_done_callback(lambda t: record_candidate(domain, _outcome(t)))
+            elif not task.done():
+                task.cancel()
+                record_candidate(domain, "cancelled")
+            elif not task.cancelled():
+                task.exception()  # retrieved, even if we stopped before reaching it
+
+    if winner is None and fallback is None:
+        assert error is not None
+        raise error
+
+    variant, artifact = winner if winner is not None else fallback[1:]  # type: ignore[index]
+    ctx.artifact = artifact
+    ctx.metadata["candidates"] = {
+        "requested": k,
+        "finished": finished,
+        "chosen": variant,
+        "valid": winner is not None,
+    }
+    _log(f"Candidate {variant} chosen ({'valid' if winner else 'needs repair'}, {finished}/{k} finished)")
+    ctx.emit("draft", code=artifact.code, explanation=artifact.explanation)
+
+
+def _outcome(task: asyncio.Task[Any]) -> str:
+    if task.cancelled():
+        return "cancelled"
+    if task.exception() is not None:
+        return "failed"
+    return "valid" if task.result()[2] else "invalid"
+
+
+def _observe_variant_zero(task: asyncio.Task[Any], domain: str) -> None:
+    outcome = _outcome(task)
+    if outcome in ("valid", "invalid"):
+        get_candidate_policy().observe(domain, outcome == "valid")
@@ -2,19 +2,39 @@
 
 from __future__ import annotations
 
+from ...utils.complexity import REFINE, get_planner
 from ...utils.llm import LLMProvider
-from .. import PipelineContext, _log
+from .. import PipelineContext, _log, declares
+from .route import guess_domain
 
 
-def refine(ctx: PipelineContext, provider: LLMProvider) -> None:
+@declares(reads=("raw_text", "domain"), writes=("spec",), speculate={"domain": guess_domain})
+async def refine(ctx: PipelineContext, provider: LLMProvider) -> None:
     _log("Refining input...")
     domain = ctx.metadata.get("domain", "general")
-    ctx.spec = provider.refine_input(ctx.raw_text, domain=domain)
+    ctx.spec = await provider.arefine_input(ctx.raw_text, domain=domain)
     if len(ctx.spec) > 2000:
         ctx.spec = ctx.spec[:2000] + "\n[truncated]"
     _log(f"Refined spec ({len(ctx.spec)} chars)")
+    ctx.emit("spec", spec=ctx.spec)
 
 
-def passthrough(ctx: PipelineContext, _provider: LLMProvider) -> None:
+@declares(reads=("raw_text",), writes=("spec",))
+async def passthrough(ctx: PipelineContext, _provider: LLMProvider) -> None:
     _log("Passthrough (no refine)")
     ctx.spec = ctx.raw_text
+    ctx.emit("spec", spec=ctx.spec)
+
+
+@declares(reads=("raw_text", "domain"), writes=("spec", "plan"), speculate={"domain": guess_domain})
+async def adaptive_refine(ctx: PipelineContext, provider: LLMProvider) -> None:
+    """Refine complex inputs; simple ones go straight to generation."""
+    domain = ctx.metadata.get("domain", "general")
+    plan = get_planner().plan(ctx.raw_text, domain)
+    ctx.metadata["plan"] = plan.as_dict()
+    ctx.emit("plan", **plan.as_dict())
+    _log(f"Plan: {plan.path} ({plan.reason}, complexity {plan.complexity.score:.2f})")
+    if plan.path == REFINE:
+        await refine(ctx, provider)
+    else:
+        await passthrough(ctx, provider)
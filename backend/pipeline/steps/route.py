@@ -2,12 +2,26 @@
 
 from __future__ import annotations
 
+from ...utils.domain_router import confidence_threshold, get_router
 from ...utils.llm import LLMProvider
-from .. import PipelineContext, _log
+from .. import PipelineContext, _log, declares
 
 
-def route(ctx: PipelineContext, provider: LLMProvider) -> None:
+def guess_domain(ctx: PipelineContext) -> str:
+    """Best local guess, used to start domain-dependent steps before routing settles."""
+    decision = get_router().classify(ctx.raw_text)
+    return decision.domain if decision.scores.get(decision.domain) else "general"
+
+
+@declares(reads=("raw_text",), writes=("domain", "route"))
+async def route(ctx: PipelineContext, provider: LLMProvider) -> None:
     _log("Routing domain...")
-    domain = provider.route_domain(ctx.raw_text)
+    decision = get_router().classify(ctx.raw_text)
+    if decision.confidence >= confidence_threshold():
+        domain, source = decision.domain, "local"
+    else:
+        domain, source = await provider.aroute_domain(ctx.raw_text), "llm"
     ctx.metadata["domain"] = domain
-    _log(f"Domain: {domain}")
+    ctx.metadata["route"] = {"source": source, "confidence": decision.confidence}
+    ctx.emit("domain", domain=domain, source=source)
+    _log(f"Domain: {domain} ({source}, confidence {decision.confidence:.2f})")
@@ -1,31 +1,134 @@
-"""Validate and repair: compiler check with retry loop."""
+"""Validate and repair: compiler and domain grammar checks, local fixes, then LLM repair."""
 
 from __future__ import annotations
 
-from ...utils.data_models import DiagramGenerationError
+import os
+
+from ...utils.candidates import get_candidate_policy
+from ...utils.complexity import get_planner
+from ...utils.data_models import DiagramGenerationError, MermaidArtifact
+from ...utils.grammar_check import CompiledGrammar, GrammarViolation, compile_grammar, format_violations
 from ...utils.llm import LLMProvider
-from .. import PipelineContext, _log
+from ...utils.metrics import record_repair
+from ...utils.repair_rules import repair_locally
+from .. import PipelineContext, _log, declares
+
+
+async def check_artifact(
+    artifact: MermaidArtifact, grammar: CompiledGrammar | None, *, unchanged: frozenset[str] = frozenset()
+) -> tuple[bool, str, list[GrammarViolation]]:
+    """Compile check, then the domain grammar: ``(ok, error message, grammar violations)``.
+
+    Grammar violations on lines found verbatim in *unchanged* (the diagram
+    before an edit) were already accepted, so only edited lines are judged.
+    """
+    ok, error_msg = await artifact.acompile_check()
+    if not ok or grammar is None:
+        return ok, error_msg, []
+    violations = grammar.check(artifact.code)
+    if unchanged:
+        lines = artifact.code.splitlines()
+        violations = [v for v in violations if _line(lines, v.line) not in unchanged]
+    if violations:
+        return False, format_violations(violations), violations
+    return True, "", []
+
+
+def _line(lines: list[str], number: int) -> str:
+    return lines[number - 1].strip() if 0 < number <= len(lines) else ""
+
+
+def _repair_mode() -> str:
+    """REPAIR_MODE: 'patch' asks for line-range fixes around the error, 'full' for the whole diagram."""
+    return os.environ.get("REPAIR_MODE", "patch").lower()
 
 
-def validate_and_repair(ctx: PipelineContext, provider: LLMProvider) -> None:
+async def _llm_repair(
+    artifact: MermaidArtifact, error_msg: str, provider: LLMProvider, domain: str
+) -> MermaidArtifact:
+    if _repair_mode() == "patch" and provider.supports_repair_patch:
+        try:
+            patch = await provider.arepair_patch(artifact.code, error_msg)
+            code = patch.apply(artifact.code)
+        except ValueError as exc:  # malformed JSON, or ranges that don't fit the diagram
+            record_repair("patch_failed", domain)
+            _log(f"Patch repair failed ({exc.__class__.__name__}); falling back to full repair")
+        else:
+            record_repair("patch", domain)
+            _log(f"Applied {len(patch.patches)} patch(es)")
+            return MermaidArtifact(code=code, explanation=patch.explanation or artifact.explanation)
+    record_repair("full", domain)
+    return await provider.arepair_code(artifact.code, error_msg)
+
+
+def _observe_first_draft(ctx: PipelineContext, domain: str, ok: bool) -> None:
+    """Feed the adaptive policies: candidate count (parallel) and refine-or-not (auto)."""
+    if "candidates" not in ctx.metadata:
+        get_candidate_policy().observe(domain, ok)
+    plan = ctx.metadata.get("plan")
+    if plan is not None:
+        get_planner().observe(domain, plan["path"], ok, plan["score"])
+
+
+@declares(
+    reads=("artifact", "max_retries", "grammar", "candidates", "plan", "base_code"),
+    writes=("artifact", "error", "grammar_violations", "local_repairs"),
+)
+async def validate_and_repair(ctx: PipelineContext, provider: LLMProvider) -> None:
     assert ctx.artifact is not None, "No artifact to validate — 'generate' step must run first"
+    if ctx.metadata.get("candidates", {}).get("valid"):
+        ctx.artifact.is_valid = True  # the winning candidate was checked as it arrived
+        ctx.emit("validated", attempt=1)
+        return
+
+    grammar = ctx.metadata.get("grammar")
+    domain = ctx.metadata.get("domain", "")
+    checker = compile_grammar(grammar) if grammar else None
+    base_code = ctx.metadata.get("base_code")
+    unchanged = frozenset(line.strip() for line in base_code.splitlines()) if base_code else frozenset()
 
     last_error = ""
     for attempt in range(ctx.max_retries):
-        ok, error_msg = ctx.artifact.compile_check()
+        ok, error_msg, _ = await check_artifact(ctx.artifact, checker, unchanged=unchanged)
+        if attempt == 0 and base_code is None:
+            _observe_first_draft(ctx, domain or "general", ok)
         if ok:
             ctx.artifact.is_valid = True
             _log("Validation passed ✓")
+            ctx.emit("validated", attempt=attempt + 1)
             return
 
         _log(f"Validation failed (attempt {attempt + 1}/{ctx.max_retries}): {error_msg}")
+        ctx.emit("validation_failed", attempt=attempt + 1, error=error_msg)
         last_error = error_msg
+
+        local = repair_locally(ctx.artifact.code)
+        if local is not None and local.ok:
+            record_repair("rules", domain)
+            _log(f"Applied local fixes: {', '.join(local.rules)}")
+            ctx.artifact = MermaidArtifact(code=local.code, explanation=ctx.artifact.explanation)
+            ctx.metadata.setdefault("local_repairs", []).extend(local.rules)
+            ctx.emit("repair", attempt=attempt + 1, code=ctx.artifact.code, source="rules")
+            ok, error_msg, _ = await check_artifact(ctx.artifact, checker, unchanged=unchanged)
+            if ok:
+                ctx.artifact.is_valid = True
+                _log("Validation passed ✓")
+                ctx.emit("validated", attempt=attempt + 1)
+                return
+            last_error = error_msg
+
         _log("Requesting repair...")
-        ctx.artifact = provider.repair_code(ctx.artifact.code, error_msg)
+        ctx.artifact = await _llm_repair(ctx.artifact, error_msg, provider, domain)
+        ctx.emit("repair", attempt=attempt + 1, code=ctx.artifact.code, source="llm")
 
-    ok, error_msg = ctx.artifact.compile_check()
-    if ok:
+    ok, error_msg, violations = await check_artifact(ctx.artifact, checker, unchanged=unchanged)
+    if ok or violations:
+        # a diagram that renders but still bends the grammar is kept, with the violations noted
         ctx.artifact.is_valid = True
+        if violations:
+            ctx.metadata["grammar_violations"] = [str(v) for v in violations]
+            _log(f"Keeping diagram with {len(violations)} grammar violation(s)")
+        ctx.emit("validated", attempt=ctx.max_retries + 1)
         return
 
     ctx.error = last_error
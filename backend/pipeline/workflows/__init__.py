@@ -1,10 +1,22 @@
-"""Workflow auto-discovery — import all modules in this package to trigger registration."""
+"""Workflow modules — each registers one pipeline under its module name when imported.
+
+Listed statically so looking up one workflow imports only that module;
+add new workflows here.
+"""
 
-from pathlib import Path
 import importlib
 
-_dir = Path(__file__).parent
-for _f in _dir.glob("*.py"):
-    if _f.name.startswith("_"):
-        continue
-    importlib.import_module(f"{__package__}.{_f.stem}")
+WORKFLOWS = ("auto", "default", "edit", "fast", "parallel")
+
+
+def load(name: str) -> bool:
+    """Import the module registering *name*; False if there is no such workflow."""
+    if name not in WORKFLOWS:
+        return False
+    importlib.import_module(f"{__package__}.{name}")
+    return True
+
+
+def load_all() -> None:
+    for name in WORKFLOWS:
+        load(name)
@@ -0,0 +1,12 @@
+"""Auto workflow: route → refine only if the input needs it → constrain → generate → validate."""
+
+from .. import Pipeline, register
+from ..steps import route, adaptive_refine, constrain, generate, validate_and_repair
+
+register("auto", Pipeline([
+    route,
+    adaptive_refine,
+    constrain,
+    generate,
+    validate_and_repair,
+]))
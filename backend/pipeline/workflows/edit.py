@@ -0,0 +1,9 @@
+"""Edit workflow: apply_edit → validate (the diagram, domain and spec come from an earlier run)."""
+
+from .. import Pipeline, register
+from ..steps import apply_edit, validate_and_repair
+
+register("edit", Pipeline([
+    apply_edit,
+    validate_and_repair,
+]))
@@ -0,0 +1,12 @@
+"""Parallel workflow: route → refine → constrain → best-of-K generate → validate."""
+
+from .. import Pipeline, register
+from ..steps import route, refine, constrain, generate_best_of, validate_and_repair
+
+register("parallel", Pipeline([
+    route,
+    refine,
+    constrain,
+    generate_best_of,
+    validate_and_repair,
+]))
@@ -1,34 +1,53 @@
-"""Prompt template loader."""
+"""Prompt registry — templates, style guides and grammars loaded once, system prompts precomputed.
 
+Everything under this directory is read into memory on first use and every
+assembled system prompt is memoised per (step, domain, diagram_type), so the
+request path does no disk I/O or string building and the prompt prefixes sent
+upstream are byte-for-byte stable. Set PROMPTS_HOT_RELOAD=true in development
+to pick up edits to the prompt files without restarting.
+"""
+
+import functools
 import json
+import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
 
 _DIR = Path(__file__).parent
 _STYLE_DIR = _DIR / "style_guides"
 _GRAMMAR_DIR = _DIR / "grammars"
 
+_TEMPLATES = {
+    "refine": "refiner.txt",
+    "generate": "generate.txt",
+    "repair": "repair.txt",
+    "repair_patch": "repair_patch.txt",
+    "route": "router.txt",
+    "edit": "edit.txt",
+}
+
+_RELOAD_INTERVAL = 1.0
+
 # Known domains — add new .txt files to style_guides/ and register here.
 DOMAINS: set[str] = {p.stem for p in _STYLE_DIR.glob("*.txt")}
 
+
 def _read(name: str) -> str:
     return (_DIR / name).read_text().strip()
 
-def get_style_guide(domain: str = "general") -> str:
-    path = _STYLE_DIR / f"{domain}.txt"
-    if not path.exists():
-        path = _STYLE_DIR / "general.txt"
-    return path.read_text().strip()
-
-
-def get_grammar(domain: str) -> dict | None:
-    path = _GRAMMAR_DIR / f"{domain}.json"
-    if not path.exists():
-        return None
-    return json.loads(path.read_text())
-
 
 def format_grammar_prompt(grammar: dict) -> str:
     """Turn a grammar dict into a prompt-friendly constraint block."""
+    registry = _registry()
+    domain = grammar.get("domain", "")
+    if registry.grammars.get(domain) is grammar:
+        return registry.grammar_prompts[domain]
+    return _format_grammar_prompt(grammar)
+
+
+def _format_grammar_prompt(grammar: dict) -> str:
     lines = [
         "## Domain Grammar Constraints",
         "",
@@ -38,6 +57,8 @@ def format_grammar_prompt(grammar: dict) -> str:
         "Do NOT invent node types outside this list.",
         "Do NOT create connections between types unless they appear in the valid connections list.",
         "You may omit types that are not relevant to the user's description.",
+        "In flowcharts, tag every node with its type using Mermaid class syntax,",
+        "e.g. `train[Fine-tune]:::TRAINER` — diagrams are checked against this grammar.",
         "",
         "### Allowed Node Types",
         "",
@@ -56,12 +77,111 @@ def format_grammar_prompt(grammar: dict) -> str:
     ]
     return "\n".join(lines)
 
-REFINER_BASE = _read("refiner.txt")
-GENERATE_BASE = _read("generate.txt")
-REPAIR_SYSTEM = _read("repair.txt")
-ROUTER_SYSTEM = _read("router.txt")
+
+# ── Registry ──────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class _Registry:
+    templates: dict[str, str]
+    style_guides: dict[str, str]
+    grammars: dict[str, dict]
+    grammar_prompts: dict[str, str]
+    mtime: float
+
+
+def _files() -> list[Path]:
+    return [_DIR / name for name in _TEMPLATES.values()] + sorted(_STYLE_DIR.glob("*.txt")) + sorted(
+        _GRAMMAR_DIR.glob("*.json")
+    )
+
+
+def _latest_mtime() -> float:
+    return max(p.stat().st_mtime for p in _files())
+
+
+def _load() -> _Registry:
+    grammars = {p.stem: json.loads(p.read_text()) for p in sorted(_GRAMMAR_DIR.glob("*.json"))}
+    return _Registry(
+        templates={step: _read(name) for step, name in _TEMPLATES.items()},
+        style_guides={p.stem: p.read_text().strip() for p in sorted(_STYLE_DIR.glob("*.txt"))},
+        grammars=grammars,
+        grammar_prompts={domain: _format_grammar_prompt(g) for domain, g in grammars.items()},
+        mtime=_latest_mtime(),
+    )
+
+
+_current: _Registry | None = None
+_checked_at = 0.0
+_lock = threading.Lock()
+_HOT_RELOAD = os.environ.get("PROMPTS_HOT_RELOAD", "false").lower() in ("true", "1", "yes")
+
+
+def _registry() -> _Registry:
+    global _current, _checked_at
+    if _current is not None and not _HOT_RELOAD:
+        return _current
+    with _lock:
+        now = time.monotonic()
+        if _current is None:
+            _current, _checked_at = _load(), now
+        elif now - _checked_at >= _RELOAD_INTERVAL:
+            _checked_at = now
+            if _latest_mtime() > _current.mtime:
+                reload()
+    return _current
+
+
+def reload() -> None:
+    """Re-read every prompt file and drop memoised system prompts."""
+    global _current
+    _current = _load()
+    _system_prompt.cache_clear()
+
+
+def get_style_guide(domain: str = "general") -> str:
+    guides = _registry().style_guides
+    return guides.get(domain) or guides["general"]
+
+
+def get_grammar(domain: str) -> dict | None:
+    """Shared, preloaded grammar for *domain* — treat it as read-only."""
+    return _registry().grammars.get(domain)
+
+
+def grammar_prompt(domain: str) -> str | None:
+    """Precomputed constraint block for *domain*, or None when the domain has no grammar."""
+    return _registry().grammar_prompts.get(domain)
+
+
+def template(step: str) -> str:
+    """Raw template text for *step* (route, refine, generate, repair, repair_patch, edit)."""
+    return _registry().templates[step]
+
+
+def system_prompt(step: str, domain: str = "general", diagram_type: str = "auto") -> str:
+    """Ready-made system prompt for the route, refine and generate steps."""
+    _registry()  # picks up edits when hot reload is on
+    return _system_prompt(step, domain, diagram_type)
+
+
+@functools.lru_cache(maxsize=256)
+def _system_prompt(step: str, domain: str, diagram_type: str) -> str:
+    templates = _registry().templates
+    if step == "route":
+        return templates["route"]
+    if step == "refine":
+        return templates["refine"] + "\n\n" + get_style_guide(domain)
+    if step == "generate":
+        return templates["generate"].format(diagram_type=diagram_type) + "\n\n" + get_style_guide(domain)
+    raise ValueError(f"No precomputed system prompt for step '{step}'")
+
+
+REFINER_BASE = _registry().templates["refine"]
+GENERATE_BASE = _registry().templates["generate"]
+REPAIR_SYSTEM = _registry().templates["repair"]
+ROUTER_SYSTEM = _registry().templates["route"]
 
 # Backwards-compatible defaults (general style guide baked in).
 STYLE_GUIDE = get_style_guide("general")
-REFINER_SYSTEM = REFINER_BASE + "\n\n" + STYLE_GUIDE
+REFINER_SYSTEM = system_prompt("refine")
 GENERATE_SYSTEM = GENERATE_BASE + "\n\n" + STYLE_GUIDE
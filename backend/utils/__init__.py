@@ -1,19 +1,53 @@
-from .data_models import DiagramGenerationError, DiagramRequest, MermaidArtifact, ProviderError
-from .env import load_dotenv
-from .llm import LLMProvider
-from .orchestrator import Orchestrator, PipelineResult
-from .providers import OpenAIProvider, OllamaProvider, build_provider
-
-__all__ = [
-    "DiagramGenerationError",
-    "DiagramRequest",
-    "LLMProvider",
-    "MermaidArtifact",
-    "OllamaProvider",
-    "OpenAIProvider",
-    "Orchestrator",
-    "PipelineResult",
-    "ProviderError",
-    "build_provider",
-    "load_dotenv",
-]
+"""Public API of the backend; submodules are imported on first attribute access."""
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+_EXPORTS = {
+    "DiagramGenerationError": "data_models",
+    "DiagramRequest": "data_models",
+    "MermaidArtifact": "data_models",
+    "ProviderError": "data_models",
+    "load_dotenv": "env",
+    "LLMProvider": "llm",
+    "Orchestrator": "orchestrator",
+    "PipelineResult": "orchestrator",
+    "LoadBalancedProvider": "providers",
+    "OllamaProvider": "providers",
+    "OpenAIProvider": "providers",
+    "build_provider": "providers",
+    "bypass_llm_cache": "providers",
+    "get_provider": "providers",
+    "set_provider": "providers",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+if TYPE_CHECKING:
+    from .data_models import DiagramGenerationError, DiagramRequest, MermaidArtifact, ProviderError
+    from .env import load_dotenv
+    from .llm import LLMProvider
+    from .orchestrator import Orchestrator, PipelineResult
+    from .providers import (
+        LoadBalancedProvider,
+        OllamaProvider,
+        OpenAIProvider,
+        build_provider,
+        bypass_llm_cache,
+        get_provider,
+        set_provider,
+    )
@@ -0,0 +1,89 @@
+"""Admission control for the API: bound in-flight pipelines, queue a few more, shed the rest.
+
+Requests beyond ``max_inflight`` wait in a bounded queue for up to
+``queue_timeout`` seconds. A full queue is rejected at once (429), as is any
+request when the provider's rate limiter is already backed up further than
+the queue timeout — it would only time out upstream. A request that waits
+its whole timeout gets a 503. Both carry a suggested ``retry_after``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+from .metrics import record_admission
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, *, status: int, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_inflight: int,
+        max_queue: int,
+        queue_timeout: float,
+        backlog: Callable[[], float] = lambda: 0.0,
+    ):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._backlog = backlog
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        backlog = self._backlog()
+        if backlog > self.queue_timeout:
+            record_admission("throttled")
+            raise Overloaded("Upstream rate limit reached", status=503, retry_after=backlog)
+        if self._slots.locked():
+            if self._waiting >= self.max_queue:
+                record_admission("queue_full")
+                raise Overloaded("Too many requests queued", status=429, retry_after=self.queue_timeout)
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except TimeoutError:
+                record_admission("timeout")
+                raise Overloaded("Timed out waiting for capacity", status=503, retry_after=self.queue_timeout) from None
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+        record_admission("admitted")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+_controller: AdmissionController | None = None
+_controller_ready = False
+_controller_lock = threading.Lock()
+
+
+def get_admission(backlog: Callable[[], float] = lambda: 0.0) -> AdmissionController | None:
+    """Process-wide controller from API_MAX_INFLIGHT (0 disables), API_MAX_QUEUE and API_QUEUE_TIMEOUT."""
+    global _controller, _controller_ready
+    with _controller_lock:
+        if not _controller_ready:
+            max_inflight = int(os.environ.get("API_MAX_INFLIGHT", "32"))
+            if max_inflight > 0:
+                _controller = AdmissionController(
+                    max_inflight,
+                    int(os.environ.get("API_MAX_QUEUE", "64")),
+                    float(os.environ.get("API_QUEUE_TIMEOUT", "30")),
+                    backlog,
+                )
+            _controller_ready = True
+        return _controller
@@ -0,0 +1,125 @@
+"""Run many prompts through the pipeline with bounded concurrency."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterable
+
+from .data_models import DiagramGenerationError, ProviderError
+from .llm import LLMProvider
+from .log import get_logger
+from .orchestrator import Orchestrator
+
+
+@dataclass
+class BatchItem:
+    id: str
+    text: str
+    diagram_type: str = "auto"
+    pipeline: str | None = None
+
+    @classmethod
+    def parse(cls, raw: Any, index: int) -> BatchItem:
+        """Accept ``{"id", "text", "diagram_type", "pipeline"}`` objects or bare prompt strings."""
+        if isinstance(raw, str):
+            return cls(id=str(index), text=raw)
+        if not isinstance(raw, dict) or not raw.get("text"):
+            raise ValueError(f"Batch item {index} needs a 'text' field")
+        return cls(
+            id=str(raw.get("id", index)),
+            text=raw["text"],
+            diagram_type=raw.get("diagram_type", "auto"),
+            pipeline=raw.get("pipeline"),
+        )
+
+
+def read_jsonl(path: str | Path) -> list[BatchItem]:
+    items = []
+    with open(path) as f:
+        for index, line in enumerate(f):
+            if line.strip():
+                items.append(BatchItem.parse(json.loads(line), index))
+    return items
+
+
+def completed_ids(checkpoint: str | Path) -> set[str]:
+    """IDs that already succeeded in a previous run's output; failed items are retried."""
+    path = Path(checkpoint)
+    if not path.exists():
+        return set()
+    done = set()
+    for line in path.read_text().splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # partially written last line from an interrupted run
+        if record.get("ok"):
+            done.add(str(record["id"]))
+    return done
+
+
+async def run_batch(
+    items: Iterable[BatchItem],
+    provider: LLMProvider,
+    *,
+    concurrency: int = 4,
+    pipeline: str = "default",
+    max_retries: int = 3,
+) -> AsyncIterator[dict[str, Any]]:
+    """Yield one result record per item, in completion order.
+
+    All items share *provider* (and so its connection pool and caches); at
+    most *concurrency* pipelines are in flight at once.
+    """
+    orchestrators: dict[str, Orchestrator] = {}
+    pending = iter(items)
+    results: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+    def orchestrator_for(name: str) -> Orchestrator:
+        if name not in orchestrators:
+            orchestrators[name] = Orchestrator(provider, name, max_retries=max_retries)
+        return orchestrators[name]
+
+    async def worker() -> None:
+        try:
+            for item in pending:
+                await results.put(await _run_one(item, lambda: orchestrator_for(item.pipeline or pipeline)))
+        finally:
+            results.put_nowait(None)  # the consumer counts these; a missing one would hang it
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(concurrency, 1))]
+    try:
+        remaining = len(workers)
+        while remaining:
+            record = await results.get()
+            if record is None:
+                remaining -= 1
+            else:
+                yield record
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+async def _run_one(item: BatchItem, orchestrator: Callable[[], Orchestrator]) -> dict[str, Any]:
+    try:
+        result = await orchestrator().arun(item.text, diagram_type=item.diagram_type)
+    except (DiagramGenerationError, ProviderError, ValueError) as exc:
+        return {"id": item.id, "ok": False, "error": f"{type(exc).__name__}: {exc}"}
+    except Exception as exc:  # one bad item must not take its worker (and the batch) down
+        _logger.exception(f"Batch item {item.id!r} failed")
+        return {"id": item.id, "ok": False, "error": f"{type(exc).__name__}: {exc}"}
+    return {
+        "id": item.id,
+        "ok": True,
+        "code": result.artifact.code,
+        "explanation": result.artifact.explanation,
+        "is_valid": result.artifact.is_valid,
+        "domain": result.metadata.get("domain", "general"),
+    }
+
+
+_logger = get_logger("batch")
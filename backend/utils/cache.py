@@ -0,0 +1,227 @@
+"""Small key/value caches — in-memory LRU, sqlite, and a two-tier combination."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+
+from .metrics import record_cache_lookup
+
+
+class Cache(ABC):
+    """Values must be JSON-serialisable and not None (None means miss)."""
+
+    name: str | None = None  # labels hit/miss counts in /metrics; unnamed caches (e.g. tiers) are not counted
+
+    def get(self, key: str) -> Any | None:
+        value = self._get(key)
+        if self.name is not None:
+            record_cache_lookup(self.name, hit=value is not None)
+        return value
+
+    @abstractmethod
+    def _get(self, key: str) -> Any | None: ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None: ...
+
+    @abstractmethod
+    def update(self, key: str, fn: Callable[[Any | None], Any | None]) -> Any | None:
+        """Atomically replace the value with ``fn(current)``; ``fn`` returning None leaves it as is.
+
+        Returns what was stored, or None if nothing was.
+        """
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+
+class MemoryCache(Cache):
+    """Thread-safe LRU with an optional per-entry TTL in seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def update(self, key: str, fn: Callable[[Any | None], Any | None]) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            current = entry[1] if entry is not None and not (entry[0] and entry[0] < time.monotonic()) else None
+            value = fn(current)
+            if value is not None:
+                self._data[key] = (time.monotonic() + self.ttl if self.ttl else 0.0, value)
+                self._data.move_to_end(key)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteCache(Cache):
+    """Disk-backed cache that several processes can share (WAL mode)."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        table: str = "cache",
+        ttl: float | None = None,
+        max_entries: int | None = None,
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name '{table}'")
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=10.0)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _get(self, key: str) -> Any | None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires and expires < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        expires = now + self.ttl if self.ttl else 0.0
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires, now),
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def update(self, key: str, fn: Callable[[Any | None], Any | None]) -> Any | None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")  # hold the write lock across read and write, for other processes too
+            row = self._conn.execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            current = json.loads(row[0]) if row is not None and not (row[1] and row[1] < now) else None
+            value = fn(current)
+            if value is not None:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + self.ttl if self.ttl else 0.0, now),
+                )
+        return value
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+
+class TieredCache(Cache):
+    """Memory tier in front of a shared disk tier; disk hits are promoted to memory."""
+
+    def __init__(self, memory: MemoryCache, disk: SqliteCache):
+        self.memory = memory
+        self.disk = disk
+
+    def _get(self, key: str) -> Any | None:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def update(self, key: str, fn: Callable[[Any | None], Any | None]) -> Any | None:
+        """Decided by the disk tier, which other processes share; memory only mirrors the outcome."""
+        value = self.disk.update(key, fn)
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+
+def build_cache(
+    *,
+    size: int,
+    path: str | None = None,
+    table: str = "cache",
+    ttl: float | None = None,
+) -> Cache | None:
+    """Memory cache of *size* entries, tiered over sqlite when *path* is set; None if size <= 0.
+
+    Lookups are counted in ``/metrics`` under *table*.
+    """
+    if size <= 0:
+        return None
+    memory = MemoryCache(maxsize=size, ttl=ttl)
+    cache: Cache = memory
+    if path:
+        cache = TieredCache(memory, SqliteCache(path, table=table, ttl=ttl, max_entries=size * 16))
+    cache.name = table
+    return cache
+
+
+def content_key(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
@@ -0,0 +1,70 @@
+"""How many candidate drafts to generate, adapted per domain to the observed failure rate.
+
+Each first draft that fails validation nudges the domain's failure estimate
+up (an exponentially weighted average, starting from a pessimistic prior);
+the candidate count is the smallest K for which all K drafts failing is
+unlikely, capped by GENERATE_CANDIDATES.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from dataclasses import dataclass
+
+_PRIOR_FAILURE = 0.3
+_ALPHA = 0.1
+_MISS_TARGET = 0.05
+_DEFAULT_MAX = 3
+
+
+@dataclass
+class DomainStats:
+    failure_rate: float = _PRIOR_FAILURE
+    observed: int = 0
+
+
+class CandidatePolicy:
+    def __init__(self, max_candidates: int = _DEFAULT_MAX, miss_target: float = _MISS_TARGET):
+        self.max_candidates = max(1, max_candidates)
+        self.miss_target = miss_target
+        self._domains: dict[str, DomainStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, domain: str, valid: bool) -> None:
+        """Record whether a first draft for *domain* passed validation."""
+        with self._lock:
+            stats = self._domains.setdefault(domain, DomainStats())
+            stats.failure_rate += _ALPHA * ((0.0 if valid else 1.0) - stats.failure_rate)
+            stats.observed += 1
+
+    def count(self, domain: str) -> int:
+        """Candidates so that P(all fail) ≤ miss_target, between 1 and max_candidates."""
+        with self._lock:
+            rate = self._domains.get(domain, DomainStats()).failure_rate
+        if rate <= self.miss_target:
+            return 1
+        if rate >= 1.0:
+            return self.max_candidates
+        return max(1, min(self.max_candidates, math.ceil(math.log(self.miss_target) / math.log(rate))))
+
+    def as_dict(self) -> dict[str, dict[str, float | int]]:
+        with self._lock:
+            return {
+                domain: {"failure_rate": round(s.failure_rate, 4), "observed": s.observed}
+                for domain, s in sorted(self._domains.items())
+            }
+
+
+_policy: CandidatePolicy | None = None
+_policy_lock = threading.Lock()
+
+
+def get_candidate_policy() -> CandidatePolicy:
+    """Process-wide policy; GENERATE_CANDIDATES caps K (1 disables parallel drafts)."""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = CandidatePolicy(int(os.environ.get("GENERATE_CANDIDATES", _DEFAULT_MAX)))
+        return _policy
@@ -0,0 +1,143 @@
+"""Decide per input whether the refine step is worth its LLM round trip.
+
+Short prompts that name a few components ("Login system with 2FA") gain
+little from being rewritten into a spec, so the ``auto`` workflow sends
+them straight to generation. The decision combines a complexity score
+(length, components named, relations between them) with how often each
+path has produced a valid first draft for the domain so far.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+from .domain_router import tokenize
+
+_DEFAULT_THRESHOLD = 1.0
+_PRIOR_VALID = 0.8
+_ALPHA = 0.1
+_MARGIN = 0.1  # how much worse the minimal path may do before refine takes over
+_EXPLORE_EVERY = 10  # keep sampling the minimal path so its estimate can recover
+
+_PROPER = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-Z][A-Za-z0-9]*[a-z0-9][A-Za-z0-9]*\b|\b[A-Z]{2,}\b")
+_RELATION = re.compile(
+    r"->|→|[,;]|\b(?:then|and|or|to|from|into|via|calls?|sends?|reads?|writes?|stores?|publishes?|"
+    r"consumes?|triggers?|returns?|uses?|depends?|contains?|owns?|inherits?|extends?)\b",
+    re.IGNORECASE,
+)
+
+MINIMAL = "minimal"
+REFINE = "refine"
+
+
+@dataclass(frozen=True)
+class Complexity:
+    score: float
+    words: int
+    entities: int
+    relations: int
+
+
+@functools.cache
+def _vocabulary(domain: str) -> frozenset[str]:
+    """Terms naming the domain's component types (empty for domains without a grammar)."""
+    from ..prompts import get_grammar
+
+    grammar = get_grammar(domain)
+    if grammar is None:
+        return frozenset()
+    text = " ".join(f"{nt['id'].replace('_', ' ')} {nt['label']}" for nt in grammar["node_types"])
+    return frozenset(tokenize(text))
+
+
+def measure(text: str, domain: str = "general") -> Complexity:
+    """Roughly 1.0 for a paragraph naming half a dozen components and how they connect."""
+    terms = tokenize(text)
+    vocabulary = _vocabulary(domain)
+    entities = {t for t in terms if t in vocabulary} | {m.lower() for m in _PROPER.findall(text)}
+    relations = len(_RELATION.findall(text))
+    score = len(terms) / 50 + len(entities) / 8 + relations / 12
+    return Complexity(round(score, 3), len(terms), len(entities), relations)
+
+
+# ── Outcome history ───────────────────────────────────────────────────
+
+@dataclass
+class _PathStats:
+    valid_rate: float = _PRIOR_VALID
+    observed: int = 0
+
+
+@dataclass(frozen=True)
+class Plan:
+    path: str
+    reason: str
+    complexity: Complexity
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "reason": self.reason,
+            "score": self.complexity.score,
+            "words": self.complexity.words,
+            "entities": self.complexity.entities,
+            "relations": self.complexity.relations,
+        }
+
+
+@dataclass
+class WorkflowPlanner:
+    threshold: float = _DEFAULT_THRESHOLD
+    _stats: dict[tuple[str, str], _PathStats] = field(default_factory=dict)
+    _simple_seen: dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def plan(self, text: str, domain: str) -> Plan:
+        complexity = measure(text, domain)
+        if complexity.score >= self.threshold:
+            return Plan(REFINE, "complex", complexity)
+        with self._lock:
+            minimal = self._stats.get((domain, MINIMAL), _PathStats()).valid_rate
+            refined = self._stats.get((domain, REFINE), _PathStats()).valid_rate
+            seen = self._simple_seen[domain] = self._simple_seen.get(domain, 0) + 1
+        if minimal < refined - _MARGIN and seen % _EXPLORE_EVERY:
+            return Plan(REFINE, "history", complexity)
+        return Plan(MINIMAL, "simple", complexity)
+
+    def observe(self, domain: str, path: str, valid: bool, score: float) -> None:
+        """Record whether the first draft on *path* validated without repair.
+
+        Only inputs below the threshold count: those above it are always
+        refined and are harder, so they would make refining look worse than
+        it is on the simple inputs where the two paths are compared.
+        """
+        if score >= self.threshold:
+            return
+        with self._lock:
+            stats = self._stats.setdefault((domain, path), _PathStats())
+            stats.valid_rate += _ALPHA * ((1.0 if valid else 0.0) - stats.valid_rate)
+            stats.observed += 1
+
+    def as_dict(self) -> dict[str, dict[str, dict[str, float | int]]]:
+        with self._lock:
+            out: dict[str, dict[str, dict[str, float | int]]] = {}
+            for (domain, path), s in sorted(self._stats.items()):
+                out.setdefault(domain, {})[path] = {"valid_rate": round(s.valid_rate, 4), "observed": s.observed}
+            return out
+
+
+_planner: WorkflowPlanner | None = None
+_planner_lock = threading.Lock()
+
+
+def get_planner() -> WorkflowPlanner:
+    """Process-wide planner; AUTO_REFINE_THRESHOLD sets the score above which refine always runs."""
+    global _planner
+    with _planner_lock:
+        if _planner is None:
+            _planner = WorkflowPlanner(float(os.environ.get("AUTO_REFINE_THRESHOLD", _DEFAULT_THRESHOLD)))
+        return _planner
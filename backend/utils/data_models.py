@@ -2,14 +2,23 @@
 
 from __future__ import annotations
 
+import asyncio
+import base64
+import os
 import re
 import shutil
 import subprocess
 import tempfile
+import time
 from typing import Literal
 
 from pydantic import BaseModel, Field
 
+from .cache import Cache, build_cache, content_key
+from .mermaid_syntax import check_structure, checks_structure
+from .metrics import record_mmdc
+from .mmdc_pool import PoolUnavailable, get_pool, mmdc_version
+
 DiagramType = Literal["sequence", "flowchart", "class", "erd", "auto"]
 
 _DIRECTIVES = {
@@ -26,7 +35,9 @@ class DiagramGenerationError(Exception):
 
 
 class ProviderError(Exception):
-    pass
+    def __init__(self, message: str = "", *, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds the upstream asked us to back off, if it did
 
 
 class DiagramRequest(BaseModel):
@@ -57,13 +68,20 @@ class MermaidArtifact(BaseModel):
         if _DANGEROUS.search(code):
             return False, "Code contains potentially dangerous content"
 
+        if len(code.strip().splitlines()) < 2:
+            return False, "Diagram body is empty (only directive line found)"
+
+        issue = check_structure(code)
+        if issue is not None:
+            return False, str(issue)
+
+        if checks_structure(first_word):
+            return True, ""  # brackets already matched, without counting ER cardinality braces
+
         for open_ch, close_ch in [("{", "}"), ("[", "]"), ("(", ")")]:
             if code.count(open_ch) != code.count(close_ch):
                 return False, f"Unbalanced '{open_ch}' / '{close_ch}'"
 
-        if len(code.strip().splitlines()) < 2:
-            return False, "Diagram body is empty (only directive line found)"
-
         return True, ""
 
     def compile_check(self) -> tuple[bool, str]:
@@ -75,21 +93,212 @@ class MermaidArtifact(BaseModel):
         if not mmdc:
             return True, ""
 
-        with tempfile.TemporaryDirectory() as tmp:
-            in_path = f"{tmp}/input.mmd"
-            out_path = f"{tmp}/output.svg"
-            with open(in_path, "w") as f:
-                f.write(self.code)
-            result = subprocess.run(
-                [mmdc, "-i", in_path, "-o", out_path, "--quiet"],
-                capture_output=True, text=True, timeout=30,
-            )
+        cache = get_validation_cache()
+        key = content_key(self.code, mmdc_version())
+        if cache is not None and (hit := cache.get(key)) is not None:
+            return hit[0], hit[1]
 
-        if result.returncode == 0:
+        started = time.perf_counter()
+        try:
+            ok, err, svg = _run_mmdc(mmdc, self.code)
+        except (TimeoutError, subprocess.TimeoutExpired):
+            # transient — don't cache
+            return False, "Mermaid render timed out"
+        finally:
+            record_mmdc(time.perf_counter() - started)
+
+        if cache is not None:
+            cache.set(key, [ok, err])
+        _keep_render(self.code, svg)
+        return ok, err
+
+    async def acompile_check(self) -> tuple[bool, str]:
+        """Async :meth:`compile_check` — mmdc runs without blocking the event loop."""
+        ok, err = self.validate_syntax()
+        if not ok:
+            return ok, err
+
+        mmdc = shutil.which("mmdc")
+        if not mmdc:
             return True, ""
 
-        stderr = result.stderr.strip()
-        for line in stderr.splitlines():
-            if "Error:" in line or "Expecting" in line:
-                return False, line.strip()
-        return False, stderr[:300] if stderr else "mmdc exited with non-zero status"
\ No newline at end of file
+        cache = get_validation_cache()
+        key = content_key(self.code, mmdc_version())
+        if cache is not None and (hit := cache.get(key)) is not None:
+            return hit[0], hit[1]
+
+        started = time.perf_counter()
+        try:
+            ok, err, svg = await _arun_mmdc(mmdc, self.code)
+        except TimeoutError:
+            return False, "Mermaid render timed out"
+        finally:
+            record_mmdc(time.perf_counter() - started)
+
+        if cache is not None:
+            cache.set(key, [ok, err])
+        await asyncio.to_thread(_keep_render, self.code, svg)
+        return ok, err
+
+
+class LinePatch(BaseModel):
+    start: int = Field(ge=1, description="First line to replace (1-based)")
+    end: int = Field(ge=0, description="Last line to replace, inclusive; start - 1 inserts before start")
+    replacement: str = ""
+
+
+class RepairPatch(BaseModel):
+    patches: list[LinePatch]
+    explanation: str = ""
+
+    def apply(self, code: str) -> str:
+        """Apply the line-range replacements to *code*; raises ValueError if they don't fit."""
+        lines = code.splitlines()
+        taken = 0
+        for patch in sorted(self.patches, key=lambda p: p.start):
+            if patch.end < patch.start - 1 or patch.end > len(lines):
+                raise ValueError(
+                    f"Patch range {patch.start}-{patch.end} is outside the {len(lines)}-line diagram"
+                )
+            if patch.start <= taken:
+                raise ValueError(f"Patch at line {patch.start} overlaps the previous patch")
+            taken = patch.end
+        for patch in sorted(self.patches, key=lambda p: p.start, reverse=True):
+            lines[patch.start - 1:patch.end] = patch.replacement.splitlines()
+        return "\n".join(lines)
+
+
+_ERROR_LINE = re.compile(r"\bline (\d+)", re.IGNORECASE)
+
+
+def numbered_excerpt(code: str, error_msg: str, *, context: int = 3, whole_below: int = 30) -> str:
+    """Number the lines of *code* around the lines *error_msg* points at.
+
+    Short diagrams, or errors without a line number, are numbered in full.
+    """
+    lines = code.splitlines()
+    width = len(str(len(lines)))
+    focus = {int(n) for n in _ERROR_LINE.findall(error_msg) if 0 < int(n) <= len(lines)}
+    if len(lines) < whole_below or not focus:
+        keep = set(range(1, len(lines) + 1))
+    else:
+        keep = {1}  # the directive line
+        for n in focus:
+            keep.update(range(max(n - context, 1), min(n + context, len(lines)) + 1))
+
+    out: list[str] = []
+    previous = 0
+    for n in sorted(keep):
+        if n > previous + 1:
+            out.append("...")
+        out.append(f"{n:>{width}} | {lines[n - 1]}")
+        previous = n
+    if previous < len(lines):
+        out.append("...")
+    return "\n".join(out)
+
+
+# ── mmdc ──────────────────────────────────────────────────────────────
+
+_validation_cache: Cache | None = None
+_validation_cache_ready = False
+
+
+def get_validation_cache() -> Cache | None:
+    """Cache of ``(code hash, mmdc version) -> [ok, error]``; None when VALIDATION_CACHE_SIZE=0."""
+    global _validation_cache, _validation_cache_ready
+    if not _validation_cache_ready:
+        _validation_cache = build_cache(
+            size=int(os.environ.get("VALIDATION_CACHE_SIZE", "1024")),
+            path=os.environ.get("VALIDATION_CACHE_PATH") or None,
+            table="validation",
+        )
+        _validation_cache_ready = True
+    return _validation_cache
+
+
+def _keep_render(code: str, svg: bytes) -> None:
+    """The compile check already rendered an SVG; keep it for GET /render instead of discarding it."""
+    if not svg:
+        return
+    from .render_store import get_render_store
+
+    store = get_render_store()
+    if store is not None:
+        store.put(code, "svg", svg)
+
+
+def _pool_output(fmt: str, data: str) -> bytes:
+    return data.encode() if fmt == "svg" else base64.b64decode(data)
+
+
+def _read_output(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def _run_mmdc(mmdc: str, code: str, fmt: str = "svg") -> tuple[bool, str, bytes]:
+    """Render *code* to *fmt*: ``(ok, first error line, rendered bytes)``."""
+    pool = get_pool()
+    if pool is not None:
+        try:
+            ok, err, data = pool.render(code, fmt)
+            return ok, _first_error_line(f"Error: {err}") if err else "", _pool_output(fmt, data) if ok else b""
+        except PoolUnavailable:
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        in_path = f"{tmp}/input.mmd"
+        out_path = f"{tmp}/output.{fmt}"
+        with open(in_path, "w") as f:
+            f.write(code)
+        result = subprocess.run(
+            [mmdc, "-i", in_path, "-o", out_path, "--quiet"],
+            capture_output=True, text=True, timeout=30,
+        )
+        if result.returncode == 0:
+            return True, "", _read_output(out_path)
+
+    stderr = result.stderr.strip()
+    return False, _first_error_line(stderr) if stderr else "mmdc exited with non-zero status", b""
+
+
+async def _arun_mmdc(mmdc: str, code: str, fmt: str = "svg") -> tuple[bool, str, bytes]:
+    pool = get_pool()
+    if pool is not None:
+        try:
+            ok, err, data = await asyncio.to_thread(pool.render, code, fmt)
+            return ok, _first_error_line(f"Error: {err}") if err else "", _pool_output(fmt, data) if ok else b""
+        except PoolUnavailable:
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        in_path = f"{tmp}/input.mmd"
+        out_path = f"{tmp}/output.{fmt}"
+        with open(in_path, "w") as f:
+            f.write(code)
+        proc = await asyncio.create_subprocess_exec(
+            mmdc, "-i", in_path, "-o", out_path, "--quiet",
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, raw_stderr = await asyncio.wait_for(proc.communicate(), timeout=30)
+        except TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode == 0:
+            return True, "", await asyncio.to_thread(_read_output, out_path)
+
+    stderr = raw_stderr.decode(errors="replace").strip()
+    return False, _first_error_line(stderr) if stderr else "mmdc exited with non-zero status", b""
+
+
+def _first_error_line(output: str) -> str:
+    for line in output.splitlines():
+        if "Error:" in line or "Expecting" in line:
+            return line.strip()
+    return output[:300]
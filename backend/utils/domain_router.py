@@ -0,0 +1,109 @@
+"""Local domain classifier — TF-IDF over the style guides and grammars, no LLM call."""
+
+from __future__ import annotations
+
+import functools
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+_WORD = re.compile(r"[a-z][a-z0-9]+")
+_CAMEL = re.compile(r"([a-z0-9])([A-Z])")
+
+_STOPWORDS = frozenset("""
+    a an and any are as at be between both but by can do does each for from has have how if in
+    into is it its not of on one only or other over per should show so such than that the their
+    them then there these they this those through to too two use used using via was what when
+    where which while who will with within without you your
+""".split())
+
+_DEFAULT_THRESHOLD = 0.5
+_MIN_SCORE = 2.5
+
+
+def _stem(word: str) -> str:
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    text = _CAMEL.sub(r"\1 \2", text).lower()
+    return [_stem(w) for w in _WORD.findall(text) if w not in _STOPWORDS]
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    domain: str
+    confidence: float
+    scores: dict[str, float] = field(default_factory=dict)
+
+
+class LocalRouter:
+    """Scores input tokens against per-domain TF-IDF weights.
+
+    Confidence is the relative margin between the best and runner-up domain,
+    so an input that mentions both "model training" and "REST API" comes out
+    ambiguous and is left to the LLM.
+    """
+
+    def __init__(self, corpora: dict[str, str], *, min_score: float = _MIN_SCORE):
+        self.min_score = min_score
+        counts = {domain: Counter(tokenize(text)) for domain, text in corpora.items()}
+        df = Counter(term for c in counts.values() for term in c)
+        n = len(counts)
+        self.weights: dict[str, dict[str, float]] = {
+            domain: {
+                term: (1 + math.log(tf)) * math.log(n / df[term])
+                for term, tf in c.items()
+                if df[term] < n
+            }
+            for domain, c in counts.items()
+        }
+
+    def classify(self, text: str) -> RouteDecision:
+        terms = set(tokenize(text))
+        scores = {
+            domain: round(sum(w.get(t, 0.0) for t in terms), 3)
+            for domain, w in self.weights.items()
+        }
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        best = scores[ranked[0]]
+        runner_up = scores[ranked[1]] if len(ranked) > 1 else 0.0
+        if best < self.min_score:
+            return RouteDecision(ranked[0], 0.0, scores)
+        return RouteDecision(ranked[0], round((best - runner_up) / best, 3), scores)
+
+
+def _domain_corpus(domain: str) -> str:
+    from ..prompts import ROUTER_SYSTEM, get_grammar, get_style_guide
+
+    parts = [get_style_guide(domain)]
+    parts += [line for line in ROUTER_SYSTEM.splitlines() if line.startswith(f'- "{domain}"')]
+    grammar = get_grammar(domain)
+    if grammar:
+        parts.append(grammar["description"])
+        for nt in grammar["node_types"]:
+            parts.append(f"{nt['id'].replace('_', ' ')} {nt['label']} {nt['desc']}")
+        parts += [c["label"] for c in grammar["valid_connections"]]
+    return "\n".join(parts)
+
+
+@functools.cache
+def get_router() -> LocalRouter:
+    from ..prompts import DOMAINS
+
+    return LocalRouter({domain: _domain_corpus(domain) for domain in sorted(DOMAINS)})
+
+
+def confidence_threshold() -> float:
+    """ROUTER_CONFIDENCE: minimum local confidence to skip the LLM (above 1 disables local routing)."""
+    return float(os.environ.get("ROUTER_CONFIDENCE", _DEFAULT_THRESHOLD))
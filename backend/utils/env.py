@@ -3,12 +3,15 @@
 import os
 from pathlib import Path
 
+from .log import apply_log_level
+
 
 def load_dotenv() -> None:
     for candidate in [Path.cwd() / ".env", Path(__file__).resolve().parents[2] / ".env"]:
         if candidate.exists():
             _parse(candidate)
-            return
+            break
+    apply_log_level()
 
 
 def _parse(path: Path) -> None:
@@ -0,0 +1,222 @@
+"""Check a generated flowchart against a domain grammar (node types and valid connections).
+
+Grammars are compiled once into lookup tables — type ids, a label/id alias
+map for inferring untagged nodes, and an adjacency set over
+``valid_connections`` — so checking is a single linear pass over the
+diagram. Node types come from ``:::TYPE`` / ``class ... TYPE`` tags first,
+then from an id or label that names a type; nodes that can't be typed are
+left alone rather than guessed at.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass
+
+from .mermaid_syntax import flow_skeleton
+
+_FLOWCHART = re.compile(r"^(flowchart|graph)\b")
+_SKIP = re.compile(
+    r"^(%%|subgraph\b|end\b|classDef\b|style\b|linkStyle\b|click\b|direction\b|accTitle|accDescr|title\b)"
+)
+_CLASS_STATEMENT = re.compile(r"^class\s+([\w,\s]+?)\s+(\w+)\s*;?$")
+
+_INLINE_TEXT = re.compile(r"(?<![-=.])(--|==|-\.)\s+[^-=.>\s][^>]*?\s*(-->|---|==>|===|\.->|\.-)")
+_TOKEN = re.compile(
+    r"(?P<arrow><?(?:-{2,}|={2,}|-\.+-|~{3,})(?:>|[xo](?!\w))?)"
+    r"|(?P<amp>&)"
+    r"|(?P<node>\w+)(?:\s*:::\s*(?P<cls>\w+))?"
+)
+
+_NON_BLANK = re.compile(r"\S")
+
+_MAX_REPORTED = 8
+
+
+@dataclass(frozen=True)
+class GrammarViolation:
+    line: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+@dataclass(frozen=True)
+class _Edge:
+    src: str
+    dst: str
+    line: int
+    directed: bool
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+class CompiledGrammar:
+    def __init__(self, grammar: dict):
+        self.domain = grammar.get("domain", "")
+        self.types: frozenset[str] = frozenset(nt["id"] for nt in grammar["node_types"])
+        self.aliases: dict[str, str] = {}
+        for nt in grammar["node_types"]:
+            self.aliases[_normalize(nt["id"])] = nt["id"]
+            self.aliases.setdefault(_normalize(nt["label"]), nt["id"])
+        self.edges: frozenset[tuple[str, str]] = frozenset(
+            (c["from"], c["to"]) for c in grammar["valid_connections"]
+        )
+        successors: dict[str, list[str]] = {t: [] for t in self.types}
+        for src, dst in sorted(self.edges):
+            successors.setdefault(src, []).append(dst)
+        self.successors = {t: tuple(targets) for t, targets in successors.items()}
+
+    def node_type(self, node_id: str, label: str, classes: list[str]) -> str | None:
+        for cls in classes:
+            if cls in self.types:
+                return cls
+        for name in (label, node_id, node_id.rstrip("0123456789_")):
+            found = self.aliases.get(_normalize(name)) if name else None
+            if found:
+                return found
+        return None
+
+    def check(self, code: str) -> list[GrammarViolation]:
+        """Violations in *code*, in source order (empty for non-flowcharts or conforming diagrams)."""
+        parsed = _parse_flowchart(code)
+        if parsed is None:
+            return []
+        labels, classes, first_seen, edges = parsed
+
+        violations: list[GrammarViolation] = []
+        types: dict[str, str | None] = {}
+        for node_id, line in first_seen.items():
+            node_classes = classes.get(node_id, [])
+            unknown = [c for c in node_classes if c.isupper() and c not in self.types]
+            if unknown and not any(c in self.types for c in node_classes):
+                violations.append(GrammarViolation(
+                    line,
+                    f"Node '{node_id}' has unknown type '{unknown[0]}'; "
+                    f"allowed types: {', '.join(sorted(self.types))}",
+                ))
+            types[node_id] = self.node_type(node_id, labels.get(node_id, ""), node_classes)
+
+        for edge in edges:
+            src_type, dst_type = types.get(edge.src), types.get(edge.dst)
+            if src_type is None or dst_type is None:
+                continue
+            if (src_type, dst_type) in self.edges:
+                continue
+            if not edge.directed and (dst_type, src_type) in self.edges:
+                continue
+            allowed = ", ".join(self.successors.get(src_type, ())) or "nothing"
+            violations.append(GrammarViolation(
+                edge.line,
+                f"Illegal connection {edge.src} ({src_type}) → {edge.dst} ({dst_type}); "
+                f"{src_type} may only connect to: {allowed}",
+            ))
+        violations.sort(key=lambda v: v.line)
+        return violations
+
+
+def format_violations(violations: list[GrammarViolation]) -> str:
+    """One error message for the repair prompt, capped so huge diagrams don't flood it."""
+    shown = [f"- {v}" for v in violations[:_MAX_REPORTED]]
+    if len(violations) > _MAX_REPORTED:
+        shown.append(f"- ... and {len(violations) - _MAX_REPORTED} more")
+    return "Domain grammar violations:\n" + "\n".join(shown)
+
+
+# ── Parsing ───────────────────────────────────────────────────────────
+
+def _parse_flowchart(
+    code: str,
+) -> tuple[dict[str, str], dict[str, list[str]], dict[str, int], list[_Edge]] | None:
+    lines = code.splitlines()
+    header = next(
+        (i for i, line in enumerate(lines) if line.strip() and not line.strip().startswith("%%")), None
+    )
+    if header is None or not _FLOWCHART.match(lines[header].strip()):
+        return None
+
+    labels: dict[str, str] = {}
+    classes: dict[str, list[str]] = {}
+    first_seen: dict[str, int] = {}
+    edges: list[_Edge] = []
+
+    for index in range(header + 1, len(lines)):
+        lineno = index + 1
+        for statement in lines[index].split(";"):
+            text = statement.strip()
+            if not text or _SKIP.match(text):
+                continue
+            match = _CLASS_STATEMENT.match(text)
+            if match:
+                for node_id in match.group(1).replace(",", " ").split():
+                    classes.setdefault(node_id, []).append(match.group(2))
+                    first_seen.setdefault(node_id, lineno)
+                continue
+            _parse_statement(text, lineno, labels, classes, first_seen, edges)
+    return labels, classes, first_seen, edges
+
+
+def _parse_statement(
+    text: str,
+    lineno: int,
+    labels: dict[str, str],
+    classes: dict[str, list[str]],
+    first_seen: dict[str, int],
+    edges: list[_Edge],
+) -> None:
+    skeleton = flow_skeleton(text)
+    if skeleton is None:
+        return  # malformed line — the structural check reports it
+    skeleton = _INLINE_TEXT.sub(lambda m: " " * (len(m.group()) - len(m.group(2))) + m.group(2), skeleton)
+
+    groups: list[list[str]] = [[]]
+    arrows: list[str] = []
+    for token in _TOKEN.finditer(skeleton):
+        kind = token.lastgroup
+        if kind == "arrow":
+            arrows.append(token.group())
+            groups.append([])
+            continue
+        if kind == "amp":
+            continue
+        node_id = token.group("node")
+        groups[-1].append(node_id)
+        first_seen.setdefault(node_id, lineno)
+        if kind == "cls":
+            classes.setdefault(node_id, []).append(token.group("cls"))
+        if (kind != "cls" or not token.group("cls").isupper()) and node_id not in labels:
+            # untagged: keep the label for type inference; the shape was blanked
+            # in the skeleton, so it spans up to the next token
+            after = _NON_BLANK.search(skeleton, token.end())
+            shape = text[token.end():after.start() if after else len(text)].strip()
+            if shape:
+                labels[node_id] = shape.strip("[](){}<>/\\\"' ")
+
+    for arrow, sources, targets in zip(arrows, groups, groups[1:]):
+        if arrow.startswith("~"):
+            continue  # invisible link, layout only
+        head = arrow.endswith((">", "x", "o"))
+        directed = head and not arrow.startswith("<")
+        edges.extend(_Edge(src, dst, lineno, directed) for src in sources for dst in targets)
+
+
+# ── Compiled grammar cache ────────────────────────────────────────────
+
+_compiled: dict[str, tuple[dict, CompiledGrammar]] = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_grammar(grammar: dict) -> CompiledGrammar:
+    """Compiled form of *grammar*, reused for as long as the same grammar object is live."""
+    domain = grammar.get("domain", "")
+    with _compiled_lock:
+        cached = _compiled.get(domain)
+        if cached is not None and cached[0] is grammar:
+            return cached[1]
+        compiled = CompiledGrammar(grammar)
+        _compiled[domain] = (grammar, compiled)
+        return compiled
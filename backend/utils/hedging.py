@@ -0,0 +1,379 @@
+"""Several LLM backends behind one provider: per-step routing, hedged requests and failover.
+
+Each step (route, refine, generate, repair, edit) has an ordered list of
+backends, so a small local model can answer routing while a large one
+generates. A call goes to the first healthy backend in its list; if that
+has not answered within its own p95 latency for the step, a hedged copy
+goes to the next one and whichever answers first is used (the other is
+cancelled). A backend that fails is replaced by the next in line, and one
+whose recent error rate is high, or whose p95 is well above the fastest
+backend's for the step, moves to the back of the list until it recovers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, TypeVar, TYPE_CHECKING
+
+from .data_models import ProviderError
+from .llm import LLMProvider
+from .log import get_logger
+from .metrics import record_hedge
+
+if TYPE_CHECKING:
+    from .data_models import DiagramRequest, MermaidArtifact, RepairPatch
+
+T = TypeVar("T")
+
+STEPS = ("route", "refine", "generate", "repair", "edit")
+
+_WINDOW = 200
+_MIN_SAMPLES = 20
+_QUANTILE = 0.95
+_INITIAL_DELAY = 5.0  # hedge after this long until a backend has enough samples for a p95
+_ERROR_ALPHA = 0.1
+_UNHEALTHY = 0.5
+_SLOW = 2.0  # demote a backend whose p95 is more than this many times the step's best
+_PROBE_EVERY = 20  # keep giving a demoted backend its turn now and then so it can recover
+
+
+@dataclass
+class BackendStats:
+    """Recent latencies and an exponentially weighted error rate.
+
+    A call cancelled because another backend answered first is kept as a
+    latency of at least its elapsed time (it would have taken longer), but
+    not as an error.
+    """
+
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=_WINDOW))
+    error_rate: float = 0.0
+    calls: int = 0
+
+    def observe(self, seconds: float, ok: bool, lost: bool = False) -> None:
+        self.calls += 1
+        if lost:
+            self.latencies.append(seconds)
+            return
+        self.error_rate += _ERROR_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latencies.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if len(self.latencies) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgedProvider(LLMProvider):
+    """*backends* by name, tried per *policy* (step -> backend names; missing steps use all, in order)."""
+
+    name = "hedged"
+
+    def __init__(
+        self,
+        backends: dict[str, LLMProvider],
+        policy: dict[str, list[str]] | None = None,
+        *,
+        quantile: float = _QUANTILE,
+        initial_delay: float = _INITIAL_DELAY,
+    ):
+        if not backends:
+            raise ValueError("HedgedProvider needs at least one backend")
+        self.backends = backends
+        self.policy: dict[str, list[str]] = {}
+        for step, names in (policy or {}).items():
+            if step not in STEPS:
+                raise ValueError(f"Unknown step '{step}' in policy; expected one of {STEPS}")
+            unknown = [n for n in names if n not in backends]
+            if unknown:
+                raise ValueError(f"Unknown backend(s) {unknown} for step '{step}'; known: {list(backends)}")
+            self.policy[step] = list(names)
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.model = getattr(backends[self._names("generate")[0]], "model", "")
+        self._stats: dict[tuple[str, str], BackendStats] = {}
+        self._turns: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # ── Backend choice ────────────────────────────────────────────────
+
+    def _names(self, step: str) -> list[str]:
+        return self.policy.get(step) or list(self.backends)
+
+    def _stat(self, backend: str, step: str) -> BackendStats:
+        return self._stats.setdefault((backend, step), BackendStats())
+
+    def _capable(self, step: str, capability: str | None) -> list[str]:
+        names = self._names(step)
+        if capability is None:
+            return names
+        return [n for n in names if getattr(self.backends[n], capability)]
+
+    @property
+    def supports_repair_patch(self) -> bool:  # type: ignore[override]
+        return bool(self._capable("repair", "supports_repair_patch"))
+
+    @property
+    def supports_edit_patch(self) -> bool:  # type: ignore[override]
+        return bool(self._capable("edit", "supports_edit_patch"))
+
+    def _order(self, step: str, capability: str | None = None) -> list[str]:
+        """The step's backends, healthy and fast ones first (a demoted one keeps its place on probe turns).
+
+        With *capability*, only backends that have it (e.g. ``supports_repair_patch``).
+        """
+        names = self._capable(step, capability)
+        if not names:
+            raise ProviderError(f"No backend for {step} has {capability}")
+        with self._lock:
+            turn = self._turns[step] = self._turns.get(step, 0) + 1
+            if turn % _PROBE_EVERY == 0:
+                return names
+            p95 = {n: self._stat(n, step).quantile(_QUANTILE) for n in names}
+            known = [p for n, p in p95.items() if p is not None and self._stat(n, step).error_rate <= _UNHEALTHY]
+            best = min(known, default=None)
+
+            def demoted(name: str) -> tuple[bool, bool]:
+                slow = best is not None and p95[name] is not None and p95[name] > _SLOW * best
+                return self._stat(name, step).error_rate > _UNHEALTHY, slow
+
+            return sorted(names, key=demoted)
+
+    def _hedge_delay(self, backend: str, step: str) -> float | None:
+        if self.quantile <= 0:
+            return None
+        with self._lock:
+            p = self._stat(backend, step).quantile(self.quantile)
+        return self.initial_delay if p is None else p
+
+    def _observe(self, backend: str, step: str, seconds: float, ok: bool, lost: bool = False) -> None:
+        with self._lock:
+            self._stat(backend, step).observe(seconds, ok, lost)
+
+    def stats(self) -> dict[str, dict[str, dict[str, float | int | None]]]:
+        with self._lock:
+            out: dict[str, dict[str, dict[str, float | int | None]]] = {}
+            for (backend, step), s in sorted(self._stats.items()):
+                p95 = s.quantile(_QUANTILE)
+                out.setdefault(backend, {})[step] = {
+                    "calls": s.calls,
+                    "error_rate": round(s.error_rate, 4),
+                    "p95": round(p95, 4) if p95 is not None else None,
+                }
+            return out
+
+    def backlog(self) -> float:
+        return min(backend.backlog() for backend in self.backends.values())
+
+    # ── Racing ────────────────────────────────────────────────────────
+
+    async def _race(
+        self,
+        step: str,
+        call: Callable[[LLMProvider, Callable[[str], None] | None], Awaitable[T]],
+        on_token: Callable[[str], None] | None = None,
+        *,
+        capability: str | None = None,
+    ) -> T:
+        """First successful answer from the step's backends, hedging at most one extra at a time.
+
+        When streaming, the first backend to produce a token owns the stream:
+        the others are cancelled, since their tokens could not be spliced in.
+        """
+        queue = self._order(step, capability)
+        pending: dict[asyncio.Future, str] = {}
+        errors: list[ProviderError | Exception] = []
+        owner: str | None = None
+        won = False
+        primary = queue[0]
+
+        def relay_for(backend: str) -> Callable[[str], None] | None:
+            if on_token is None:
+                return None
+
+            def relay(text: str) -> None:
+                nonlocal owner
+                if owner is None:
+                    owner = backend
+                    for task, name in pending.items():
+                        if name != backend:
+                            task.cancel()
+                if owner == backend:
+                    on_token(text)
+            return relay
+
+        async def attempt(backend: str) -> T:
+            started = time.perf_counter()
+            try:
+                result = await call(self.backends[backend], relay_for(backend))
+            except asyncio.CancelledError:
+                if won or owner not in (None, backend):  # lost to a faster backend
+                    self._observe(backend, step, time.perf_counter() - started, ok=True, lost=True)
+                raise
+            except Exception:
+                self._observe(backend, step, time.perf_counter() - started, ok=False)
+                raise
+            self._observe(backend, step, time.perf_counter() - started, ok=True)
+            return result
+
+        def launch() -> None:
+            backend = queue.pop(0)
+            pending[asyncio.ensure_future(attempt(backend))] = backend
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if queue and len(pending) == 1 and owner is None:
+                    timeout = self._hedge_delay(next(iter(pending.values())), step)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    record_hedge(step, "launched")
+                    _log(f"{step}: no answer from '{next(iter(pending.values()))}' after {timeout:.2f}s; hedging")
+                    launch()
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.cancelled():
+                        continue
+                    exc = task.exception()
+                    if exc is None:
+                        if backend != primary:
+                            record_hedge(step, "won")
+                        won = True
+                        return task.result()
+                    if owner == backend:
+                        raise exc  # tokens already went out from this backend
+                    _log(f"{step}: backend '{backend}' failed ({exc.__class__.__name__}); trying the next")
+                    errors.append(exc)
+                if not pending and queue:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        waits = [e.retry_after for e in errors if isinstance(e, ProviderError) and e.retry_after is not None]
+        detail = "; ".join(f"{e.__class__.__name__}: {e}" for e in errors)
+        raise ProviderError(f"All backends failed for {step}: {detail}", retry_after=min(waits) if waits else None)
+
+    def _failover(self, step: str, call: Callable[[LLMProvider], T], *, capability: str | None = None) -> T:
+        """Blocking calls are not hedged; they just move down the list on failure."""
+        errors: list[Exception] = []
+        for backend in self._order(step, capability):
+            started = time.perf_counter()
+            try:
+                result = call(self.backends[backend])
+            except Exception as exc:
+                self._observe(backend, step, time.perf_counter() - started, ok=False)
+                errors.append(exc)
+                continue
+            self._observe(backend, step, time.perf_counter() - started, ok=True)
+            return result
+        detail = "; ".join(f"{e.__class__.__name__}: {e}" for e in errors)
+        raise ProviderError(f"All backends failed for {step}: {detail}")
+
+    # ── LLMProvider ───────────────────────────────────────────────────
+
+    def route_domain(self, text: str) -> str:
+        return self._failover("route", lambda b: b.route_domain(text))
+
+    def refine_input(self, text: str, domain: str = "general") -> str:
+        return self._failover("refine", lambda b: b.refine_input(text, domain))
+
+    def generate_diagram(self, request: DiagramRequest, domain: str = "general") -> MermaidArtifact:
+        return self._failover("generate", lambda b: b.generate_diagram(request, domain))
+
+    def repair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        return self._failover("repair", lambda b: b.repair_code(broken_code, error_msg))
+
+    def repair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        return self._failover(
+            "repair", lambda b: b.repair_patch(broken_code, error_msg), capability="supports_repair_patch"
+        )
+
+    def edit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        return self._failover(
+            "edit", lambda b: b.edit_patch(code, instruction, domain), capability="supports_edit_patch"
+        )
+
+    async def aroute_domain(self, text: str) -> str:
+        return await self._race("route", lambda b, _: b.aroute_domain(text))
+
+    async def arefine_input(self, text: str, domain: str = "general") -> str:
+        return await self._race("refine", lambda b, _: b.arefine_input(text, domain))
+
+    async def agenerate_diagram(
+        self,
+        request: DiagramRequest,
+        domain: str = "general",
+        *,
+        on_token: Callable[[str], None] | None = None,
+    ) -> MermaidArtifact:
+        return await self._race(
+            "generate", lambda b, relay: b.agenerate_diagram(request, domain, on_token=relay), on_token
+        )
+
+    async def agenerate_variant(
+        self, request: DiagramRequest, domain: str = "general", variant: int = 0
+    ) -> MermaidArtifact:
+        return await self._race("generate", lambda b, _: b.agenerate_variant(request, domain, variant))
+
+    async def arepair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        return await self._race("repair", lambda b, _: b.arepair_code(broken_code, error_msg))
+
+    async def arepair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        return await self._race(
+            "repair", lambda b, _: b.arepair_patch(broken_code, error_msg), capability="supports_repair_patch"
+        )
+
+    async def aedit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        return await self._race(
+            "edit", lambda b, _: b.aedit_patch(code, instruction, domain), capability="supports_edit_patch"
+        )
+
+
+# ── Configuration ─────────────────────────────────────────────────────
+
+def parse_backends(spec: str) -> dict[str, tuple[str, str, str | None]]:
+    """``name=provider/model[@base_url],...`` -> {name: (provider, model, base_url)}."""
+    backends: dict[str, tuple[str, str, str | None]] = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        name, sep, target = entry.partition("=")
+        provider, slash, rest = target.partition("/")
+        model, _, base_url = rest.partition("@")
+        if not sep or not slash or not name.strip() or not model:
+            raise ProviderError(f"Bad LLM_BACKENDS entry '{entry}'; expected name=provider/model[@base_url]")
+        backends[name.strip()] = (provider.strip().lower(), model.strip(), base_url.strip() or None)
+    return backends
+
+
+def parse_policy(spec: str) -> dict[str, list[str]]:
+    """``step=backend,backend;step=...`` -> {step: [backend, ...]}."""
+    policy: dict[str, list[str]] = {}
+    for entry in filter(None, (e.strip() for e in spec.split(";"))):
+        step, sep, names = entry.partition("=")
+        if not sep:
+            raise ProviderError(f"Bad LLM_STEP_POLICY entry '{entry}'; expected step=backend[,backend...]")
+        policy[step.strip()] = [n.strip() for n in names.split(",") if n.strip()]
+    return policy
+
+
+def hedging_from_env() -> dict[str, Any]:
+    return {
+        "quantile": float(os.environ.get("LLM_HEDGE_QUANTILE", _QUANTILE)),
+        "initial_delay": float(os.environ.get("LLM_HEDGE_INITIAL_DELAY", _INITIAL_DELAY)),
+    }
+
+
+_logger = get_logger("hedging")
+
+
+def _log(msg: str) -> None:
+    _logger.info(msg)
@@ -0,0 +1,404 @@
+"""Durable job queue (sqlite) and the worker processes that drain it.
+
+``POST /jobs`` only inserts a row, so a request returns immediately and a
+restart of the API loses nothing. Workers claim jobs by leasing them for a
+visibility timeout and keep extending the lease while the pipeline runs; a
+worker that dies stops extending it, and the job becomes visible to the
+others again once the lease lapses. Failed attempts are retried with
+backoff until ``max_attempts``, higher ``priority`` jobs are claimed first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .data_models import DiagramGenerationError, ProviderError
+from .log import get_logger
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_DEFAULT_PATH = ".cache/jobs.sqlite"
+_DEFAULT_VISIBILITY = 120.0
+_DEFAULT_ATTEMPTS = 3
+_POLL_INTERVAL = 0.5
+_BACKOFF_BASE = 2.0
+_BACKOFF_MAX = 60.0
+_RETENTION = 7 * 24 * 3600  # finished jobs are purged after a week
+
+
+@dataclass
+class Job:
+    id: str
+    status: str
+    priority: int
+    payload: dict[str, Any]
+    attempts: int
+    max_attempts: int
+    created: float
+    updated: float
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    lease: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "created": self.created,
+            "updated": self.updated,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+_COLUMNS = "id, status, priority, payload, attempts, max_attempts, created, updated, result, error, lease"
+
+
+def _job(row: tuple) -> Job:
+    id_, status, priority, payload, attempts, max_attempts, created, updated, result, error, lease = row
+    return Job(
+        id=id_,
+        status=status,
+        priority=priority,
+        payload=json.loads(payload),
+        attempts=attempts,
+        max_attempts=max_attempts,
+        created=created,
+        updated=updated,
+        result=json.loads(result) if result else None,
+        error=error,
+        lease=lease,
+    )
+
+
+class JobQueue:
+    """A jobs table shared by the API and any number of worker processes (WAL mode)."""
+
+    def __init__(self, path: str | Path, *, visibility_timeout: float = _DEFAULT_VISIBILITY):
+        self.path = Path(path)
+        self.visibility_timeout = visibility_timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30.0)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL, payload TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL, max_attempts INTEGER NOT NULL, created REAL NOT NULL, "
+                "updated REAL NOT NULL, visible_at REAL NOT NULL, result TEXT, error TEXT, lease TEXT)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, created)"
+            )
+
+    def submit(self, payload: dict[str, Any], *, priority: int = 0, max_attempts: int = _DEFAULT_ATTEMPTS) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, payload, attempts, max_attempts, created, updated, visible_at) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (job_id, QUEUED, priority, json.dumps(payload), max(1, max_attempts), now, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def claim(self) -> Job | None:
+        """Lease the highest-priority visible job, or None when there is nothing to do.
+
+        A running job whose lease lapsed counts as visible — its worker is
+        presumed dead — unless it has used up its attempts, in which case it
+        is failed here.
+        """
+        now = time.time()
+        lease = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease = NULL, updated = ? "
+                "WHERE status = ? AND visible_at <= ? AND attempts >= max_attempts",
+                (FAILED, "Worker lost the job (visibility timeout) on its last attempt", now, RUNNING, now),
+            )
+            # One statement, so two processes can never lease the same row.
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease = ?, visible_at = ?, updated = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status IN (?, ?) AND visible_at <= ? "
+                "ORDER BY priority DESC, created LIMIT 1) "
+                f"RETURNING {_COLUMNS}",
+                (RUNNING, lease, now + self.visibility_timeout, now, QUEUED, RUNNING, now),
+            ).fetchone()
+        return _job(row) if row else None
+
+    def extend(self, job: Job) -> bool:
+        """Push the lease out by another visibility timeout; False if the job was lost to another worker."""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET visible_at = ?, updated = ? WHERE id = ? AND lease = ?",
+                (now + self.visibility_timeout, now, job.id, job.lease),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job: Job, result: dict[str, Any]) -> None:
+        self._finish(job, DONE, result=json.dumps(result))
+
+    def fail(self, job: Job, error: str, *, retry: bool) -> None:
+        """Requeue with exponential backoff while attempts remain (and *retry*), else fail for good."""
+        if not retry or job.attempts >= job.max_attempts:
+            self._finish(job, FAILED, error=error)
+            return
+        now = time.time()
+        delay = min(_BACKOFF_MAX, _BACKOFF_BASE ** job.attempts)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease = NULL, visible_at = ?, updated = ? "
+                "WHERE id = ? AND lease = ?",
+                (QUEUED, error, now + delay, now, job.id, job.lease),
+            )
+
+    def release(self, job: Job) -> None:
+        """Hand an unfinished job back without spending an attempt (worker shutting down)."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, lease = NULL, visible_at = ?, updated = ? "
+                "WHERE id = ? AND lease = ?",
+                (QUEUED, now, now, job.id, job.lease),
+            )
+
+    def _finish(self, job: Job, status: str, *, result: str | None = None, error: str | None = None) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease = NULL, updated = ? "
+                "WHERE id = ? AND lease = ?",
+                (status, result, error, now, job.id, job.lease),
+            )
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (DONE, FAILED, now - _RETENTION)
+            )
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def queue_from_env() -> JobQueue:
+    return JobQueue(
+        os.environ.get("JOB_QUEUE_PATH", _DEFAULT_PATH),
+        visibility_timeout=float(os.environ.get("JOB_VISIBILITY_TIMEOUT", _DEFAULT_VISIBILITY)),
+    )
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide queue at JOB_QUEUE_PATH."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = queue_from_env()
+        return _queue
+
+
+# ── Workers ───────────────────────────────────────────────────────────
+
+async def run_job(job: Job, provider) -> dict[str, Any]:
+    """Run one generation job; the payload mirrors ``POST /generate``."""
+    from .orchestrator import Orchestrator
+    from .providers import bypass_llm_cache
+
+    payload = job.payload
+    orchestrator = Orchestrator(
+        provider=provider,
+        pipeline=payload.get("pipeline") or os.environ.get("PIPELINE", "default"),
+        max_retries=payload.get("max_retries", 3),
+        skip_refine=payload.get("skip_refine", False),
+    )
+    with bypass_llm_cache(payload.get("no_cache", False)):
+        result = await orchestrator.arun(payload["text"], diagram_type=payload.get("diagram_type", "auto"))
+    return {
+        "code": result.artifact.code,
+        "explanation": result.artifact.explanation,
+        "is_valid": result.artifact.is_valid,
+        "domain": result.metadata.get("domain", "general"),
+        "timings": result.metadata.get("timings", {}),
+    }
+
+
+async def _keep_leased(queue: JobQueue, job: Job) -> None:
+    while True:
+        await asyncio.sleep(queue.visibility_timeout / 3)
+        if not await asyncio.to_thread(queue.extend, job):
+            _log(f"Lost lease on job {job.id}")
+            return
+
+
+async def _process(queue: JobQueue, job: Job, provider) -> None:
+    heartbeat = asyncio.create_task(_keep_leased(queue, job))
+    try:
+        result = await run_job(job, provider)
+    except asyncio.CancelledError:
+        await asyncio.to_thread(queue.release, job)
+        raise
+    except (ProviderError, ValueError) as exc:  # transient: backend errors, or a reply that wasn't valid JSON
+        _log(f"Job {job.id} attempt {job.attempts} failed: {type(exc).__name__}: {exc}")
+        await asyncio.to_thread(queue.fail, job, f"{type(exc).__name__}: {exc}", retry=True)
+    except (DiagramGenerationError, KeyError) as exc:
+        await asyncio.to_thread(queue.fail, job, f"{type(exc).__name__}: {exc}", retry=False)
+    except Exception as exc:  # a bug, most likely; retry rather than leave the job running until its lease lapses
+        _logger.exception(f"Job {job.id} attempt {job.attempts} failed unexpectedly")
+        await asyncio.to_thread(queue.fail, job, f"{type(exc).__name__}: {exc}", retry=True)
+    else:
+        await asyncio.to_thread(queue.complete, job, result)
+    finally:
+        heartbeat.cancel()
+
+
+async def work(queue: JobQueue, *, concurrency: int = 2, stop: asyncio.Event | None = None) -> None:
+    """Claim and run jobs until *stop* is set, at most *concurrency* at a time.
+
+    The provider, its connection pool and caches, and the mmdc pool are
+    created once here and shared by every job this worker runs.
+    """
+    from .mmdc_pool import get_pool
+    from .providers import get_provider
+
+    provider = get_provider()
+    await asyncio.to_thread(get_pool)
+    stop = stop or asyncio.Event()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    running: set[asyncio.Task] = set()
+    try:
+        while not stop.is_set():
+            await slots.acquire()
+            job = await asyncio.to_thread(queue.claim)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), _POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(_process(queue, job, provider))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def _worker_main(concurrency: int) -> None:
+    from .env import load_dotenv
+
+    load_dotenv()
+    queue = queue_from_env()
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await work(queue, concurrency=concurrency, stop=stop)
+
+    _log(f"Worker {os.getpid()} started ({concurrency} concurrent job(s))")
+    try:
+        asyncio.run(main())
+    finally:
+        queue.close()
+
+
+class WorkerPool:
+    """*processes* worker processes, each running up to *concurrency* jobs; dead workers are replaced."""
+
+    def __init__(self, processes: int, concurrency: int = 2):
+        self.processes = max(1, processes)
+        self.concurrency = concurrency
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: list[multiprocessing.process.BaseProcess] = []
+        self._closed = threading.Event()
+        self._monitor: threading.Thread | None = None
+
+    def _spawn(self) -> multiprocessing.process.BaseProcess:
+        process = self._context.Process(target=_worker_main, args=(self.concurrency,), daemon=True)
+        process.start()
+        return process
+
+    def start(self) -> None:
+        self._workers = [self._spawn() for _ in range(self.processes)]
+        self._monitor = threading.Thread(target=self._watch, daemon=True)
+        self._monitor.start()
+
+    def _watch(self) -> None:
+        while not self._closed.wait(1.0):
+            for i, process in enumerate(self._workers):
+                if not process.is_alive() and not self._closed.is_set():
+                    _log(f"Worker {process.pid} exited ({process.exitcode}); restarting")
+                    self._workers[i] = self._spawn()
+
+    def wait(self) -> None:
+        while not self._closed.wait(1.0):
+            pass
+
+    def close(self, timeout: float = 10.0) -> None:
+        """SIGTERM the workers; in-flight jobs go back on the queue."""
+        self._closed.set()
+        for process in self._workers:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+
+
+def start_worker_pool() -> WorkerPool | None:
+    """Pool sized by JOB_WORKERS (0 = none; run ``text-to-uml-worker`` separately)."""
+    processes = int(os.environ.get("JOB_WORKERS", "0"))
+    if processes <= 0:
+        return None
+    pool = WorkerPool(processes, int(os.environ.get("JOB_WORKER_CONCURRENCY", "2")))
+    pool.start()
+    return pool
+
+
+_logger = get_logger("jobs")
+
+
+def _log(msg: str) -> None:
+    _logger.info(msg)
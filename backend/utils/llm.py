@@ -2,14 +2,18 @@
 
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
+from typing import Callable, TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from .data_models import DiagramRequest, MermaidArtifact
+    from .data_models import DiagramRequest, MermaidArtifact, RepairPatch
 
 
 class LLMProvider(ABC):
+    # Optional capabilities; callers check these before using the matching method.
+    supports_repair_patch: bool = False  # repair_patch / arepair_patch
+    supports_edit_patch: bool = False  # edit_patch / aedit_patch
 
     @abstractmethod
     def route_domain(self, text: str) -> str: ...
@@ -23,3 +27,52 @@ class LLMProvider(ABC):
     @abstractmethod
     def repair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact: ...
 
+    def repair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        """Line-range fixes for the region around the error; only when ``supports_repair_patch``."""
+        raise NotImplementedError(f"{type(self).__name__} does not support repair_patch")
+
+    def edit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        """Line-range changes that carry out *instruction* on *code*; only when ``supports_edit_patch``."""
+        raise NotImplementedError(f"{type(self).__name__} does not support edit_patch")
+
+    def backlog(self) -> float:
+        """Seconds a call made now would wait on client-side rate limits (0 when unthrottled)."""
+        return 0.0
+
+    # ── Async variants ────────────────────────────────────────────────
+    # Default to running the sync call in a worker thread; providers with a
+    # native async client override these.
+
+    async def aroute_domain(self, text: str) -> str:
+        return await asyncio.to_thread(self.route_domain, text)
+
+    async def arefine_input(self, text: str, domain: str = "general") -> str:
+        return await asyncio.to_thread(self.refine_input, text, domain)
+
+    async def agenerate_diagram(
+        self,
+        request: DiagramRequest,
+        domain: str = "general",
+        *,
+        on_token: Callable[[str], None] | None = None,
+    ) -> MermaidArtifact:
+        """*on_token* receives raw completion text as it streams (providers may deliver it in one piece)."""
+        artifact = await asyncio.to_thread(self.generate_diagram, request, domain)
+        if on_token is not None:
+            on_token(artifact.model_dump_json(include={"code", "explanation"}))
+        return artifact
+
+    async def agenerate_variant(
+        self, request: DiagramRequest, domain: str = "general", variant: int = 0
+    ) -> MermaidArtifact:
+        """An independent draft; providers that cache must not replay one (each is a fresh sample)."""
+        return await self.agenerate_diagram(request, domain)
+
+    async def arepair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        return await asyncio.to_thread(self.repair_code, broken_code, error_msg)
+
+    async def arepair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        return await asyncio.to_thread(self.repair_patch, broken_code, error_msg)
+
+    async def aedit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        return await asyncio.to_thread(self.edit_patch, code, instruction, domain)
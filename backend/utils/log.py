@@ -0,0 +1,48 @@
+"""Logging setup — records go through a queue and are written to stderr by a background thread."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+_ROOT = "text_to_uml"
+_listener: logging.handlers.QueueListener | None = None
+
+
+class _PrefixFormatter(logging.Formatter):
+    """``[pipeline] message`` — the last part of the logger name as the prefix."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"[{record.name.rsplit('.', 1)[-1]}] {record.getMessage()}"
+
+
+def _configure() -> None:
+    global _listener
+    if _listener is not None:
+        return
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(_PrefixFormatter())
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger(_ROOT)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.propagate = False
+    apply_log_level()
+
+
+def apply_log_level() -> None:
+    """(Re-)read LOG_LEVEL — loggers exist from import time, before ``.env`` is loaded."""
+    logging.getLogger(_ROOT).setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the package root; LOG_LEVEL (default INFO) controls verbosity."""
+    _configure()
+    return logging.getLogger(f"{_ROOT}.{name}")
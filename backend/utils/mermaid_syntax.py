@@ -0,0 +1,450 @@
+"""Local structural checker for the Mermaid diagram types we emit.
+
+Catches the common, unambiguous mistakes — unbalanced blocks and brackets,
+unquoted labels with nested brackets, dangling edges, reserved ``end`` ids,
+malformed messages and relationships — with a line/column position, in a
+single pass and without touching Node. It is deliberately conservative:
+anything it cannot classify is left for mmdc to judge.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+_OPEN = {"[": "]", "(": ")", "{": "}"}
+_CLOSE = {v: k for k, v in _OPEN.items()}
+
+_FLOW_DIRECTIONS = {"TB", "TD", "BT", "RL", "LR", "<", ">", "^", "v"}
+_FLOW_STATEMENTS = re.compile(
+    r"^(classDef|class|style|linkStyle|click|direction|accTitle|accDescr|title)\b"
+)
+_EDGE_TAILS = ("-->", "---", "==>", "===", "-.->", "-.-", "--x", "--o", "~~~")
+_EDGE_START = re.compile(r"^(?:-->|---|==>|-\.->)")
+_ARROW = r"(?:<?-->|---|<?==>|===|<?-\.->|-\.-|--[xo]|~~~)"
+_RESERVED_END = re.compile(rf"(?:^|{_ARROW}|&)\s*(end)\s*(?:$|{_ARROW}|&|;|:::)")
+
+_SEQ_ARROW = re.compile(r"(<<)?-{1,2}(>>|>|x|\))[+-]?")
+_SEQ_BLOCKS = {"loop", "alt", "opt", "par", "critical", "break", "rect", "box"}
+_SEQ_BRANCHES = {"else": {"alt"}, "and": {"par"}, "option": {"critical"}}
+_SEQ_KEYWORDS = {
+    "participant", "actor", "note", "activate", "deactivate", "autonumber", "title",
+    "accTitle", "accDescr", "create", "destroy", "link", "links", "properties", "details",
+}
+
+_ER_CARD_LEFT = r"(?:\|o|\|\||\}o|\}\||o\||\|\{|o\{)"
+_ER_CARD_RIGHT = r"(?:o\||\|\||o\{|\|\{|\|o|\}o|\}\|)"
+_ER_ENTITY = r'(?:"[^"]*"|[\w-]+)'
+_ER_RELATION = re.compile(
+    rf"^{_ER_ENTITY}\s*{_ER_CARD_LEFT}\s*(?:--|\.\.)\s*{_ER_CARD_RIGHT}\s*{_ER_ENTITY}\s*:\s*\S"
+)
+_ER_ALIAS_WORDS = re.compile(r"\b(one|many|zero|only|optionally|to)\b")
+
+_STATE_EDGE_END = re.compile(r"-->\s*$")
+
+
+@dataclass(frozen=True)
+class SyntaxIssue:
+    line: int
+    column: int
+    message: str
+    source: str = ""
+    kind: str = ""  # machine-readable category for automatic fixes, e.g. "unclosed_bracket"
+    expected: str = ""  # the closer that would fix unclosed_bracket / unclosed_block
+
+    def __str__(self) -> str:
+        text = f"Parse error on line {self.line}, column {self.column}: {self.message}"
+        if self.source:
+            text += f"\n{self.source}\n{' ' * (self.column - 1)}^"
+        return text
+
+
+def check_structure(code: str) -> SyntaxIssue | None:
+    """Return the first structural problem in *code*, or None if nothing obvious is wrong."""
+    lines = code.splitlines()
+    body = _statements(lines)
+    try:
+        lineno, header = next(body)
+    except StopIteration:
+        return None
+    keyword = header.split()[0]
+    checker = _CHECKERS.get(keyword.rstrip(";"))
+    if checker is None:
+        return None
+    return checker(lineno, header, body, lines)
+
+
+def checks_structure(directive: str) -> bool:
+    """Whether :func:`check_structure` understands diagrams starting with *directive*."""
+    return directive.rstrip(";") in _CHECKERS
+
+
+# ── Line scanning helpers ─────────────────────────────────────────────
+
+def _statements(lines: list[str]) -> Iterator[tuple[int, str]]:
+    """Yield (1-based line number, text) skipping blanks, comments and front matter."""
+    in_front_matter = False
+    for i, raw in enumerate(lines, start=1):
+        text = raw.strip()
+        if i == 1 and text == "---":
+            in_front_matter = True
+            continue
+        if in_front_matter:
+            in_front_matter = text != "---"
+            continue
+        if not text or text.startswith("%%"):
+            continue
+        yield i, raw.rstrip()
+
+
+_QUOTED = re.compile(r'"[^"]*"')
+_PIPED = re.compile(r"\|[^|]*\|")
+_BRACKET_CHARS = re.compile(r"[\[\](){}>]")
+
+
+def _blank(pattern: re.Pattern, delim: str, text: str) -> tuple[str, int | None]:
+    """Replace delimited spans with '_' (keeping columns); returns the index of an unterminated delimiter."""
+    if delim not in text:
+        return text, None
+    blanked = pattern.sub(lambda m: delim + "_" * (len(m.group()) - 2) + delim, text)
+    # pairs are matched left to right, so an unpaired delimiter is always the last one
+    return blanked, blanked.rfind(delim) if text.count(delim) % 2 else None
+
+
+def _blank_quotes(text: str) -> tuple[str, int | None]:
+    return _blank(_QUOTED, '"', text)
+
+
+def _blank_edge_labels(text: str) -> tuple[str, int | None]:
+    return _blank(_PIPED, "|", text)
+
+
+def _issue(
+    lineno: int, col: int, message: str, lines: list[str], *, kind: str = "", expected: str = ""
+) -> SyntaxIssue:
+    return SyntaxIssue(lineno, col + 1, message, lines[lineno - 1], kind, expected)
+
+
+def _scan_brackets(
+    text: str, lineno: int, lines: list[str], *, shapes: bool
+) -> tuple[str, SyntaxIssue | None]:
+    """Check bracket nesting on one line; returns the line with bracket contents blanked.
+
+    With ``shapes`` (flowcharts), a bracket opened after label text inside
+    another bracket is an unquoted label containing a bracket — a parse
+    error in Mermaid — while adjacent openers like ``([`` or ``[(`` are shapes.
+    The blanked skeleton keeps only ids and links.
+    """
+    stack: list[tuple[str, int]] = []
+    out: list[str] = []
+    last = 0
+    for match in _BRACKET_CHARS.finditer(text):
+        i, ch = match.start(), match.group()
+        if ch in _OPEN:
+            if shapes and stack and stack[-1][1] != i - 1:
+                return text, _issue(
+                    lineno, i,
+                    f"Unquoted '{ch}' inside a node label; wrap the label in double quotes",
+                    lines,
+                    kind="unquoted_label",
+                )
+            if not stack:
+                out.append(text[last:i])
+                last = i
+            stack.append((ch, i))
+        elif shapes and ch == ">" and not stack and i and (text[i - 1].isalnum() or text[i - 1] == "_"):
+            out.append(text[last:i])
+            last = i
+            stack.append((">", i))  # asymmetric shape A>label]
+        elif ch in _CLOSE:
+            if not stack:
+                return text, _issue(
+                    lineno, i, f"Unexpected '{ch}' with no matching '{_CLOSE[ch]}'", lines, kind="stray_closer"
+                )
+            opener, _ = stack.pop()
+            expected = "]" if opener == ">" else _OPEN[opener]
+            if ch != expected:
+                return text, _issue(
+                    lineno, i, f"Expected '{expected}' to close '{opener}' but found '{ch}'", lines
+                )
+            if not stack:
+                out.append(" " * (i + 1 - last))
+                last = i + 1
+    if stack:
+        opener, col = stack[-1]
+        expected = "]" if opener == ">" else _OPEN[opener]
+        return text, _issue(
+            lineno, col, f"'{opener}' is never closed (expected '{expected}' on the same line)", lines,
+            kind="unclosed_bracket", expected=expected,
+        )
+    out.append(text[last:])
+    return "".join(out), None
+
+
+def _unterminated_quote(text: str, lineno: int, lines: list[str]) -> tuple[str, SyntaxIssue | None]:
+    blanked, open_at = _blank_quotes(text)
+    if open_at is not None:
+        return blanked, _issue(lineno, open_at, "Unterminated '\"'", lines)
+    return blanked, None
+
+
+def _unclosed(stack: list[tuple[str, int]], lines: list[str], closer: str) -> SyntaxIssue | None:
+    if not stack:
+        return None
+    keyword, lineno = stack[-1]
+    col = lines[lineno - 1].find(keyword)
+    return _issue(
+        lineno, max(col, 0), f"'{keyword}' block is never closed with '{closer}'", lines,
+        kind="unclosed_block", expected=closer,
+    )
+
+
+# ── flowchart / graph ─────────────────────────────────────────────────
+
+def _check_flowchart(
+    header_line: int, header: str, body: Iterator[tuple[int, str]], lines: list[str]
+) -> SyntaxIssue | None:
+    parts = header.split(";")[0].split()
+    if len(parts) > 1 and parts[1] not in _FLOW_DIRECTIONS:
+        return _issue(
+            header_line, header.find(parts[1]),
+            f"Unknown direction '{parts[1]}'; use one of TB, TD, BT, RL, LR",
+            lines,
+        )
+
+    subgraphs: list[tuple[str, int]] = []
+    for lineno, raw in body:
+        text = raw.strip()
+        indent = len(raw) - len(raw.lstrip())
+        if text.rstrip(";") == "end":
+            if not subgraphs:
+                return _issue(lineno, indent, "'end' without an open 'subgraph'", lines)
+            subgraphs.pop()
+            continue
+        if text.startswith("subgraph"):
+            subgraphs.append(("subgraph", lineno))
+            blanked, issue = _unterminated_quote(raw, lineno, lines)
+            if issue:
+                return issue
+            _, issue = _scan_brackets(blanked, lineno, lines, shapes=True)
+            if issue:
+                return issue
+            continue
+        if _FLOW_STATEMENTS.match(text):
+            continue
+
+        issue = _check_flow_statement(raw, lineno, lines)
+        if issue:
+            return issue
+    return _unclosed(subgraphs, lines, "end")
+
+
+def _check_flow_statement(raw: str, lineno: int, lines: list[str]) -> SyntaxIssue | None:
+    blanked, issue = _unterminated_quote(raw, lineno, lines)
+    if issue:
+        return issue
+    blanked, open_pipe = _blank_edge_labels(blanked)
+    if open_pipe is not None:
+        return _issue(lineno, open_pipe, "Unterminated edge label '|'", lines)
+    skeleton, issue = _scan_brackets(blanked, lineno, lines, shapes=True)
+    if issue:
+        return issue
+
+    stripped = skeleton.strip()
+    if _EDGE_START.match(stripped):
+        return _issue(lineno, len(raw) - len(raw.lstrip()), "Edge has no source node", lines)
+    tail = skeleton.rstrip().rstrip(";").rstrip()
+    if tail.endswith(_EDGE_TAILS):
+        return _issue(lineno, len(tail), "Edge has no target node", lines)
+    if "end" not in skeleton:
+        return None
+
+    for statement in skeleton.split(";"):
+        match = _RESERVED_END.search(statement)
+        if match is None:
+            continue
+        return _issue(
+            lineno, skeleton.find(statement) + match.start(1),
+            "'end' is reserved and cannot be a node id; use 'End' or another name",
+            lines,
+            kind="reserved_end",
+        )
+    return None
+
+
+def flow_skeleton(statement: str) -> str | None:
+    """*statement* with quoted text, edge labels and shape contents blanked (columns kept).
+
+    Leaves only node ids, ``:::class`` tags and links; None if the line doesn't scan.
+    """
+    blanked, open_quote = _blank_quotes(statement)
+    if open_quote is not None:
+        return None
+    blanked, open_pipe = _blank_edge_labels(blanked)
+    if open_pipe is not None:
+        return None
+    skeleton, issue = _scan_brackets(blanked, 1, [statement], shapes=True)
+    if issue:
+        return None
+    return _PIPED.sub(lambda m: " " * len(m.group()), skeleton)
+
+
+# ── sequenceDiagram ───────────────────────────────────────────────────
+
+def _check_sequence(
+    _header_line: int, _header: str, body: Iterator[tuple[int, str]], lines: list[str]
+) -> SyntaxIssue | None:
+    blocks: list[tuple[str, int]] = []
+    for lineno, raw in body:
+        text = raw.strip()
+        indent = len(raw) - len(raw.lstrip())
+        word = re.split(r"[\s:]", text, maxsplit=1)[0]
+
+        if word == "end":
+            if not blocks:
+                return _issue(lineno, indent, "'end' without an open block (loop/alt/opt/par/...)", lines)
+            blocks.pop()
+            continue
+        if word in _SEQ_BLOCKS:
+            blocks.append((word, lineno))
+            continue
+        if word in _SEQ_BRANCHES:
+            if not blocks or blocks[-1][0] not in _SEQ_BRANCHES[word]:
+                parent = "/".join(sorted(_SEQ_BRANCHES[word]))
+                return _issue(lineno, indent, f"'{word}' is only valid inside a '{parent}' block", lines)
+            continue
+        if word in _SEQ_KEYWORDS or word.lower() == "note":
+            continue
+
+        arrow = _SEQ_ARROW.search(text)
+        if arrow is None:
+            return _issue(
+                lineno, indent,
+                "Unrecognised statement; expected a message like 'A->>B: text' or a keyword",
+                lines,
+            )
+        if not text[: arrow.start()].strip():
+            return _issue(lineno, indent, "Message has no sender", lines)
+        if ":" not in text[arrow.end():]:
+            return _issue(lineno, len(raw), "Message is missing ': text' after the receiver", lines)
+        if not text[arrow.end():].split(":", 1)[0].strip():
+            return _issue(lineno, indent + arrow.end(), "Message has no receiver", lines)
+    return _unclosed(blocks, lines, "end")
+
+
+# ── classDiagram / erDiagram / stateDiagram ───────────────────────────
+
+def _check_braces(
+    body: Iterator[tuple[int, str]],
+    lines: list[str],
+    line_check: Callable[[str, int, bool], SyntaxIssue | None],
+    opens_blocks: Callable[[str], bool] = lambda text: True,
+) -> SyntaxIssue | None:
+    """Track ``{ ... }`` blocks across lines, running *line_check(raw, lineno, inside_block)*."""
+    open_blocks: list[tuple[str, int]] = []
+    for lineno, raw in body:
+        blanked, issue = _unterminated_quote(raw, lineno, lines)
+        if issue:
+            return issue
+        issue = line_check(raw, lineno, bool(open_blocks))
+        if issue:
+            return issue
+        if "{" not in blanked and "}" not in blanked or not opens_blocks(blanked):
+            continue
+        for i, ch in enumerate(blanked):
+            if ch == "{":
+                open_blocks.append(("{", lineno))
+            elif ch == "}":
+                if not open_blocks:
+                    return _issue(lineno, i, "Unexpected '}' with no matching '{'", lines, kind="stray_closer")
+                open_blocks.pop()
+    return _unclosed(open_blocks, lines, "}")
+
+
+def _check_class(
+    _header_line: int, _header: str, body: Iterator[tuple[int, str]], lines: list[str]
+) -> SyntaxIssue | None:
+    def line_check(raw: str, lineno: int, inside: bool) -> SyntaxIssue | None:
+        blanked, _ = _blank_quotes(raw)
+        for open_ch, close_ch in (("(", ")"), ("[", "]")):
+            if blanked.count(open_ch) != blanked.count(close_ch):
+                col = blanked.find(open_ch) if open_ch in blanked else blanked.find(close_ch)
+                return _issue(lineno, col, f"Unbalanced '{open_ch}' / '{close_ch}' on this line", lines)
+        return None
+
+    return _check_braces(body, lines, line_check)
+
+
+def _check_er(
+    _header_line: int, _header: str, body: Iterator[tuple[int, str]], lines: list[str]
+) -> SyntaxIssue | None:
+    def line_check(raw: str, lineno: int, inside: bool) -> SyntaxIssue | None:
+        text = raw.strip()
+        indent = len(raw) - len(raw.lstrip())
+        if inside:
+            if text in ("{", "}") or text.startswith("}"):
+                return None
+            if len(text.split()) < 2:
+                return _issue(lineno, indent, "Attribute needs a type and a name, e.g. 'string name'", lines)
+            return None
+        if _is_er_relation(text) and not _ER_ALIAS_WORDS.search(text):
+            if not _ER_RELATION.match(text):
+                return _issue(
+                    lineno, indent,
+                    "Invalid relationship; expected 'A ||--o{ B : label' (the ': label' is required)",
+                    lines,
+                )
+        return None
+
+    # cardinality markers like }| and o{ are not blocks
+    return _check_braces(body, lines, line_check, lambda text: not _is_er_relation(text))
+
+
+def _is_er_relation(text: str) -> bool:
+    return "--" in text or ".." in text
+
+
+def _check_state(
+    _header_line: int, _header: str, body: Iterator[tuple[int, str]], lines: list[str]
+) -> SyntaxIssue | None:
+    notes: list[tuple[str, int]] = []
+    remaining: list[tuple[int, str]] = []
+    for lineno, raw in body:
+        text = raw.strip()
+        if text.startswith("note ") and ":" not in text:
+            notes.append(("note", lineno))
+            continue
+        if text == "end note":
+            if not notes:
+                return _issue(lineno, len(raw) - len(raw.lstrip()), "'end note' without an open 'note'", lines)
+            notes.pop()
+            continue
+        if not notes:
+            remaining.append((lineno, raw))
+    issue = _unclosed(notes, lines, "end note")
+    if issue:
+        return issue
+
+    def line_check(raw: str, lineno: int, inside: bool) -> SyntaxIssue | None:
+        blanked, _ = _blank_quotes(raw)
+        if _STATE_EDGE_END.search(blanked.split(":", 1)[0]):
+            return _issue(lineno, len(raw.rstrip()), "Transition has no target state", lines)
+        if blanked.lstrip().startswith("-->"):
+            return _issue(lineno, len(raw) - len(raw.lstrip()), "Transition has no source state", lines)
+        return None
+
+    return _check_braces(iter(remaining), lines, line_check)
+
+
+_Checker = Callable[[int, str, Iterator[tuple[int, str]], list[str]], SyntaxIssue | None]
+
+_CHECKERS: dict[str, _Checker] = {
+    "graph": _check_flowchart,
+    "flowchart": _check_flowchart,
+    "sequenceDiagram": _check_sequence,
+    "classDiagram": _check_class,
+    "erDiagram": _check_er,
+    "stateDiagram": _check_state,
+    "stateDiagram-v2": _check_state,
+}
@@ -0,0 +1,322 @@
+"""In-process metrics — a minimal Prometheus registry plus per-run breakdowns.
+
+Process-wide counters and histograms are rendered by ``/metrics`` in the
+Prometheus text format. Each pipeline run also gets a :class:`RunMetrics`
+(carried in a context variable, so steps, provider calls and mmdc checks
+record into it without threading it through every signature) that ends up
+in ``PipelineResult.metadata["timings"]``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ── Prometheus registry ───────────────────────────────────────────────
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: bucket counts (non-cumulative, last one is +Inf), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(counts), total[0]) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                running += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+PIPELINE_SECONDS = REGISTRY.histogram(
+    "text_to_uml_pipeline_seconds", "End-to-end pipeline duration", ("domain", "status"),
+)
+STEP_SECONDS = REGISTRY.histogram(
+    "text_to_uml_step_seconds", "Pipeline step duration", ("step", "domain"),
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "text_to_uml_llm_request_seconds", "Upstream LLM request duration", ("provider", "model", "step"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "text_to_uml_llm_tokens_total", "LLM tokens reported in response usage", ("provider", "model", "step", "kind"),
+)
+LLM_CACHE_HITS = REGISTRY.counter(
+    "text_to_uml_llm_cache_hits_total", "LLM calls answered from the response cache", ("step",),
+)
+REPAIRS = REGISTRY.counter(
+    "text_to_uml_repairs_total", "Repair attempts by source (rules, patch, patch_failed, full)", ("source", "domain"),
+)
+CANDIDATES = REGISTRY.counter(
+    "text_to_uml_candidates_total", "Parallel generation drafts by outcome", ("domain", "outcome"),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "text_to_uml_llm_retries_total", "Upstream LLM calls retried, by cause (429, 5xx, connection)", ("provider", "reason"),
+)
+HEDGES = REGISTRY.counter(
+    "text_to_uml_llm_hedges_total", "Hedged LLM requests launched, and how many of them answered first",
+    ("step", "outcome"),
+)
+ADMISSION = REGISTRY.counter(
+    "text_to_uml_admission_total", "API requests by admission outcome (admitted, queue_full, timeout, throttled)",
+    ("outcome",),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "text_to_uml_cache_lookups_total", "Cache lookups by cache (llm_responses, validation, sessions) and result",
+    ("cache", "result"),
+)
+FLIGHTS = REGISTRY.counter(
+    "text_to_uml_singleflight_total", "Coalesced calls by role: leader ran the work, joined shared its result",
+    ("flight", "role"),
+)
+MMDC_SECONDS = REGISTRY.histogram(
+    "text_to_uml_mmdc_seconds", "mmdc compile check duration (cache misses only)",
+)
+
+
+# ── Per-run breakdown ─────────────────────────────────────────────────
+
+@dataclass
+class RunMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    steps: dict[str, float] = field(default_factory=dict)
+    tokens: dict[str, dict[str, int]] = field(default_factory=dict)
+    llm_calls: int = 0
+    llm_cached: int = 0
+    llm_seconds: float = 0.0
+    mmdc_calls: int = 0
+    mmdc_seconds: float = 0.0
+    repairs: dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "total": round(self.elapsed(), 4),
+                "steps": {name: round(s, 4) for name, s in self.steps.items()},
+                "llm": {
+                    "calls": self.llm_calls,
+                    "cached": self.llm_cached,
+                    "seconds": round(self.llm_seconds, 4),
+                    "prompt_tokens": sum(t["prompt"] for t in self.tokens.values()),
+                    "completion_tokens": sum(t["completion"] for t in self.tokens.values()),
+                    "tokens_by_step": {step: dict(t) for step, t in self.tokens.items()},
+                },
+                "mmdc": {"calls": self.mmdc_calls, "seconds": round(self.mmdc_seconds, 4)},
+                "repairs": dict(self.repairs),
+            }
+
+
+_run: ContextVar[RunMetrics | None] = ContextVar("run_metrics", default=None)
+_step: ContextVar[str] = ContextVar("pipeline_step", default="")
+
+
+@contextmanager
+def recording() -> Iterator[RunMetrics]:
+    """Collect a :class:`RunMetrics` for everything that runs in this context (including spawned tasks)."""
+    run = RunMetrics()
+    token = _run.set(run)
+    try:
+        yield run
+    finally:
+        _run.reset(token)
+
+
+@contextmanager
+def in_step(name: str) -> Iterator[None]:
+    token = _step.set(name)
+    try:
+        yield
+    finally:
+        _step.reset(token)
+
+
+def record_step(name: str, seconds: float, domain: str) -> None:
+    STEP_SECONDS.observe(seconds, step=name, domain=domain)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.steps[name] = run.steps.get(name, 0.0) + seconds
+
+
+def record_llm(provider: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int) -> None:
+    step = _step.get()
+    LLM_SECONDS.observe(seconds, provider=provider, model=model, step=step)
+    LLM_TOKENS.inc(prompt_tokens, provider=provider, model=model, step=step, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, provider=provider, model=model, step=step, kind="completion")
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.llm_calls += 1
+            run.llm_seconds += seconds
+            tokens = run.tokens.setdefault(step or "other", {"prompt": 0, "completion": 0})
+            tokens["prompt"] += prompt_tokens
+            tokens["completion"] += completion_tokens
+
+
+def record_llm_cache_hit() -> None:
+    LLM_CACHE_HITS.inc(step=_step.get())
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.llm_cached += 1
+
+
+def record_llm_retry(provider: str, reason: str) -> None:
+    LLM_RETRIES.inc(provider=provider, reason=reason)
+
+
+def record_hedge(step: str, outcome: str) -> None:
+    """*outcome*: launched (a duplicate went to another backend) or won (a non-primary answered first)."""
+    HEDGES.inc(step=step, outcome=outcome)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_flight(flight: str, role: str) -> None:
+    FLIGHTS.inc(flight=flight, role=role)
+
+
+def record_admission(outcome: str) -> None:
+    ADMISSION.inc(outcome=outcome)
+
+
+def record_mmdc(seconds: float) -> None:
+    MMDC_SECONDS.observe(seconds)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.mmdc_calls += 1
+            run.mmdc_seconds += seconds
+
+
+def record_repair(source: str, domain: str) -> None:
+    REPAIRS.inc(source=source, domain=domain)
+    run = _run.get()
+    if run is not None:
+        with run._lock:
+            run.repairs[source] = run.repairs.get(source, 0) + 1
+
+
+def record_candidate(domain: str, outcome: str) -> None:
+    """*outcome*: valid, invalid, failed (provider or parse error) or cancelled (another draft won)."""
+    CANDIDATES.inc(domain=domain, outcome=outcome)
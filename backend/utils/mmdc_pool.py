@@ -0,0 +1,285 @@
+"""Warm mmdc worker pool — keeps Node and a headless browser alive between compile checks."""
+
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from .log import get_logger
+
+_WORKER_JS = Path(__file__).with_name("mmdc_worker.mjs")
+_MMDC_PACKAGE = "@mermaid-js/mermaid-cli"
+
+_DEFAULT_SIZE = 2
+_RENDER_TIMEOUT = 30.0
+_STARTUP_TIMEOUT = 60.0
+_HEALTH_INTERVAL = 30.0
+
+_EOF = object()
+
+
+class PoolUnavailable(Exception):
+    """Raised when no worker can serve a request; callers fall back to one-shot mmdc."""
+
+
+class _Worker:
+    """One Node process, spoken to over newline-delimited JSON on stdin/stdout."""
+
+    def __init__(self, node: str, package_dir: Path):
+        self.proc = subprocess.Popen(
+            [node, str(_WORKER_JS), str(package_dir)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self.ready = False
+        self._seq = 0
+        self._lines: queue.Queue = queue.Queue()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self) -> None:
+        assert self.proc.stdout is not None
+        for line in self.proc.stdout:
+            self._lines.put(line)
+        self._lines.put(_EOF)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _read(self, timeout: float) -> dict:
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError from None
+        if line is _EOF:
+            raise EOFError("mmdc worker exited")
+        return json.loads(line)
+
+    def wait_ready(self, timeout: float = _STARTUP_TIMEOUT) -> None:
+        if self.ready:
+            return
+        try:
+            msg = self._read(timeout)
+        except TimeoutError:
+            raise EOFError(f"mmdc worker not ready after {timeout:.0f}s") from None
+        if not msg.get("ready"):
+            raise EOFError(f"mmdc worker failed to start: {msg}")
+        self.ready = True
+
+    def request(self, payload: dict, timeout: float) -> dict:
+        self.wait_ready()
+        self._seq += 1
+        payload = {**payload, "id": self._seq}
+        assert self.proc.stdin is not None
+        self.proc.stdin.write(json.dumps(payload) + "\n")
+        self.proc.stdin.flush()
+        deadline = time.monotonic() + timeout
+        while True:
+            msg = self._read(max(deadline - time.monotonic(), 0.0))
+            if msg.get("id") == self._seq:
+                return msg
+
+    def close(self) -> None:
+        if self.alive():
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+class MmdcPool:
+    """Fixed-size pool of warm mermaid-cli workers with health checks and restart-on-crash."""
+
+    def __init__(
+        self,
+        size: int,
+        *,
+        node: str,
+        package_dir: Path,
+        timeout: float = _RENDER_TIMEOUT,
+        health_interval: float = _HEALTH_INTERVAL,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self._node = node
+        self._package_dir = package_dir
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._closed = False
+        self._failures = 0
+        for _ in range(size):
+            self._idle.put(self._spawn())
+        if health_interval > 0:
+            threading.Thread(target=self._health_loop, args=(health_interval,), daemon=True).start()
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._node, self._package_dir)
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.close()
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def render(self, code: str, fmt: str = "svg") -> tuple[bool, str, str]:
+        """Render *code*; returns ``(ok, error, data)`` where data is SVG text or base64 PNG.
+
+        Raises TimeoutError (after recycling the worker) when the render hangs.
+        """
+        if self._closed or self._failures >= self.size * 2:
+            raise PoolUnavailable("mmdc pool is disabled")
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolUnavailable("no idle mmdc worker") from None
+
+        try:
+            msg = worker.request({"op": "render", "code": code, "format": fmt}, self.timeout)
+        except TimeoutError:
+            _log(f"Worker {worker.proc.pid} timed out, restarting")
+            self._replace(worker)
+            raise
+        except (EOFError, OSError, ValueError) as exc:
+            self._failures += 1
+            _log(f"Worker {worker.proc.pid} crashed ({exc}), restarting")
+            self._replace(worker)
+            raise PoolUnavailable(str(exc)) from exc
+
+        self._failures = 0
+        self._idle.put(worker)
+        if msg.get("ok"):
+            return True, "", msg.get("data", "")
+        return False, msg.get("error", "mmdc worker reported an error"), ""
+
+    def check(self, code: str) -> tuple[bool, str]:
+        ok, err, _ = self.render(code)
+        return ok, err
+
+    def health_check(self) -> int:
+        """Ping every idle worker, restart the dead ones; returns the number of healthy workers."""
+        healthy = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not worker.ready:
+                # still booting; don't block the health loop on browser startup
+                self._idle.put(worker)
+                continue
+            try:
+                ok = worker.request({"op": "ping"}, timeout=5.0).get("ok", False)
+            except (TimeoutError, EOFError, OSError, ValueError):
+                ok = False
+            if ok:
+                healthy += 1
+                self._idle.put(worker)
+            else:
+                _log(f"Worker {worker.proc.pid} failed health check, restarting")
+                self._replace(worker)
+        return healthy
+
+    def _health_loop(self, interval: float) -> None:
+        while not self._closed:
+            time.sleep(interval)
+            if not self._closed:
+                self.health_check()
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ── Process-wide pool ─────────────────────────────────────────────────
+
+_pool: MmdcPool | None = None
+_pool_lock = threading.Lock()
+_pool_disabled = False
+
+
+def _package_dir(mmdc: str) -> Path | None:
+    """Walk up from the real mmdc script to the mermaid-cli package root."""
+    for parent in Path(os.path.realpath(mmdc)).parents:
+        manifest = parent / "package.json"
+        if manifest.exists():
+            try:
+                if json.loads(manifest.read_text()).get("name") == _MMDC_PACKAGE:
+                    return parent
+            except (OSError, ValueError):
+                return None
+    return None
+
+
+@functools.cache
+def mmdc_version() -> str:
+    """Installed mermaid-cli version, read from its package.json ("" if mmdc is missing)."""
+    mmdc = shutil.which("mmdc")
+    if not mmdc:
+        return ""
+    package_dir = _package_dir(mmdc)
+    if package_dir is not None:
+        return json.loads((package_dir / "package.json").read_text()).get("version", "unknown")
+    try:
+        result = subprocess.run([mmdc, "--version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
+def _env(name: str, default: float, cast: type = float) -> float:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        _log(f"Ignoring {name}={value!r}, using {default}")
+        return default
+
+
+def get_pool() -> MmdcPool | None:
+    """Return the shared pool, or None when disabled (MMDC_POOL_SIZE=0) or unavailable."""
+    global _pool, _pool_disabled
+    if _pool is not None or _pool_disabled:
+        return _pool
+
+    with _pool_lock:
+        if _pool is not None or _pool_disabled:
+            return _pool
+        size = _env("MMDC_POOL_SIZE", _DEFAULT_SIZE, int)
+        mmdc = shutil.which("mmdc")
+        node = shutil.which("node")
+        package_dir = _package_dir(mmdc) if mmdc else None
+        if size <= 0 or not node or package_dir is None:
+            _pool_disabled = True
+            return None
+        _log(f"Starting {size} mmdc worker(s)")
+        _pool = MmdcPool(
+            size,
+            node=node,
+            package_dir=package_dir,
+            timeout=_env("MMDC_TIMEOUT", _RENDER_TIMEOUT),
+            health_interval=_env("MMDC_POOL_HEALTH_INTERVAL", _HEALTH_INTERVAL),
+        )
+        atexit.register(_pool.close)
+        return _pool
+
+
+_logger = get_logger("mmdc-pool")
+
+
+def _log(msg: str) -> None:
+    _logger.info(msg)
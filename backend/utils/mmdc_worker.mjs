@@ -0,0 +1,74 @@
+// Long-lived mermaid-cli worker.
+//
+// Launches one headless browser up front, then renders diagrams sent as
+// newline-delimited JSON on stdin and answers on stdout:
+//
+//   → {"id": 1, "op": "render", "code": "graph TD\n  A-->B", "format": "svg"}
+//   ← {"id": 1, "ok": true, "data": "<svg ...>"}
+//   → {"id": 2, "op": "ping"}
+//   ← {"id": 2, "ok": true}
+//
+// argv[2] is the @mermaid-js/mermaid-cli package directory (resolved by the
+// Python side from the `mmdc` binary), so puppeteer/mermaid come from the same
+// install mmdc itself uses.
+
+import { createRequire } from 'node:module'
+import { readFileSync } from 'node:fs'
+import { join } from 'node:path'
+import { createInterface } from 'node:readline'
+import { pathToFileURL } from 'node:url'
+
+const pkgDir = process.argv[2]
+const pkg = JSON.parse(readFileSync(join(pkgDir, 'package.json'), 'utf8'))
+const require = createRequire(join(pkgDir, 'package.json'))
+
+function entryPoint() {
+  const dot = pkg.exports?.['.'] ?? pkg.exports
+  if (typeof dot === 'string') return dot
+  return dot?.import ?? dot?.default ?? pkg.main ?? 'src/index.js'
+}
+
+function send(msg) {
+  process.stdout.write(JSON.stringify(msg) + '\n')
+}
+
+const { renderMermaid } = await import(pathToFileURL(join(pkgDir, entryPoint())).href)
+const puppeteer = (await import(pathToFileURL(require.resolve('puppeteer')).href)).default
+
+const launchOpts = process.env.MMDC_PUPPETEER_CONFIG
+  ? JSON.parse(readFileSync(process.env.MMDC_PUPPETEER_CONFIG, 'utf8'))
+  : {}
+const browser = await puppeteer.launch({ headless: 'shell', ...launchOpts })
+
+process.on('SIGTERM', async () => {
+  await browser.close().catch(() => {})
+  process.exit(0)
+})
+
+send({ ready: true })
+
+const rl = createInterface({ input: process.stdin })
+for await (const line of rl) {
+  if (!line.trim()) continue
+  let req
+  try {
+    req = JSON.parse(line)
+  } catch (err) {
+    send({ id: null, ok: false, error: `Bad request: ${err.message}` })
+    continue
+  }
+  if (req.op === 'ping') {
+    send({ id: req.id, ok: browser.connected !== false })
+    continue
+  }
+  try {
+    const format = req.format || 'svg'
+    const { data } = await renderMermaid(browser, req.code, format, {})
+    const buf = Buffer.from(data)
+    send({ id: req.id, ok: true, data: format === 'svg' ? buf.toString('utf8') : buf.toString('base64') })
+  } catch (err) {
+    send({ id: req.id, ok: false, error: String(err?.message ?? err) })
+  }
+}
+
+await browser.close().catch(() => {})
@@ -2,12 +2,15 @@
 
 from __future__ import annotations
 
-import sys
+import asyncio
 from dataclasses import dataclass
-from typing import Any, TYPE_CHECKING
+from typing import Any, AsyncIterator, Callable, TYPE_CHECKING
 
 from .data_models import MermaidArtifact
 from .llm import LLMProvider
+from .log import get_logger
+from .metrics import PIPELINE_SECONDS, recording
+from .providers import holding_drafts, remember_drafts
 
 if TYPE_CHECKING:
     from ..pipeline import Pipeline, PipelineContext
@@ -17,6 +20,7 @@ if TYPE_CHECKING:
 class PipelineResult:
     artifact: MermaidArtifact
     metadata: dict[str, Any]
+    spec: str = ""
 
 
 class Orchestrator:
@@ -41,21 +45,73 @@ class Orchestrator:
             self.pipeline = get_pipeline("fast" if skip_refine else "default")
 
     def run(self, raw_text: str, diagram_type: str = "auto") -> PipelineResult:
-        from ..pipeline import PipelineContext
+        """Blocking entry point for callers without an event loop (e.g. the CLI)."""
+        return asyncio.run(self.arun(raw_text, diagram_type=diagram_type))
+
+    async def arun(
+        self,
+        raw_text: str,
+        diagram_type: str = "auto",
+        *,
+        on_event: Callable[[str, dict[str, Any]], None] | None = None,
+        spec: str = "",
+        artifact: MermaidArtifact | None = None,
+        metadata: dict[str, Any] | None = None,
+    ) -> PipelineResult:
+        """*spec*, *artifact* and *metadata* seed the context, e.g. the previous run's for an edit."""
+        from ..pipeline import PipelineContext, execute
 
         ctx = PipelineContext(
             raw_text=raw_text,
             diagram_type=diagram_type,
             max_retries=self.max_retries,
+            spec=spec,
+            artifact=artifact,
+            metadata=dict(metadata or {}),
+            on_event=on_event,
         )
 
         _log(f"Running pipeline: {self.pipeline}")
-        for step in self.pipeline:
-            step(ctx, self.provider)
+        with recording() as run, holding_drafts() as drafts:
+            status = "error"
+            try:
+                await execute(self.pipeline, ctx, self.provider)
+                status = "ok"
+            finally:
+                PIPELINE_SECONDS.observe(run.elapsed(), domain=ctx.metadata.get("domain", ""), status=status)
+        ctx.metadata["timings"] = run.as_dict()
 
         assert ctx.artifact is not None, "Pipeline completed but produced no artifact"
-        return PipelineResult(artifact=ctx.artifact, metadata=ctx.metadata)
+        if drafts and ctx.artifact.is_valid:
+            await asyncio.to_thread(remember_drafts, drafts)
+        return PipelineResult(artifact=ctx.artifact, metadata=ctx.metadata, spec=ctx.spec)
+
+    async def astream(self, raw_text: str, diagram_type: str = "auto") -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        """Run the pipeline, yielding ``(event, data)`` as steps progress.
+
+        The last event is ``result`` (with the PipelineResult under ``"result"``);
+        pipeline exceptions propagate to the consumer after the events emitted
+        before the failure.
+        """
+        queue: asyncio.Queue[tuple[str, dict[str, Any]]] = asyncio.Queue()
+        task = asyncio.create_task(
+            self.arun(raw_text, diagram_type, on_event=lambda event, data: queue.put_nowait((event, data)))
+        )
+        try:
+            while not task.done() or not queue.empty():
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            yield "result", {"result": task.result()}
+        finally:
+            task.cancel()
+
+
+_logger = get_logger("orchestrator")
 
 
 def _log(msg: str) -> None:
-    print(f"[orchestrator] {msg}", file=sys.stderr)
\ No newline at end of file
+    _logger.info(msg)
\ No newline at end of file
@@ -2,82 +2,558 @@
 
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import json
 import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
 
+import httpx
 import openai
 
-from .data_models import DiagramRequest, MermaidArtifact, ProviderError
+from .cache import Cache, MemoryCache, build_cache, content_key
+from .data_models import DiagramRequest, MermaidArtifact, ProviderError, RepairPatch, numbered_excerpt
 from .llm import LLMProvider
-from ..prompts import (
-    DOMAINS,
-    GENERATE_BASE,
-    REFINER_BASE,
-    REPAIR_SYSTEM,
-    ROUTER_SYSTEM,
-    get_style_guide,
-)
+from .log import get_logger
+from .metrics import record_llm, record_llm_cache_hit, record_llm_retry
+from .ratelimit import RateLimiter, RetryPolicy, estimate_tokens, is_rate_limit, is_retryable, retry_after
+from .singleflight import SingleFlight
+from ..prompts import DOMAINS, grammar_prompt, system_prompt, template
 
 _DEFAULT_TIMEOUT = 120.0
 _CLIENT_TIMEOUT = 60.0
 
 
+# ── HTTP connection pool ──────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class HttpPoolConfig:
+    """httpx pool settings; each provider talks to one host, so these are per-host limits."""
+
+    max_connections: int = 100
+    max_keepalive: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> HttpPoolConfig:
+        return cls(
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive=int(os.environ.get("LLM_MAX_KEEPALIVE", cls.max_keepalive)),
+            keepalive_expiry=float(os.environ.get("LLM_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+            http2=os.environ.get("LLM_HTTP2", "false").lower() in ("true", "1", "yes"),
+        )
+
+    def client_kwargs(self) -> dict[str, Any]:
+        http2 = self.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            _log("LLM_HTTP2 is set but the 'h2' package is missing (pip install 'httpx[http2]'); using HTTP/1.1")
+            http2 = False
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "http2": http2,
+            "timeout": _CLIENT_TIMEOUT,
+        }
+
+
 class _OpenAICompatibleProvider(LLMProvider):
+    name = "openai"
+    supports_repair_patch = True
+    supports_edit_patch = True
 
-    def __init__(self, *, api_key: str, model: str, base_url: str | None = None):
+    def __init__(
+        self,
+        *,
+        api_key: str,
+        model: str,
+        base_url: str | None = None,
+        cache: Cache | None = None,
+        http: HttpPoolConfig | None = None,
+        limiter: RateLimiter | None = None,
+        retry: RetryPolicy | None = None,
+    ):
+        self.http = http or HttpPoolConfig.from_env()
+        self._http_kwargs = self.http.client_kwargs()
+        self.limiter = limiter or RateLimiter.from_env()
+        self.retry = retry or RetryPolicy.from_env()
+        # retries are ours (see _backoff), so the SDK's own are turned off
         self.client = openai.Client(
             api_key=api_key,
             base_url=base_url,
             timeout=_CLIENT_TIMEOUT,
+            max_retries=0,
+            http_client=openai.DefaultHttpxClient(**self._http_kwargs),
         )
         self.model = model
+        self.cache = cache
+        self._api_key = api_key
+        self._base_url = base_url
+        # httpx async pools are bound to the loop they were first used on, so
+        # keep one AsyncClient per event loop (Orchestrator.run starts a fresh loop).
+        self._async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncClient] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._flights: SingleFlight[str] = SingleFlight("llm")
 
-    def _chat(self, system: str, user: str, json_mode: bool = False) -> str:
-        try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
-                response_format={"type": "json_object"} if json_mode else openai.NOT_GIVEN,
-                timeout=_DEFAULT_TIMEOUT,
+    @property
+    def async_client(self) -> openai.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = openai.AsyncClient(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                timeout=_CLIENT_TIMEOUT,
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(**self._http_kwargs),
             )
-            return resp.choices[0].message.content or ""
-        except openai.APIError as exc:
-            raise ProviderError(f"API error: {exc}") from exc
+            self._async_clients[loop] = client
+        return client
+
+    def _request(self, system: str, user: str, json_mode: bool) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            "response_format": {"type": "json_object"} if json_mode else openai.NOT_GIVEN,
+            "timeout": _DEFAULT_TIMEOUT,
+        }
+
+    def _content_key(self, system: str, user: str, json_mode: bool, variant: int | None = None) -> str:
+        parts = [content_key(system), user, self.model, str(json_mode)]
+        if variant is not None:
+            parts.append(f"variant={variant}")
+        return content_key(*parts)
+
+    def _cache_key(self, system: str, user: str, json_mode: bool) -> str | None:
+        if self.cache is None:
+            return None
+        return self._content_key(system, user, json_mode)
+
+    def _cached(self, key: str | None) -> str | None:
+        if key is None or _BYPASS_CACHE.get():
+            return None
+        return self.cache.get(key)  # type: ignore[union-attr]
+
+    def _store(self, key: str | None, content: str, draft: bool = False) -> None:
+        if key is None or not content:
+            return
+        held = _HELD.get() if draft else None
+        if held is not None:
+            held.append((self.cache, key, content))  # type: ignore[arg-type]
+        else:
+            self.cache.set(key, content)  # type: ignore[union-attr]
+
+    async def _acached(self, key: str | None) -> str | None:
+        if key is None or isinstance(self.cache, MemoryCache):
+            return self._cached(key)
+        return await asyncio.to_thread(self._cached, key)  # the sqlite tier blocks
+
+    async def _astore(self, key: str | None, content: str, draft: bool = False) -> None:
+        if key is None or isinstance(self.cache, MemoryCache):
+            self._store(key, content, draft)
+        else:
+            await asyncio.to_thread(self._store, key, content, draft)
+
+    def _chat(self, system: str, user: str, json_mode: bool = False, draft: bool = False) -> str:
+        """*draft*: the reply becomes a diagram, so inside :func:`holding_drafts` it is cached only once valid."""
+        key = self._cache_key(system, user, json_mode)
+        if (hit := self._cached(key)) is not None:
+            record_llm_cache_hit()
+            return hit
+        estimate = estimate_tokens(system, user)
+        for attempt in range(1, self.retry.attempts + 1):
+            self.limiter.acquire(estimate)
+            started = time.perf_counter()
+            try:
+                resp = self.client.chat.completions.create(**self._request(system, user, json_mode))
+            except openai.APIError as exc:
+                time.sleep(self._backoff(exc, attempt))
+                continue
+            break
+        self._record(time.perf_counter() - started, resp.usage, estimate)
+        content = resp.choices[0].message.content or ""
+        self._store(key, content, draft)
+        return content
+
+    def _backoff(self, exc: openai.APIError, attempt: int) -> float:
+        """Seconds to wait before retrying after *exc*; raises ProviderError when it shouldn't be retried."""
+        if not is_retryable(exc) or attempt >= self.retry.attempts:
+            asked = retry_after(exc) if is_rate_limit(exc) else None
+            raise ProviderError(f"API error: {exc}", retry_after=asked) from exc
+        delay = self.retry.delay(exc, attempt)
+        if is_rate_limit(exc):
+            self.limiter.pause(delay)  # the quota is shared, so everyone backs off
+        status = getattr(exc, "status_code", None)
+        reason = "429" if status == 429 else "5xx" if status else "connection"
+        record_llm_retry(self.name, reason)
+        _log(f"Upstream {reason} error; retry {attempt}/{self.retry.attempts - 1} in {delay:.2f}s")
+        return delay
+
+    def backlog(self) -> float:
+        return self.limiter.backlog()
+
+    async def _achat(
+        self,
+        system: str,
+        user: str,
+        json_mode: bool = False,
+        on_token: Callable[[str], None] | None = None,
+        variant: int | None = None,
+        draft: bool = False,
+    ) -> str:
+        """*variant* asks for an independent sample (best-of-K): never cached, nor coalesced with other variants."""
+        key = self._cache_key(system, user, json_mode) if variant is None else None
+        if (hit := await self._acached(key)) is not None:
+            record_llm_cache_hit()
+            if on_token is not None:
+                on_token(hit)
+            return hit
+
+        leader = False
+
+        async def call() -> str:
+            nonlocal leader
+            leader = True
+            estimate = estimate_tokens(system, user)
+            streamed = False
+
+            def relay(text: str) -> None:
+                nonlocal streamed
+                streamed = True
+                on_token(text)  # type: ignore[misc]
+
+            for attempt in range(1, self.retry.attempts + 1):
+                await self.limiter.aacquire(estimate)
+                started = time.perf_counter()
+                try:
+                    if on_token is None:
+                        resp = await self.async_client.chat.completions.create(
+                            **self._request(system, user, json_mode)
+                        )
+                        content, usage = resp.choices[0].message.content or "", resp.usage
+                    else:
+                        content, usage = await self._astream(system, user, json_mode, relay)
+                except openai.APIError as exc:
+                    if streamed:  # tokens already went out; a retry would repeat them
+                        raise ProviderError(f"API error: {exc}") from exc
+                    await asyncio.sleep(self._backoff(exc, attempt))
+                    continue
+                break
+            self._record(time.perf_counter() - started, usage, estimate)
+            await self._astore(key, content, draft)
+            return content
+
+        # identical concurrent calls share one upstream request; joiners that
+        # wanted tokens get the full text at once, like a cache hit
+        flight_key = key or self._content_key(system, user, json_mode, variant)
+        content = await self._flights.do(flight_key, call)
+        if not leader and on_token is not None:
+            on_token(content)
+        return content
+
+    async def _astream(
+        self, system: str, user: str, json_mode: bool, on_token: Callable[[str], None]
+    ) -> tuple[str, Any]:
+        parts: list[str] = []
+        usage = None
+        stream = await self.async_client.chat.completions.create(
+            **self._request(system, user, json_mode), stream=True, stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage  # final chunk, no choices
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        return "".join(parts), usage
+
+    def _record(self, seconds: float, usage: Any, estimate: int) -> None:
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        record_llm(self.name, self.model, seconds, prompt, completion)
+        self.limiter.settle(estimate, prompt + completion)
 
     def route_domain(self, text: str) -> str:
-        raw = self._chat(ROUTER_SYSTEM, text, json_mode=True)
-        try:
-            domain = json.loads(raw).get("domain", "general")
-        except (json.JSONDecodeError, AttributeError):
-            return "general"
-        return domain if domain in DOMAINS else "general"
+        return _parse_domain(self._chat(system_prompt("route"), text, json_mode=True))
 
     def refine_input(self, text: str, domain: str = "general") -> str:
-        system = REFINER_BASE + "\n\n" + get_style_guide(domain)
-        return self._chat(system, text)
+        return self._chat(_refine_system(domain), text)
 
     def generate_diagram(self, request: DiagramRequest, domain: str = "general") -> MermaidArtifact:
-        system = GENERATE_BASE.format(diagram_type=request.diagram_type) + "\n\n" + get_style_guide(domain)
-        raw = self._chat(system, request.raw_text, json_mode=True)
+        raw = self._chat(_generate_system(request, domain), request.raw_text, json_mode=True, draft=True)
         return MermaidArtifact.model_validate_json(raw)
 
     def repair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
-        system = REPAIR_SYSTEM.format(broken_code=broken_code, error_msg=error_msg)
-        raw = self._chat(system, "Fix the code above.", json_mode=True)
+        raw = self._chat(_repair_system(broken_code, error_msg), _REPAIR_USER, json_mode=True, draft=True)
         return MermaidArtifact.model_validate_json(raw)
 
+    def repair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        raw = self._chat(_repair_patch_system(broken_code, error_msg), _REPAIR_USER, json_mode=True, draft=True)
+        return RepairPatch.model_validate_json(raw)
+
+    def edit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        raw = self._chat(_edit_system(code, domain), instruction, json_mode=True, draft=True)
+        return RepairPatch.model_validate_json(raw)
+
+    async def aroute_domain(self, text: str) -> str:
+        return _parse_domain(await self._achat(system_prompt("route"), text, json_mode=True))
+
+    async def arefine_input(self, text: str, domain: str = "general") -> str:
+        return await self._achat(_refine_system(domain), text)
+
+    async def agenerate_diagram(
+        self,
+        request: DiagramRequest,
+        domain: str = "general",
+        *,
+        on_token: Callable[[str], None] | None = None,
+    ) -> MermaidArtifact:
+        raw = await self._achat(
+            _generate_system(request, domain), request.raw_text, json_mode=True, on_token=on_token, draft=True
+        )
+        return MermaidArtifact.model_validate_json(raw)
+
+    async def agenerate_variant(
+        self, request: DiagramRequest, domain: str = "general", variant: int = 0
+    ) -> MermaidArtifact:
+        raw = await self._achat(_generate_system(request, domain), request.raw_text, json_mode=True, variant=variant)
+        return MermaidArtifact.model_validate_json(raw)
+
+    async def arepair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        raw = await self._achat(_repair_system(broken_code, error_msg), _REPAIR_USER, json_mode=True, draft=True)
+        return MermaidArtifact.model_validate_json(raw)
+
+    async def arepair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        raw = await self._achat(_repair_patch_system(broken_code, error_msg), _REPAIR_USER, json_mode=True, draft=True)
+        return RepairPatch.model_validate_json(raw)
+
+    async def aedit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        raw = await self._achat(_edit_system(code, domain), instruction, json_mode=True, draft=True)
+        return RepairPatch.model_validate_json(raw)
+
+
+# ── Prompt assembly (shared by the sync and async paths) ──────────────
+
+_REPAIR_USER = "Fix the code above."
+
+
+def _parse_domain(raw: str) -> str:
+    try:
+        domain = json.loads(raw).get("domain", "general")
+    except (json.JSONDecodeError, AttributeError):
+        return "general"
+    return domain if domain in DOMAINS else "general"
+
+
+def _refine_system(domain: str) -> str:
+    return system_prompt("refine", domain)
+
+
+def _generate_system(request: DiagramRequest, domain: str) -> str:
+    return system_prompt("generate", domain, request.diagram_type)
+
+
+def _repair_system(broken_code: str, error_msg: str) -> str:
+    return template("repair").format(broken_code=broken_code, error_msg=error_msg)
+
+
+def _repair_patch_system(broken_code: str, error_msg: str) -> str:
+    return template("repair_patch").format(
+        line_count=len(broken_code.splitlines()),
+        excerpt=numbered_excerpt(broken_code, error_msg),
+        error_msg=error_msg,
+    )
+
+
+def _edit_system(code: str, domain: str) -> str:
+    constraints = grammar_prompt(domain)
+    return template("edit").format(
+        line_count=len(code.splitlines()),
+        listing=numbered_excerpt(code, ""),  # no error to focus on: every line
+        grammar=f"\n{constraints}\n" if constraints else "",
+    )
+
 
 class OpenAIProvider(_OpenAICompatibleProvider):
-    def __init__(self, api_key: str, model: str):
-        super().__init__(api_key=api_key, model=model)
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str, cache: Cache | None = None, http: HttpPoolConfig | None = None):
+        super().__init__(api_key=api_key, model=model, cache=cache, http=http)
 
 
 class OllamaProvider(_OpenAICompatibleProvider):
-    def __init__(self, model: str, base_url: str):
-        super().__init__(api_key="ollama", model=model, base_url=base_url)
+    name = "ollama"
+
+    def __init__(self, model: str, base_url: str, cache: Cache | None = None, http: HttpPoolConfig | None = None):
+        super().__init__(api_key="ollama", model=model, base_url=base_url, cache=cache, http=http)
+
+
+# ── Load balancing ────────────────────────────────────────────────────
+
+class LoadBalancedProvider(LLMProvider):
+    """Sends each call to the backend with the fewest requests in flight (ties rotate)."""
+
+    def __init__(self, backends: list[LLMProvider]):
+        if not backends:
+            raise ValueError("LoadBalancedProvider needs at least one backend")
+        self.backends = backends
+        self.model = getattr(backends[0], "model", "")
+        self._outstanding = [0] * len(backends)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def outstanding(self) -> list[int]:
+        with self._lock:
+            return list(self._outstanding)
+
+    @property
+    def supports_repair_patch(self) -> bool:  # type: ignore[override]
+        return all(backend.supports_repair_patch for backend in self.backends)
+
+    @property
+    def supports_edit_patch(self) -> bool:  # type: ignore[override]
+        return all(backend.supports_edit_patch for backend in self.backends)
+
+    def backlog(self) -> float:
+        return min(backend.backlog() for backend in self.backends)
+
+    @contextmanager
+    def _lease(self) -> Iterator[LLMProvider]:
+        with self._lock:
+            n = len(self.backends)
+            index = min(((self._next + i) % n for i in range(n)), key=self._outstanding.__getitem__)
+            self._outstanding[index] += 1
+            self._next = (index + 1) % n
+        try:
+            yield self.backends[index]
+        finally:
+            with self._lock:
+                self._outstanding[index] -= 1
+
+    def route_domain(self, text: str) -> str:
+        with self._lease() as backend:
+            return backend.route_domain(text)
+
+    def refine_input(self, text: str, domain: str = "general") -> str:
+        with self._lease() as backend:
+            return backend.refine_input(text, domain)
+
+    def generate_diagram(self, request: DiagramRequest, domain: str = "general") -> MermaidArtifact:
+        with self._lease() as backend:
+            return backend.generate_diagram(request, domain)
+
+    def repair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        with self._lease() as backend:
+            return backend.repair_code(broken_code, error_msg)
+
+    def repair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        with self._lease() as backend:
+            return backend.repair_patch(broken_code, error_msg)
+
+    def edit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        with self._lease() as backend:
+            return backend.edit_patch(code, instruction, domain)
+
+    async def aroute_domain(self, text: str) -> str:
+        with self._lease() as backend:
+            return await backend.aroute_domain(text)
+
+    async def arefine_input(self, text: str, domain: str = "general") -> str:
+        with self._lease() as backend:
+            return await backend.arefine_input(text, domain)
+
+    async def agenerate_diagram(
+        self,
+        request: DiagramRequest,
+        domain: str = "general",
+        *,
+        on_token: Callable[[str], None] | None = None,
+    ) -> MermaidArtifact:
+        with self._lease() as backend:
+            return await backend.agenerate_diagram(request, domain, on_token=on_token)
+
+    async def agenerate_variant(
+        self, request: DiagramRequest, domain: str = "general", variant: int = 0
+    ) -> MermaidArtifact:
+        with self._lease() as backend:
+            return await backend.agenerate_variant(request, domain, variant)
+
+    async def arepair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        with self._lease() as backend:
+            return await backend.arepair_code(broken_code, error_msg)
+
+    async def arepair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        with self._lease() as backend:
+            return await backend.arepair_patch(broken_code, error_msg)
+
+    async def aedit_patch(self, code: str, instruction: str, domain: str = "general") -> RepairPatch:
+        with self._lease() as backend:
+            return await backend.aedit_patch(code, instruction, domain)
+
+
+# ── Response cache ────────────────────────────────────────────────────
+
+_BYPASS_CACHE: ContextVar[bool] = ContextVar("bypass_llm_cache", default=False)
+
+
+@contextmanager
+def bypass_llm_cache(enabled: bool = True) -> Iterator[None]:
+    """Skip cache reads for LLM calls made in this context (fresh answers are still stored)."""
+    token = _BYPASS_CACHE.set(enabled)
+    try:
+        yield
+    finally:
+        _BYPASS_CACHE.reset(token)
+
+
+_HELD: ContextVar[list[tuple[Cache, str, str]] | None] = ContextVar("held_llm_drafts", default=None)
+
+
+@contextmanager
+def holding_drafts() -> Iterator[list[tuple[Cache, str, str]]]:
+    """Hold back generate/repair/edit replies made in this context from the response cache.
+
+    They are cached by :func:`remember_drafts` once the diagram they led to
+    validates; otherwise a retry of the same prompt would replay the same
+    broken draft. Route and refine replies are cached straight away.
+    """
+    held: list[tuple[Cache, str, str]] = []
+    token = _HELD.set(held)
+    try:
+        yield held
+    finally:
+        _HELD.reset(token)
+
+
+def remember_drafts(held: list[tuple[Cache, str, str]]) -> None:
+    for cache, key, content in held:
+        cache.set(key, content)
+    held.clear()
+
+
+def build_llm_cache() -> Cache | None:
+    ttl = float(os.environ.get("LLM_CACHE_TTL", "3600"))
+    return build_cache(
+        size=int(os.environ.get("LLM_CACHE_SIZE", "512")),
+        path=os.environ.get("LLM_CACHE_PATH") or None,
+        table="llm_responses",
+        ttl=ttl if ttl > 0 else None,
+    )
 
 
 _PROVIDER_DEFAULTS: dict[str, dict[str, str]] = {
@@ -87,19 +563,76 @@ _PROVIDER_DEFAULTS: dict[str, dict[str, str]] = {
 
 
 def build_provider() -> LLMProvider:
+    """The provider LLM_PROVIDER names, or a HedgedProvider over LLM_BACKENDS when that is set."""
+    if os.environ.get("LLM_BACKENDS", "").strip():
+        return _build_hedged()
+
     name = os.environ.get("LLM_PROVIDER", "openai").lower()
+    if name not in _PROVIDER_DEFAULTS:
+        raise ProviderError(f"Unknown LLM_PROVIDER '{name}'. Supported: {list(_PROVIDER_DEFAULTS)}")
+    model = os.environ.get("LLM_MODEL", _PROVIDER_DEFAULTS[name]["model"])
+    cache = build_llm_cache()
 
     if name == "openai":
+        return _backend("openai", model, None, cache)
+
+    urls = os.environ.get("OLLAMA_BASE_URL", _PROVIDER_DEFAULTS["ollama"]["base_url"])
+    base_urls = [u.strip() for u in urls.split(",")]
+    backends = [_backend("ollama", model, url, cache) for url in base_urls if url]
+    if not backends:
+        raise ProviderError("OLLAMA_BASE_URL is empty")
+    return backends[0] if len(backends) == 1 else LoadBalancedProvider(backends)
+
+
+def _backend(provider: str, model: str, base_url: str | None, cache: Cache | None) -> LLMProvider:
+    if provider == "openai":
         api_key = os.environ.get("OPENAI_API_KEY", "")
         if not api_key:
             raise ProviderError("OPENAI_API_KEY is required when LLM_PROVIDER=openai")
-        model = os.environ.get("LLM_MODEL", _PROVIDER_DEFAULTS["openai"]["model"])
-        return OpenAIProvider(api_key=api_key, model=model)
+        if base_url:
+            raise ProviderError("OpenAI backends take no base URL; use ollama/<model>@<url> for compatible servers")
+        return OpenAIProvider(api_key=api_key, model=model, cache=cache)
+    if provider == "ollama":
+        return OllamaProvider(model=model, base_url=base_url or _PROVIDER_DEFAULTS["ollama"]["base_url"], cache=cache)
+    raise ProviderError(f"Unknown provider '{provider}'. Supported: {list(_PROVIDER_DEFAULTS)}")
+
+
+def _build_hedged() -> LLMProvider:
+    from .hedging import HedgedProvider, hedging_from_env, parse_backends, parse_policy
+
+    cache = build_llm_cache()
+    backends = {
+        name: _backend(provider, model, base_url, cache)
+        for name, (provider, model, base_url) in parse_backends(os.environ["LLM_BACKENDS"]).items()
+    }
+    try:
+        return HedgedProvider(backends, parse_policy(os.environ.get("LLM_STEP_POLICY", "")), **hedging_from_env())
+    except ValueError as exc:
+        raise ProviderError(str(exc)) from exc
+
+
+_shared: LLMProvider | None = None
+_shared_lock = threading.Lock()
+
+
+def get_provider() -> LLMProvider:
+    """Process-wide provider, so every request and workflow shares one connection pool and cache."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = build_provider()
+        return _shared
+
+
+def set_provider(provider: LLMProvider | None) -> None:
+    """Replace the shared provider (e.g. with a mock for benchmarks); None rebuilds it from the environment."""
+    global _shared
+    with _shared_lock:
+        _shared = provider
+
+
+_logger = get_logger("providers")
 
-    if name == "ollama":
-        defaults = _PROVIDER_DEFAULTS["ollama"]
-        model = os.environ.get("LLM_MODEL", defaults["model"])
-        base_url = os.environ.get("OLLAMA_BASE_URL", defaults["base_url"])
-        return OllamaProvider(model=model, base_url=base_url)
 
-    raise ProviderError(f"Unknown LLM_PROVIDER '{name}'. Supported: {list(_PROVIDER_DEFAULTS)}")
\ No newline at end of file
+def _log(msg: str) -> None:
+    _logger.info(msg)
@@ -0,0 +1,180 @@
+"""Client-side limits for upstream LLM calls: token buckets and retry backoff.
+
+Each provider paces itself against the upstream quota (requests and tokens
+per minute) instead of discovering it through 429s, and when a 429 or a
+transient 5xx does come back the call is retried after the delay the server
+asked for (``Retry-After``) or, failing that, a jittered exponential one. A
+429 also pauses every other call to the same provider for that long.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import openai
+
+_CHARS_PER_TOKEN = 4
+_COMPLETION_ESTIMATE = 512  # tokens reserved for a reply until usage says otherwise
+
+
+class TokenBucket:
+    """*rate* units per minute, bursting up to *capacity*.
+
+    Reservations may take the level below zero; the caller then waits until
+    the bucket has refilled past it.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate / 60.0
+        self.capacity = capacity if capacity is not None else rate
+        self._level = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, amount: float) -> float:
+        """Take *amount* now; returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take extra (negative) units, e.g. once real usage is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+    def delay(self) -> float:
+        """Seconds until one more unit would be available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self._level) / self.rate)
+
+
+def estimate_tokens(*texts: str) -> int:
+    return sum(len(t) for t in texts) // _CHARS_PER_TOKEN + _COMPLETION_ESTIMATE
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one upstream (either may be off)."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> RateLimiter:
+        return cls(float(os.environ.get("LLM_RPM", "0")), float(os.environ.get("LLM_TPM", "0")))
+
+    def _reserve(self, tokens: int) -> float:
+        wait = self._paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return max(0.0, wait)
+
+    def acquire(self, tokens: int) -> None:
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        wait = self._reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: int | None) -> None:
+        """Correct the token bucket once the response reports what the call really used."""
+        if self.tokens is not None and actual:
+            self.tokens.adjust(estimated - actual)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every call for *seconds* (the upstream said it is over quota)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def backlog(self) -> float:
+        """Seconds a call arriving now would wait before it could be sent."""
+        wait = self._paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.delay())
+        return max(0.0, wait)
+
+
+# ── Retries ───────────────────────────────────────────────────────────
+
+def retry_after(exc: Exception) -> float | None:
+    """The server's requested delay, from ``retry-after-ms`` or ``Retry-After`` (seconds or HTTP date)."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if (ms := headers.get("retry-after-ms")) is not None:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def is_rate_limit(exc: Exception) -> bool:
+    return isinstance(exc, openai.RateLimitError)
+
+
+def is_retryable(exc: Exception) -> bool:
+    """429s, 5xxs, timeouts and dropped connections; not client errors like 400 or 401."""
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):  # includes APITimeoutError
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 4  # including the first; at least 1
+    base: float = 0.5
+    cap: float = 30.0
+
+    def __post_init__(self) -> None:
+        if self.attempts < 1:
+            raise ValueError(f"RetryPolicy needs at least one attempt, got {self.attempts}")
+
+    @classmethod
+    def from_env(cls) -> RetryPolicy:
+        return cls(
+            attempts=max(1, 1 + int(os.environ.get("LLM_MAX_RETRIES", cls.attempts - 1))),
+            base=float(os.environ.get("LLM_RETRY_BASE", cls.base)),
+            cap=float(os.environ.get("LLM_RETRY_MAX", cls.cap)),
+        )
+
+    def delay(self, exc: Exception, attempt: int) -> float:
+        """Wait before retry number *attempt* (1-based): Retry-After if given, else full-jitter backoff."""
+        asked = retry_after(exc)
+        if asked is not None:
+            return min(asked, self.cap)
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
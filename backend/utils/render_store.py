@@ -0,0 +1,196 @@
+"""Content-addressed store of rendered diagrams (SVG/PNG), bounded on disk.
+
+Entries are keyed by a digest of the Mermaid code and the mmdc version, so
+a digest always names the same picture and can be cached forever by
+clients. The source is kept next to the renders, which lets any format be
+produced on demand later. The SVG that ``compile_check`` renders anyway
+lands here too, so validating a diagram and displaying it cost one render.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from .cache import content_key
+from .mmdc_pool import mmdc_version
+from .singleflight import SingleFlight
+
+FORMATS = ("svg", "png")
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+_SOURCE = "mmd"
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+_DEFAULT_DIR = ".cache/renders"
+_DEFAULT_MAX_MB = 256
+
+
+class RenderError(Exception):
+    """The diagram could not be rendered (mmdc missing, or it rejected the code)."""
+
+
+def render_digest(code: str) -> str:
+    return content_key(code, mmdc_version())
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST.fullmatch(value))
+
+
+class RenderStore:
+    """Files under ``<dir>/<digest[:2]>/<digest>.<ext>``, evicted least recently used past *max_bytes*."""
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: dict[Path, tuple[int, float]] = {}  # path -> (size, last used)
+        self._total = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob("*/*.*"):
+            if path.name.startswith("."):
+                continue  # a write interrupted before its rename
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            self._entries[path] = (stat.st_size, stat.st_mtime)
+            self._total += stat.st_size
+
+    def _path(self, digest: str, ext: str) -> Path:
+        return self.directory / digest[:2] / f"{digest}.{ext}"
+
+    def _read(self, path: Path) -> bytes | None:
+        try:
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                entry = self._entries.pop(path, None)
+                if entry is not None:
+                    self._total -= entry[0]
+            return None
+        with self._lock:
+            self._entries[path] = (len(data), time.time())
+        return data
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write-then-rename, so readers (and other processes) never see half a file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            previous = self._entries.get(path)
+            self._total += len(data) - (previous[0] if previous else 0)
+            self._entries[path] = (len(data), time.time())
+            self._evict()
+
+    def _evict(self) -> None:
+        """Least recently used first, but a digest's source only once none of its renders are left.
+
+        Otherwise a render could outlive its source and be handed out as a
+        ``render_hash`` whose other formats can no longer be produced.
+        """
+        if self._total <= self.max_bytes:
+            return
+        renders = Counter(path.stem for path in self._entries if path.suffix != f".{_SOURCE}")
+        for path, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            is_source = path.suffix == f".{_SOURCE}"
+            if is_source and renders[path.stem]:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            del self._entries[path]
+            self._total -= size
+            if not is_source:
+                renders[path.stem] -= 1
+
+    def get(self, digest: str, fmt: str) -> bytes | None:
+        return self._read(self._path(digest, fmt))
+
+    def source(self, digest: str) -> str | None:
+        data = self.get(digest, _SOURCE)
+        return data.decode() if data is not None else None
+
+    def add_source(self, code: str) -> str:
+        """Remember *code* so it can be rendered later; returns its digest."""
+        digest = render_digest(code)
+        path = self._path(digest, _SOURCE)
+        with self._lock:
+            known = path in self._entries
+        if not known:
+            self._write(path, code.encode())
+        return digest
+
+    def put(self, code: str, fmt: str, data: bytes) -> str:
+        digest = self.add_source(code)
+        self._write(self._path(digest, fmt), data)
+        return digest
+
+    def size(self) -> int:
+        with self._lock:
+            return self._total
+
+
+# ── Rendering ─────────────────────────────────────────────────────────
+
+_renders: SingleFlight[bytes] = SingleFlight("render")
+
+
+async def arender(code: str, fmt: str, store: RenderStore | None = None) -> bytes:
+    """Rendered *code*, from *store* when present; concurrent requests for the same render share one."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'; expected one of {FORMATS}")
+    digest = render_digest(code)
+    if store is not None and (data := await asyncio.to_thread(store.get, digest, fmt)) is not None:
+        return data
+
+    async def render() -> bytes:
+        from .data_models import _arun_mmdc
+
+        mmdc = shutil.which("mmdc")
+        if not mmdc:
+            raise RenderError("mmdc is not installed")
+        try:
+            ok, err, data = await _arun_mmdc(mmdc, code, fmt)
+        except TimeoutError:
+            raise RenderError("Mermaid render timed out") from None
+        if not ok or not data:
+            raise RenderError(err or "mmdc produced no output")
+        if store is not None:
+            await asyncio.to_thread(store.put, code, fmt, data)
+        return data
+
+    return await _renders.do((digest, fmt), render)
+
+
+_store: RenderStore | None = None
+_store_ready = False
+_store_lock = threading.Lock()
+
+
+def get_render_store() -> RenderStore | None:
+    """Process-wide store under RENDER_CACHE_DIR; None when RENDER_CACHE_MAX_MB=0."""
+    global _store, _store_ready
+    with _store_lock:
+        if not _store_ready:
+            max_mb = float(os.environ.get("RENDER_CACHE_MAX_MB", _DEFAULT_MAX_MB))
+            if max_mb > 0:
+                directory = os.environ.get("RENDER_CACHE_DIR", _DEFAULT_DIR)
+                _store = RenderStore(directory, int(max_mb * 1024 * 1024))
+            _store_ready = True
+        return _store
@@ -0,0 +1,251 @@
+"""Deterministic fixes for common Mermaid mistakes, tried before asking the LLM to repair.
+
+Each rule looks at the code (and the first structural issue, if any) and
+returns a rewrite or None. :func:`repair_locally` applies one rule at a
+time and re-validates after each, so only rules that move the diagram
+towards valid are kept; anything the rules can't settle is escalated to
+``repair_code``.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .data_models import _DIRECTIVES, MermaidArtifact
+from .mermaid_syntax import _ARROW, SyntaxIssue, check_structure, flow_skeleton
+
+RuleFn = Callable[[str, SyntaxIssue | None], str | None]
+
+_RULES: dict[str, RuleFn] = {}
+_MAX_PASSES = 8
+
+
+def rule(name: str) -> Callable[[RuleFn], RuleFn]:
+    """Register a rule; rules are tried in registration order."""
+    def wrap(fn: RuleFn) -> RuleFn:
+        _RULES[name] = fn
+        return fn
+    return wrap
+
+
+# ── Stats ─────────────────────────────────────────────────────────────
+
+@dataclass
+class RuleStats:
+    applied: int = 0
+    fixed: int = 0
+
+
+@dataclass
+class RepairStats:
+    runs: int = 0  # runs where at least one rule applied; each ends fixed or escalated
+    fixed: int = 0
+    escalated: int = 0
+    rules: dict[str, RuleStats] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "fixed": self.fixed,
+            "escalated": self.escalated,
+            "rules": {name: {"applied": s.applied, "fixed": s.fixed} for name, s in self.rules.items()},
+        }
+
+
+_stats = RepairStats()
+_stats_lock = threading.Lock()
+
+
+def repair_stats() -> dict:
+    """Process-wide counters: how often each rule fired and how often that made the code valid."""
+    with _stats_lock:
+        return _stats.as_dict()
+
+
+def _record(rules: list[str], ok: bool) -> None:
+    with _stats_lock:
+        _stats.runs += 1
+        if ok:
+            _stats.fixed += 1
+        else:
+            _stats.escalated += 1
+        for name in rules:
+            s = _stats.rules.setdefault(name, RuleStats())
+            s.applied += 1
+            s.fixed += ok
+
+
+# ── Engine ────────────────────────────────────────────────────────────
+
+@dataclass
+class LocalRepair:
+    code: str
+    rules: list[str]
+    ok: bool
+    error: str = ""
+
+
+def repair_locally(code: str) -> LocalRepair | None:
+    """Apply rules until the code passes the local checks; None if no rule applied."""
+    applied: list[str] = []
+    ok, error = False, ""
+    for _ in range(_MAX_PASSES):
+        artifact = MermaidArtifact(code=code)
+        ok, error = artifact.validate_syntax()
+        code = artifact.code
+        if ok:
+            break
+        issue = check_structure(code)
+        for name, fn in _RULES.items():
+            rewritten = fn(code, issue)
+            if rewritten is not None and rewritten != code:
+                code = rewritten
+                applied.append(name)
+                break
+        else:
+            break
+    else:
+        artifact = MermaidArtifact(code=code)
+        ok, error = artifact.validate_syntax()
+        code = artifact.code
+
+    if not applied:
+        return None
+    _record(applied, ok)
+    return LocalRepair(code=code, rules=applied, ok=ok, error=error)
+
+
+# ── Rules ─────────────────────────────────────────────────────────────
+
+_FENCED = re.compile(r"```[\w-]*[ \t]*\n(.*?)\n[ \t]*```", re.S)
+
+
+def _directive(line: str) -> str | None:
+    words = line.split()
+    if words and words[0].rstrip(";") in _DIRECTIVES:
+        return words[0]
+    return None
+
+
+@rule("strip_fences")
+def _strip_fences(code: str, _issue: SyntaxIssue | None) -> str | None:
+    if "```" not in code:
+        return None
+    match = _FENCED.search(code)
+    if match:
+        return match.group(1).strip()
+    return "\n".join(line for line in code.splitlines() if not line.strip().startswith("```")).strip()
+
+
+@rule("drop_preamble")
+def _drop_preamble(code: str, _issue: SyntaxIssue | None) -> str | None:
+    """Prose before the directive line ("Here is your diagram:")."""
+    lines = code.splitlines()
+    for i, line in enumerate(lines):
+        if _directive(line):
+            return "\n".join(lines[i:]) if i else None
+    return None
+
+
+_SEQUENCE_HINT = re.compile(r"-{1,2}>>|^\s*participant\b", re.M)
+_ER_HINT = re.compile(r"[|}o][|o]--|--[|o][|{o]")
+_CLASS_HINT = re.compile(r"<\|--|--\|>|^\s*class\s+\w+\s*\{", re.M)
+_PROSE = re.compile(r"^[A-Z][\w ,'’]*[:.!]$")
+
+
+@rule("add_directive")
+def _add_directive(code: str, _issue: SyntaxIssue | None) -> str | None:
+    lines = code.splitlines()
+    if any(_directive(line) for line in lines):
+        return None
+    while lines and _PROSE.match(lines[0].strip()):
+        lines.pop(0)  # "Here you go:" lead-in
+    code = "\n".join(lines)
+    if _SEQUENCE_HINT.search(code):
+        directive = "sequenceDiagram"
+    elif _CLASS_HINT.search(code):
+        directive = "classDiagram"
+    elif _ER_HINT.search(code):
+        directive = "erDiagram"
+    elif "[*]" in code:
+        directive = "stateDiagram-v2"
+    else:
+        directive = "flowchart TD"
+    return f"{directive}\n{code}"
+
+
+_UNQUOTED_SHAPE = re.compile(
+    r"(?P<id>\w+)(?P<open>[\[({])(?![\[({\"/\\])(?P<label>[^\"\n]*?)(?P<close>[\])}])"
+    r"(?=\s*(?:$|;|&|:::|[-=.~<]))"
+)
+_PAIRS = {"[": "]", "(": ")", "{": "}"}
+
+
+def _quote_shape(match: re.Match) -> str:
+    label = match.group("label")
+    if _PAIRS[match.group("open")] != match.group("close") or not any(ch in label for ch in "[](){}"):
+        return match.group()
+    return f'{match.group("id")}{match.group("open")}"{label}"{match.group("close")}'
+
+
+@rule("quote_labels")
+def _quote_labels(code: str, issue: SyntaxIssue | None) -> str | None:
+    if issue is None or issue.kind != "unquoted_label":
+        return None
+    lines = code.splitlines()
+    lines[issue.line - 1] = _UNQUOTED_SHAPE.sub(_quote_shape, lines[issue.line - 1])
+    return "\n".join(lines)
+
+
+# ``end`` where a node id can stand: line start, after a link (or its |label|) or ``&``
+_END_ID = re.compile(rf"(?:^|{_ARROW}|&|\|)\s*(end)(?!\w)")
+
+
+@rule("rename_end")
+def _rename_end(code: str, issue: SyntaxIssue | None) -> str | None:
+    """Rename a node called ``end`` everywhere it is used as an id (labels are left alone)."""
+    if issue is None or issue.kind != "reserved_end":
+        return None
+    replacement = "End" if not re.search(r"\bEnd\b", code) else "end_node"
+    lines = code.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().rstrip(";") == "end":
+            continue  # closes a subgraph
+        skeleton = flow_skeleton(line)
+        if skeleton is None or "end" not in skeleton:
+            continue
+        for match in reversed(list(_END_ID.finditer(skeleton))):
+            line = line[:match.start(1)] + replacement + line[match.end(1):]
+        lines[i] = line
+    return "\n".join(lines)
+
+
+_LINK_AFTER = re.compile(r"\s*(?:<?-{2,}|<?={2,}|-\.|~~~|&|:::|;)")
+
+
+@rule("close_brackets")
+def _close_brackets(code: str, issue: SyntaxIssue | None) -> str | None:
+    if issue is None or issue.kind not in ("unclosed_bracket", "stray_closer"):
+        return None
+    lines = code.splitlines()
+    line = lines[issue.line - 1]
+    col = issue.column - 1
+    if issue.kind == "stray_closer":
+        lines[issue.line - 1] = line[:col] + line[col + 1:]
+    else:
+        # close the shape just before the link (or statement end) that follows it
+        link = _LINK_AFTER.search(line, col + 1)
+        at = link.start() if link else len(line.rstrip())
+        lines[issue.line - 1] = line[:at] + issue.expected + line[at:]
+    return "\n".join(lines)
+
+
+@rule("close_blocks")
+def _close_blocks(code: str, issue: SyntaxIssue | None) -> str | None:
+    if issue is None or issue.kind != "unclosed_block":
+        return None
+    indent = issue.source[: len(issue.source) - len(issue.source.lstrip())]
+    return f"{code.rstrip()}\n{indent}{issue.expected}"
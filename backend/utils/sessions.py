@@ -0,0 +1,78 @@
+"""Diagram sessions: what a later ``/edit`` needs from the run that produced a diagram.
+
+A session holds the current diagram plus the domain, spec and diagram type
+it was generated with, so an edit can skip routing, refining and
+constraining. Sessions live in the same memory (optionally sqlite-backed)
+caches as LLM responses and expire SESSION_TTL seconds after their last change.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from .cache import Cache, build_cache
+
+_DEFAULT_SIZE = 1024
+_DEFAULT_TTL = 24 * 3600
+
+
+@dataclass
+class Session:
+    id: str
+    code: str
+    explanation: str = ""
+    domain: str = "general"
+    spec: str = ""
+    diagram_type: str = "auto"
+    version: int = 1
+
+
+class SessionStore:
+    def __init__(self, cache: Cache):
+        self._cache = cache
+
+    def create(self, code: str, **fields: Any) -> Session:
+        session = Session(id=uuid.uuid4().hex, code=code, **fields)
+        self.save(session)
+        return session
+
+    def get(self, session_id: str) -> Session | None:
+        data = self._cache.get(session_id)
+        return Session(**data) if data is not None else None
+
+    def save(self, session: Session) -> None:
+        self._cache.set(session.id, asdict(session))
+
+    def save_if_version(self, session: Session, expected: int) -> bool:
+        """Store *session* only if the stored copy is still at version *expected*; False if it moved on."""
+        def swap(current: dict[str, Any] | None) -> dict[str, Any] | None:
+            if current is None or current.get("version") != expected:
+                return None
+            return asdict(session)
+
+        return self._cache.update(session.id, swap) is not None
+
+
+_store: SessionStore | None = None
+_store_ready = False
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore | None:
+    """Process-wide store; None when SESSION_CACHE_SIZE=0. Set SESSION_CACHE_PATH to share across workers."""
+    global _store, _store_ready
+    with _store_lock:
+        if not _store_ready:
+            cache = build_cache(
+                size=int(os.environ.get("SESSION_CACHE_SIZE", _DEFAULT_SIZE)),
+                path=os.environ.get("SESSION_CACHE_PATH") or None,
+                table="sessions",
+                ttl=float(os.environ.get("SESSION_TTL", _DEFAULT_TTL)),
+            )
+            _store = SessionStore(cache) if cache is not None else None
+            _store_ready = True
+        return _store
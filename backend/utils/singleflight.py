@@ -0,0 +1,60 @@
+"""Coalesce concurrent identical async calls into one execution."""
+
+from __future__ import annotations
+
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from .metrics import record_flight
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    def __init__(self, task: asyncio.Task[T]):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """While a call for *key* is in flight, later callers with the same key await its result.
+
+    The work runs in its own task, so one caller being cancelled doesn't
+    cancel it for the others; it is cancelled only when every caller has
+    gone. Results and exceptions are shared as-is, so treat results as
+    read-only. Flights are tracked per event loop. *name* labels the
+    leader/joined counts in ``/metrics``.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._flights: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[Hashable, _Flight[T]]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        flights = self._flights.setdefault(loop, {})
+        flight = flights.get(key)
+        if flight is None:
+            record_flight(self.name, "leader")
+            flight = _Flight(asyncio.ensure_future(fn()))
+            flights[key] = flight
+            flight.task.add_done_callback(lambda _: flights.pop(key, None))
+        else:
+            record_flight(self.name, "joined")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def in_flight(self) -> int:
+        try:
+            return len(self._flights.get(asyncio.get_running_loop(), {}))
+        except RuntimeError:
+            return 0
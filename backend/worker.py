@@ -0,0 +1,36 @@
+"""Job worker entrypoint: drains the queue behind ``POST /jobs``."""
+
+import argparse
+import os
+
+from backend.utils.env import load_dotenv
+from backend.utils.jobs import WorkerPool
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="text-to-uml-worker",
+        description="Run generation jobs from the job queue (JOB_QUEUE_PATH).",
+    )
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("JOB_WORKERS") or os.cpu_count() or 1),
+                        help="worker processes (default: JOB_WORKERS, else one per core)")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("JOB_WORKER_CONCURRENCY", "2")),
+                        help="jobs each process runs at once (default: 2)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    load_dotenv()
+    args = _parse_args()
+    pool = WorkerPool(args.processes, args.concurrency)
+    pool.start()
+    try:
+        pool.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
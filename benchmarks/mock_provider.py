@@ -0,0 +1,439 @@
+"""Deterministic stand-ins for a real LLM, so benchmarks run offline.
+
+:class:`ReplayProvider` answers every call from a script — diagrams built
+from the prompt words (and the domain grammar, for flowcharts) — or from a
+recording made with :class:`RecordingProvider`. Latency is sampled from a
+seeded distribution and awaited with ``asyncio.sleep``, so concurrency
+behaves like it does against a real backend; a share of calls can fail, or
+return a diagram with a known fault so the repair loop has work to do.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import difflib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from backend.prompts import get_grammar
+from backend.utils.cache import content_key
+from backend.utils.data_models import (
+    DiagramRequest,
+    LinePatch,
+    MermaidArtifact,
+    ProviderError,
+    RepairPatch,
+)
+from backend.utils.domain_router import get_router
+from backend.utils.llm import LLMProvider
+from backend.utils.metrics import record_llm
+
+FAULTS = ("fence", "preamble", "unquoted_label", "grammar")
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]{2,}")
+_STOPWORDS = frozenset(
+    "the and with for from that this into then when where which their each have has are was "
+    "will can via using uses use show shows diagram flow flowchart sequence class system".split()
+)
+
+
+# ── Latency ───────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class Latency:
+    """``fixed:S``, ``uniform:LO:HI`` or ``lognormal:MEDIAN:SIGMA`` (seconds)."""
+
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> Latency:
+        kind, *params = spec.split(":")
+        values = [float(p) for p in params]
+        if kind == "fixed" and len(values) == 1:
+            return cls("fixed", values[0])
+        if kind in ("uniform", "lognormal") and len(values) == 2:
+            return cls(kind, values[0], values[1])
+        raise ValueError(f"Bad latency spec {spec!r}; expected fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+        return self.a
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.a:g}" if self.kind == "fixed" else f"{self.kind}:{self.a:g}:{self.b:g}"
+
+
+# ── Recordings ────────────────────────────────────────────────────────
+
+def _record_key(method: str, *parts: str) -> str:
+    return content_key(method, *parts)
+
+
+def load_recording(path: str | Path) -> dict[str, dict[str, Any]]:
+    """``{key: {"output", "seconds"}}`` from a JSONL file written by :class:`RecordingProvider`."""
+    entries = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["key"]] = entry
+    return entries
+
+
+class RecordingProvider(LLMProvider):
+    """Pass calls through to *inner*, appending each answer and its latency to a JSONL file."""
+
+    def __init__(self, inner: LLMProvider, path: str | Path):
+        self.inner = inner
+        self.model = getattr(inner, "model", "")
+        self.supports_repair_patch = inner.supports_repair_patch
+        self._path = Path(path)
+        self._lock = threading.Lock()
+
+    def _write(self, method: str, key: str, output: Any, seconds: float) -> None:
+        line = json.dumps({"method": method, "key": key, "output": output, "seconds": round(seconds, 4)})
+        with self._lock, open(self._path, "a") as f:
+            f.write(line + "\n")
+
+    def _call(self, method: str, key: str, fn: Callable[[], Any], dump: Callable[[Any], Any]) -> Any:
+        started = time.perf_counter()
+        result = fn()
+        self._write(method, key, dump(result), time.perf_counter() - started)
+        return result
+
+    async def _acall(self, method: str, key: str, fn: Callable[[], Any], dump: Callable[[Any], Any]) -> Any:
+        started = time.perf_counter()
+        result = await fn()
+        self._write(method, key, dump(result), time.perf_counter() - started)
+        return result
+
+    def route_domain(self, text: str) -> str:
+        return self._call("route", _record_key("route", text), lambda: self.inner.route_domain(text), str)
+
+    def refine_input(self, text: str, domain: str = "general") -> str:
+        key = _record_key("refine", text, domain)
+        return self._call("refine", key, lambda: self.inner.refine_input(text, domain), str)
+
+    def generate_diagram(self, request: DiagramRequest, domain: str = "general") -> MermaidArtifact:
+        key = _record_key("generate", request.raw_text, request.diagram_type, domain)
+        return self._call(
+            "generate", key, lambda: self.inner.generate_diagram(request, domain), lambda a: a.model_dump()
+        )
+
+    def repair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        key = _record_key("repair", broken_code, error_msg)
+        return self._call(
+            "repair", key, lambda: self.inner.repair_code(broken_code, error_msg), lambda a: a.model_dump()
+        )
+
+    def repair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        key = _record_key("repair_patch", broken_code, error_msg)
+        return self._call(
+            "repair_patch", key, lambda: self.inner.repair_patch(broken_code, error_msg), lambda p: p.model_dump()
+        )
+
+    async def aroute_domain(self, text: str) -> str:
+        return await self._acall("route", _record_key("route", text), lambda: self.inner.aroute_domain(text), str)
+
+    async def arefine_input(self, text: str, domain: str = "general") -> str:
+        key = _record_key("refine", text, domain)
+        return await self._acall("refine", key, lambda: self.inner.arefine_input(text, domain), str)
+
+    async def agenerate_diagram(
+        self,
+        request: DiagramRequest,
+        domain: str = "general",
+        *,
+        on_token: Callable[[str], None] | None = None,
+    ) -> MermaidArtifact:
+        key = _record_key("generate", request.raw_text, request.diagram_type, domain)
+        return await self._acall(
+            "generate",
+            key,
+            lambda: self.inner.agenerate_diagram(request, domain, on_token=on_token),
+            lambda a: a.model_dump(),
+        )
+
+    async def arepair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        key = _record_key("repair", broken_code, error_msg)
+        return await self._acall(
+            "repair", key, lambda: self.inner.arepair_code(broken_code, error_msg), lambda a: a.model_dump()
+        )
+
+    async def arepair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        key = _record_key("repair_patch", broken_code, error_msg)
+        return await self._acall(
+            "repair_patch", key, lambda: self.inner.arepair_patch(broken_code, error_msg), lambda p: p.model_dump()
+        )
+
+
+# ── Replay ────────────────────────────────────────────────────────────
+
+class ReplayProvider(LLMProvider):
+    """Scripted (or recorded) answers with sampled latency, failures and faulty diagrams.
+
+    *latency* maps a method name (route, refine, generate, repair,
+    repair_patch) to its distribution, with ``"default"`` for the rest.
+    *failure_rate* is the share of calls that raise :class:`ProviderError`;
+    *invalid_rate* the share of generated diagrams that carry one of
+    *faults*. Calls that match a recording replay its output (and, with
+    ``recorded_latency``, its latency); the rest fall back to the script.
+    """
+
+    name = "mock"
+    supports_repair_patch = True
+
+    def __init__(
+        self,
+        *,
+        latency: dict[str, Latency] | None = None,
+        failure_rate: float = 0.0,
+        invalid_rate: float = 0.0,
+        faults: tuple[str, ...] = FAULTS,
+        seed: int = 0,
+        recording: dict[str, dict[str, Any]] | None = None,
+        recorded_latency: bool = False,
+        model: str = "replay",
+    ):
+        self.model = model
+        self.latency = {"default": Latency(), **(latency or {})}
+        self.failure_rate = failure_rate
+        self.invalid_rate = invalid_rate
+        self.faults = faults
+        self.recording = recording or {}
+        self.recorded_latency = recorded_latency
+        self.calls: dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fixes: dict[str, str] = {}  # faulty code -> the diagram it was made from
+
+    # ── plumbing ──────────────────────────────────────────────────────
+
+    def _plan(self, method: str, key: str) -> tuple[float, bool, dict[str, Any] | None]:
+        """(delay, fail, recorded entry) for one call, drawn under the lock so runs are reproducible."""
+        recorded = self.recording.get(key)
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            delay = self.latency.get(method, self.latency["default"]).sample(self._rng)
+            fail = self._rng.random() < self.failure_rate
+        if recorded is not None and self.recorded_latency:
+            delay = recorded.get("seconds", delay)
+        return delay, fail, recorded
+
+    def _finish(self, delay: float, fail: bool, prompt: str, output: str) -> None:
+        if fail:
+            raise ProviderError("API error: injected failure (mock)")
+        record_llm(self.name, self.model, delay, len(prompt) // 4, len(output) // 4)
+
+    def _sync(self, method: str, key: str, prompt: str, script: Callable[[], Any], load: Callable[[Any], Any]) -> Any:
+        delay, fail, recorded = self._plan(method, key)
+        time.sleep(delay)
+        result = load(recorded["output"]) if recorded is not None else script()
+        self._finish(delay, fail, prompt, _text(result))
+        return result
+
+    async def _async(
+        self, method: str, key: str, prompt: str, script: Callable[[], Any], load: Callable[[Any], Any]
+    ) -> Any:
+        delay, fail, recorded = self._plan(method, key)
+        await asyncio.sleep(delay)
+        result = load(recorded["output"]) if recorded is not None else script()
+        self._finish(delay, fail, prompt, _text(result))
+        return result
+
+    # ── scripted answers ──────────────────────────────────────────────
+
+    def _route(self, text: str) -> str:
+        return get_router().classify(text).domain
+
+    def _refine(self, text: str, domain: str) -> str:
+        return f"{text.strip()}\n\nComponents: {', '.join(_words(text, 6))}. Domain: {domain}."
+
+    def _generate(self, request: DiagramRequest, domain: str) -> MermaidArtifact:
+        code = scripted_diagram(request.raw_text, request.diagram_type, domain)
+        with self._lock:
+            faulty = self._rng.random() < self.invalid_rate
+            fault = self._rng.choice(self.faults) if faulty and self.faults else ""
+        broken = _inject(code, fault, domain) if fault else None
+        if broken is not None and broken != code:
+            with self._lock:
+                self._fixes[broken] = code
+            code = broken
+        return MermaidArtifact(code=code, explanation="Scripted diagram")
+
+    def _fixed(self, broken_code: str) -> str:
+        with self._lock:
+            return self._fixes.get(broken_code, broken_code)
+
+    def _repair(self, broken_code: str) -> MermaidArtifact:
+        return MermaidArtifact(code=self._fixed(broken_code), explanation="Scripted repair")
+
+    def _repair_patch(self, broken_code: str) -> RepairPatch:
+        before, after = broken_code.splitlines(), self._fixed(broken_code).splitlines()
+        patches = [
+            LinePatch(start=i1 + 1, end=i2, replacement="\n".join(after[j1:j2]))
+            for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(a=before, b=after).get_opcodes()
+            if tag != "equal"
+        ]
+        return RepairPatch(patches=patches, explanation="Scripted patch")
+
+    # ── LLMProvider ───────────────────────────────────────────────────
+
+    def route_domain(self, text: str) -> str:
+        return self._sync("route", _record_key("route", text), text, lambda: self._route(text), str)
+
+    def refine_input(self, text: str, domain: str = "general") -> str:
+        key = _record_key("refine", text, domain)
+        return self._sync("refine", key, text, lambda: self._refine(text, domain), str)
+
+    def generate_diagram(self, request: DiagramRequest, domain: str = "general") -> MermaidArtifact:
+        key = _record_key("generate", request.raw_text, request.diagram_type, domain)
+        return self._sync(
+            "generate", key, request.raw_text, lambda: self._generate(request, domain), MermaidArtifact.model_validate
+        )
+
+    def repair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        key = _record_key("repair", broken_code, error_msg)
+        return self._sync(
+            "repair", key, broken_code + error_msg, lambda: self._repair(broken_code), MermaidArtifact.model_validate
+        )
+
+    def repair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        key = _record_key("repair_patch", broken_code, error_msg)
+        return self._sync(
+            "repair_patch", key, broken_code + error_msg, lambda: self._repair_patch(broken_code),
+            RepairPatch.model_validate,
+        )
+
+    async def aroute_domain(self, text: str) -> str:
+        return await self._async("route", _record_key("route", text), text, lambda: self._route(text), str)
+
+    async def arefine_input(self, text: str, domain: str = "general") -> str:
+        key = _record_key("refine", text, domain)
+        return await self._async("refine", key, text, lambda: self._refine(text, domain), str)
+
+    async def agenerate_diagram(
+        self,
+        request: DiagramRequest,
+        domain: str = "general",
+        *,
+        on_token: Callable[[str], None] | None = None,
+    ) -> MermaidArtifact:
+        key = _record_key("generate", request.raw_text, request.diagram_type, domain)
+        artifact = await self._async(
+            "generate", key, request.raw_text, lambda: self._generate(request, domain), MermaidArtifact.model_validate
+        )
+        if on_token is not None:
+            on_token(artifact.model_dump_json(include={"code", "explanation"}))
+        return artifact
+
+    async def arepair_code(self, broken_code: str, error_msg: str) -> MermaidArtifact:
+        key = _record_key("repair", broken_code, error_msg)
+        return await self._async(
+            "repair", key, broken_code + error_msg, lambda: self._repair(broken_code), MermaidArtifact.model_validate
+        )
+
+    async def arepair_patch(self, broken_code: str, error_msg: str) -> RepairPatch:
+        key = _record_key("repair_patch", broken_code, error_msg)
+        return await self._async(
+            "repair_patch", key, broken_code + error_msg, lambda: self._repair_patch(broken_code),
+            RepairPatch.model_validate,
+        )
+
+
+def _text(result: Any) -> str:
+    if isinstance(result, str):
+        return result
+    return result.model_dump_json()
+
+
+# ── Scripted diagrams ─────────────────────────────────────────────────
+
+def _words(text: str, limit: int) -> list[str]:
+    seen: list[str] = []
+    for word in _WORD.findall(text.split("\n\n")[0]):
+        word = word.capitalize()
+        if word.lower() not in _STOPWORDS and word not in seen:
+            seen.append(word)
+        if len(seen) == limit:
+            break
+    return seen or ["Input", "Process", "Output"]
+
+
+def scripted_diagram(text: str, diagram_type: str, domain: str) -> str:
+    """A valid diagram of *diagram_type* named after the words in *text* ("auto" gives a flowchart)."""
+    words = _words(text, 8)
+    if diagram_type == "sequence":
+        lines = ["sequenceDiagram"] + [f"    participant {w}" for w in words[:4]]
+        lines += [f"    {a}->>{b}: {a.lower()} request" for a, b in zip(words[:4], words[1:4])]
+        return "\n".join(lines)
+    if diagram_type == "class":
+        lines = ["classDiagram"]
+        for word in words[:4]:
+            lines += [f"    class {word} {{", "        +id: int", f"        +{word.lower()}()", "    }"]
+        lines += [f"    {a} --> {b}" for a, b in zip(words[:4], words[1:4])]
+        return "\n".join(lines)
+    if diagram_type == "erd":
+        names = [w.upper() for w in words[:4]]
+        lines = ["erDiagram"] + [f"    {a} ||--o{{ {b} : has" for a, b in zip(names, names[1:])]
+        return "\n".join(lines)
+    return _flowchart(words, domain)
+
+
+def _flowchart(words: list[str], domain: str) -> str:
+    grammar = get_grammar(domain)
+    if grammar is None:
+        lines = ["flowchart TD"] + [f'    N{i}["{w}"]' for i, w in enumerate(words)]
+        lines += [f"    N{i} --> N{i + 1}" for i in range(len(words) - 1)]
+        return "\n".join(lines)
+
+    # walk valid_connections so the diagram conforms to the domain grammar
+    successors: dict[str, list[str]] = {}
+    for conn in grammar["valid_connections"]:
+        successors.setdefault(conn["from"], []).append(conn["to"])
+    current = grammar["node_types"][0]["id"]
+    types = [current]
+    for i in range(len(words) - 1):
+        options = successors.get(current)
+        if not options:
+            break
+        current = options[(len(words[i]) + i) % len(options)]
+        types.append(current)
+    lines = ["flowchart TD"] + [f'    N{i}["{w}"]:::{t}' for i, (w, t) in enumerate(zip(words, types))]
+    lines += [f"    N{i} --> N{i + 1}" for i in range(len(types) - 1)]
+    return "\n".join(lines)
+
+
+def _inject(code: str, fault: str, domain: str) -> str | None:
+    """*code* with *fault* applied, or None when the fault doesn't apply to this diagram."""
+    if fault == "fence":
+        return f"```mermaid\n{code}\n```"
+    if fault == "preamble":
+        return f"Here is your diagram:\n{code}"
+    if fault == "unquoted_label":
+        broken, count = re.subn(r'\["(\w+)"\]', r"[\1 (main)]", code, count=1)
+        return broken if count else None
+    if fault == "grammar":
+        grammar = get_grammar(domain)
+        if grammar is None or not code.startswith("flowchart"):
+            return None
+        legal = {(c["from"], c["to"]) for c in grammar["valid_connections"]}
+        types = re.findall(r"^\s*(N\d+)\[.*\]:::(\w+)$", code, re.M)
+        for src, src_type in reversed(types):
+            for dst, dst_type in types:
+                if src != dst and (src_type, dst_type) not in legal and (dst_type, src_type) not in legal:
+                    return f"{code}\n    {src} --> {dst}"
+        return None
+    raise ValueError(f"Unknown fault {fault!r}; expected one of {', '.join(FAULTS)}")
@@ -0,0 +1,412 @@
+"""Offline benchmarks against a scripted LLM.
+
+    python -m benchmarks.run                          # every scenario
+    python -m benchmarks.run pipeline repair --out results.json
+    python -m benchmarks.run --compare baseline.json --out results.json
+
+Scenarios:
+
+- ``pipeline``   — end-to-end latency percentiles, per step and per domain
+- ``throughput`` — requests/s and latency through the FastAPI app at each concurrency
+- ``mmdc``       — local checks vs mmdc compile cost (skipped when mmdc isn't installed)
+- ``repair``     — every diagram arrives faulty; how many repairs, from which source
+
+Results are JSON with the same keys on every run, so two result files can
+be diffed or passed to ``--compare``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from backend.utils import DiagramGenerationError, MermaidArtifact, Orchestrator, ProviderError, set_provider
+from backend.utils.log import apply_log_level
+
+from .mock_provider import FAULTS, Latency, ReplayProvider, load_recording, scripted_diagram
+
+_HERE = Path(__file__).resolve().parent
+
+ScenarioFn = Callable[["Config"], Awaitable[dict[str, Any]]]
+_SCENARIOS: dict[str, ScenarioFn] = {}
+
+
+def scenario(name: str) -> Callable[[ScenarioFn], ScenarioFn]:
+    def wrap(fn: ScenarioFn) -> ScenarioFn:
+        _SCENARIOS[name] = fn
+        return fn
+    return wrap
+
+
+@dataclass
+class Config:
+    corpus: list[dict[str, str]]
+    requests: int = 36
+    concurrency: list[int] = field(default_factory=lambda: [1, 4, 16])
+    latency: str = "lognormal:0.3:0.4"
+    failure_rate: float = 0.0
+    invalid_rate: float = 0.2
+    seed: int = 0
+    pipeline: str = "default"
+    max_retries: int = 3
+    recording: str | None = None
+
+    def provider(self, **overrides: Any) -> ReplayProvider:
+        options: dict[str, Any] = {
+            "latency": {"default": Latency.parse(self.latency)},
+            "failure_rate": self.failure_rate,
+            "invalid_rate": self.invalid_rate,
+            "seed": self.seed,
+            "recording": load_recording(self.recording) if self.recording else None,
+            "recorded_latency": bool(self.recording),
+        }
+        options.update(overrides)
+        return ReplayProvider(**options)
+
+    def items(self, n: int | None = None) -> list[dict[str, str]]:
+        """*n* corpus items (default ``requests``), cycling through the corpus in order."""
+        n = self.requests if n is None else n
+        return [self.corpus[i % len(self.corpus)] for i in range(n)]
+
+    def as_dict(self) -> dict[str, Any]:
+        config = asdict(self)
+        config["corpus"] = len(self.corpus)
+        return config
+
+
+# ── Stats ─────────────────────────────────────────────────────────────
+
+def summarize(samples: list[float]) -> dict[str, float | int]:
+    """Count, mean and nearest-rank percentiles, in seconds."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+    return {
+        "n": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": round(pct(50), 4),
+        "p90": round(pct(90), 4),
+        "p99": round(pct(99), 4),
+        "min": round(ordered[0], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+async def _run_pipelines(config: Config, provider: ReplayProvider, concurrency: int = 1) -> list[dict[str, Any]]:
+    """Run ``config.requests`` corpus items through the orchestrator; one record per run."""
+    orchestrator = Orchestrator(provider, config.pipeline, max_retries=config.max_retries)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(item: dict[str, str]) -> dict[str, Any]:
+        async with limit:
+            started = time.perf_counter()
+            try:
+                result = await orchestrator.arun(item["text"], diagram_type=item["diagram_type"])
+            except (DiagramGenerationError, ProviderError) as exc:
+                return {"item": item, "ok": False, "error": type(exc).__name__, "seconds": time.perf_counter() - started}
+            return {
+                "item": item,
+                "ok": True,
+                "seconds": time.perf_counter() - started,
+                "metadata": result.metadata,
+            }
+
+    return await asyncio.gather(*(one(item) for item in config.items()))
+
+
+# ── Scenarios ─────────────────────────────────────────────────────────
+
+@scenario("pipeline")
+async def pipeline_latency(config: Config) -> dict[str, Any]:
+    # one untimed run first, so prompt loading and mmdc start-up don't land in p99
+    await _run_pipelines(replace(config, requests=1), config.provider(invalid_rate=0.0))
+    provider = config.provider()
+    runs = await _run_pipelines(config, provider)
+    ok = [r for r in runs if r["ok"]]
+
+    steps: dict[str, list[float]] = {}
+    by_domain: dict[str, list[float]] = {}
+    llm_seconds, mmdc_seconds, tokens = [], [], Counter()
+    for run in ok:
+        timings = run["metadata"].get("timings", {})
+        for step, seconds in timings.get("steps", {}).items():
+            steps.setdefault(step, []).append(seconds)
+        by_domain.setdefault(run["item"]["domain"], []).append(run["seconds"])
+        llm_seconds.append(timings.get("llm", {}).get("seconds", 0.0))
+        mmdc_seconds.append(timings.get("mmdc", {}).get("seconds", 0.0))
+        tokens["prompt"] += timings.get("llm", {}).get("prompt_tokens", 0)
+        tokens["completion"] += timings.get("llm", {}).get("completion_tokens", 0)
+
+    return {
+        "runs": len(runs),
+        "failed": len(runs) - len(ok),
+        "latency": summarize([r["seconds"] for r in ok]),
+        "by_domain": {domain: summarize(samples) for domain, samples in sorted(by_domain.items())},
+        "steps": {step: summarize(samples) for step, samples in steps.items()},
+        "llm_seconds": summarize(llm_seconds),
+        "mmdc_seconds": summarize(mmdc_seconds),
+        "llm_calls": dict(sorted(provider.calls.items())),
+        "tokens": dict(tokens),
+    }
+
+
+@scenario("throughput")
+async def api_throughput(config: Config) -> dict[str, Any]:
+    import httpx
+
+    from backend.api import app
+
+    results = {}
+    for concurrency in config.concurrency:
+        set_provider(config.provider())
+        limit = asyncio.Semaphore(concurrency)
+        latencies: list[float] = []
+        statuses: Counter[int] = Counter()
+
+        async def one(client: httpx.AsyncClient, i: int, item: dict[str, str]) -> None:
+            # distinct texts, so identical in-flight requests aren't coalesced
+            body = {"text": f"{item['text']} (request {i})", "diagram_type": item["diagram_type"],
+                    "max_retries": config.max_retries, "pipeline": config.pipeline}
+            async with limit:
+                started = time.perf_counter()
+                resp = await client.post("/generate", json=body)
+                latencies.append(time.perf_counter() - started)
+                statuses[resp.status_code] += 1
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client, i, item) for i, item in enumerate(config.items())))
+            elapsed = time.perf_counter() - started
+
+        results[str(concurrency)] = {
+            "requests": len(latencies),
+            "seconds": round(elapsed, 4),
+            "rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+            "latency": summarize(latencies),
+            "status": {str(code): count for code, count in sorted(statuses.items())},
+        }
+    set_provider(None)
+    return {"by_concurrency": results}
+
+
+@scenario("mmdc")
+async def mmdc_cost(config: Config) -> dict[str, Any]:
+    from backend.utils.grammar_check import compile_grammar
+    from backend.prompts import get_grammar
+    from backend.utils.mmdc_pool import get_pool
+
+    # distinct code per sample so neither the validation cache nor mmdc reuse anything
+    samples = [
+        (f"{scripted_diagram(item['text'], item['diagram_type'], item['domain'])}\n%% sample {i}", item["domain"])
+        for i, item in enumerate(config.items())
+    ]
+
+    local: list[float] = []
+    for code, domain in samples:
+        started = time.perf_counter()
+        MermaidArtifact(code=code).validate_syntax()
+        grammar = get_grammar(domain)
+        if grammar is not None:
+            compile_grammar(grammar).check(code)
+        local.append(time.perf_counter() - started)
+    result: dict[str, Any] = {"local_checks": summarize(local)}
+
+    if not shutil.which("mmdc"):
+        result["skipped"] = "mmdc not on PATH"
+        return result
+
+    pool = get_pool()
+    result["mode"] = "pool" if pool is not None else "spawn"
+    result["pool_size"] = pool.size if pool is not None else 0
+
+    sequential: list[float] = []
+    for code, _ in samples:
+        started = time.perf_counter()
+        await MermaidArtifact(code=code).acompile_check()
+        sequential.append(time.perf_counter() - started)
+    result["sequential"] = summarize(sequential)
+
+    concurrency = max(config.concurrency)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def check(code: str) -> None:
+        async with limit:
+            await MermaidArtifact(code=code).acompile_check()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(check(f"{code}\n%% concurrent") for code, _ in samples))
+    elapsed = time.perf_counter() - started
+    result["concurrent"] = {
+        "concurrency": concurrency,
+        "checks": len(samples),
+        "seconds": round(elapsed, 4),
+        "checks_per_second": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+    }
+    return result
+
+
+@scenario("repair")
+async def repair_loop(config: Config) -> dict[str, Any]:
+    from backend.utils.repair_rules import repair_stats
+
+    provider = config.provider(invalid_rate=1.0, faults=FAULTS)
+    before = repair_stats()
+    runs = await _run_pipelines(config, provider, concurrency=max(config.concurrency))
+    after = repair_stats()
+
+    sources: Counter[str] = Counter()
+    rules: Counter[str] = Counter()
+    per_run: list[float] = []
+    kept_with_violations = 0
+    for run in runs:
+        if not run["ok"]:
+            continue
+        repairs = run["metadata"].get("timings", {}).get("repairs", {})
+        sources.update(repairs)
+        rules.update(run["metadata"].get("local_repairs", []))
+        per_run.append(sum(repairs.values()))
+        kept_with_violations += bool(run["metadata"].get("grammar_violations"))
+
+    return {
+        "runs": len(runs),
+        "succeeded": sum(r["ok"] for r in runs),
+        "latency": summarize([r["seconds"] for r in runs if r["ok"]]),
+        "repairs_per_run": summarize(per_run),
+        "repairs_by_source": dict(sorted(sources.items())),
+        "local_rules": dict(sorted(rules.items())),
+        "rule_engine": {key: after[key] - before[key] for key in ("runs", "fixed", "escalated")},
+        "kept_with_violations": kept_with_violations,
+        "llm_calls": dict(sorted(provider.calls.items())),
+    }
+
+
+# ── Output ────────────────────────────────────────────────────────────
+
+def _meta() -> dict[str, Any]:
+    from backend.utils.mmdc_pool import mmdc_version
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=_HERE, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "mmdc": mmdc_version() if shutil.which("mmdc") else None,
+    }
+
+
+def _flatten(value: Any, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        flat: dict[str, float] = {}
+        for key, inner in value.items():
+            flat.update(_flatten(inner, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+_COMPARED = ("p50", "p90", "p99", "mean", "rps", "checks_per_second", "repairs_per_run.mean")
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+    """One line per headline number present in both results: old → new (change)."""
+    old, new = _flatten(baseline.get("scenarios", {})), _flatten(current.get("scenarios", {}))
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(_COMPARED) or ".steps." in key:
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        lines.append(f"{key:<55} {old[key]:>10.4f} → {new[key]:>10.4f}  ({change})")
+    return lines
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Offline benchmarks with a scripted LLM.")
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"any of: {', '.join(_SCENARIOS)} (default: all)")
+    parser.add_argument("--requests", type=int, default=36, help="pipeline runs per scenario (default: 36)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels for throughput (default: 1,4,16)")
+    parser.add_argument("--latency", default="lognormal:0.3:0.4",
+                        help="per-call LLM latency: fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of LLM calls that fail")
+    parser.add_argument("--invalid-rate", type=float, default=0.2, help="share of generated diagrams with a fault")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pipeline", default="default")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--recording", metavar="CALLS.jsonl", help="replay answers recorded by RecordingProvider")
+    parser.add_argument("--corpus", default=str(_HERE / "corpus.jsonl"), metavar="CORPUS.jsonl")
+    parser.add_argument("--out", metavar="RESULTS.json", help="write results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE.json", help="print changes against an earlier result file")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in _SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario {unknown[0]!r}; choose from {', '.join(_SCENARIOS)}")
+    return args
+
+
+def main() -> None:
+    args = _parse_args()
+    # measure real compile cost and keep logs out of the timings
+    os.environ.setdefault("VALIDATION_CACHE_SIZE", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    apply_log_level()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    config = Config(
+        corpus=corpus,
+        requests=args.requests,
+        concurrency=[int(c) for c in args.concurrency.split(",")],
+        latency=str(Latency.parse(args.latency)),
+        failure_rate=args.failure_rate,
+        invalid_rate=args.invalid_rate,
+        seed=args.seed,
+        pipeline=args.pipeline,
+        max_retries=args.max_retries,
+        recording=args.recording,
+    )
+
+    results: dict[str, Any] = {"meta": _meta(), "config": config.as_dict(), "scenarios": {}}
+    for name in args.scenarios or list(_SCENARIOS):
+        print(f"[bench] {name}...", file=sys.stderr)
+        results["scenarios"][name] = asyncio.run(_SCENARIOS[name](config))
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+        print(f"[bench] wrote {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        for line in compare(baseline, results):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()